@@ -0,0 +1,518 @@
+import json
+import queue
+import socket
+import socketserver
+import threading
+import time
+
+from PyQt5 import QtCore
+
+import accounts
+import journal
+import replication
+import storage
+
+
+DEFAULT_PORT = 5050
+# The UI waits at most that long for the server
+TIMEOUT = 0.5
+# A balance read from the server is used again during that time
+CACHE_TTL = 2.0
+# After a failure, the server isn't asked again before that time
+RETRY_SECONDS = 10.0
+# The number of connections kept open to the server
+POOL_SIZE = 2
+# The points changes of the kiosk that the server didn't confirm yet, and the last confirmed one
+OUTBOX_FILE = "account_outbox.journal"
+OUTBOX_STATE_FILE = "account_outbox.json"
+
+
+def parse_address(text: str) -> tuple[str, int]:
+    """Read a server address.
+
+    Args:
+        text (str): The address, like "192.168.1.10:5050" or "192.168.1.10".
+
+    Returns:
+        tuple[str, int]: The host and the port.
+    """
+    host, _, port = text.partition(":")
+    return host, int(port) if port else DEFAULT_PORT
+
+
+class Account_Handler(socketserver.StreamRequestHandler):
+    """One connection to the server, kept open for as many requests as the kiosk sends.
+
+    Each request is a line of json, the answers are sent back in the same order.
+    """
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                answer = self.server.answer(json.loads(line))
+            except Exception as e:
+                answer = {"ok": False, "error": str(e)}
+            self.wfile.write(json.dumps(answer).encode("utf-8") + b"\n")
+
+
+class Account_Server(socketserver.ThreadingTCPServer):
+    """The server sharing the accounts between the kiosks of a venue.
+
+    Args:
+        address (tuple[str, int]): The host and the port to listen on.
+        store (accounts.Account_Store): The accounts, saved on the server.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address: tuple[str, int], store: accounts.Account_Store) -> None:
+        super().__init__(address, Account_Handler)
+        self.store = store
+        # Each connection has his own thread, the store is used by one at a time
+        self.lock = threading.Lock()
+
+    def answer(self, request: dict) -> dict:
+        """Answer a request of a kiosk.
+
+        A change is sent with the name of the kiosk and his number on that
+        kiosk, it's only applied once however many times it's sent.
+
+        Args:
+            request (dict): The request, {"op": "lookup", "id": ..., "device": ...} or
+                {"op": "add", "id": ..., "delta": ..., "device": ..., "seq": ...}.
+
+        Returns:
+            dict: The answer, with the seq of the last change of the kiosk applied here.
+        """
+        operation = request.get("op")
+        device = request.get("device")
+        with self.lock:
+            if operation == "add":
+                if device is None:
+                    self.store.add_points(request["id"], float(request["delta"]))
+                else:
+                    self.store.apply_remote(
+                        request["id"], float(request["delta"]), (device, int(request["seq"])))
+            elif operation != "lookup":
+                return {"ok": False, "error": "unknown operation {}".format(operation)}
+            account = self.store.lookup(request["id"])
+            applied = self.store.applied.get(device, 0)
+
+        if account is None:
+            return {"ok": True, "found": False, "applied": applied}
+        return {"ok": True, "found": True, "name": account[0], "points": account[1], "applied": applied}
+
+
+def start_loopback(store: accounts.Account_Store) -> Account_Server:
+    """Start a server on the loopback interface, in a thread, to try a kiosk without the real server.
+
+    Args:
+        store (accounts.Account_Store): The accounts served.
+
+    Returns:
+        Account_Server: The running server, server_address tells his port.
+    """
+    server = Account_Server(("127.0.0.1", 0), store)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class Connection:
+    """A connection to the server, kept open between the requests.
+
+    Args:
+        address (tuple[str, int]): The host and the port of the server.
+        timeout (float): The seconds to wait for the server.
+    """
+
+    def __init__(self, address: tuple[str, int], timeout: float) -> None:
+        self.socket = socket.create_connection(address, timeout)
+        # The requests are small, we don't want them to wait for more data
+        self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.file = self.socket.makefile("rb")
+
+    def pipeline(self, requests: list[dict]) -> list[dict]:
+        """Send all the requests at once, then read the answers.
+
+        Args:
+            requests (list[dict]): The requests.
+
+        Raises:
+            ConnectionError: The server closed the connection.
+
+        Returns:
+            list[dict]: The answers, in the same order.
+        """
+        self.socket.sendall(b"".join(
+            json.dumps(request).encode("utf-8") + b"\n" for request in requests))
+        answers = []
+        for _ in requests:
+            line = self.file.readline()
+            if not line:
+                raise ConnectionError("the account server closed the connection")
+            answers.append(json.loads(line))
+        return answers
+
+    def close(self):
+        """Close the connection.
+        """
+        self.file.close()
+        self.socket.close()
+
+
+class Account_Client:
+    """Talks to the account server through a small pool of open connections.
+
+    Args:
+        address (tuple[str, int]): The host and the port of the server.
+        device (str, optional): The name of this kiosk. Defaults to replication.DEVICE_ID.
+        pool_size (int, optional): The maximum number of open connections. Defaults to POOL_SIZE.
+        timeout (float, optional): The seconds to wait for the server. Defaults to TIMEOUT.
+        ttl (float, optional): The seconds a balance stays in the cache. Defaults to CACHE_TTL.
+    """
+
+    def __init__(self, address: tuple[str, int], device: str = replication.DEVICE_ID, pool_size: int = POOL_SIZE,
+                 timeout: float = TIMEOUT, ttl: float = CACHE_TTL) -> None:
+        self.address = address
+        self.device = device
+        self.timeout = timeout
+        self.ttl = ttl
+        self.idle = queue.LifoQueue()
+        self.slots = threading.BoundedSemaphore(pool_size)
+        # id -> (expiry on the monotonic clock, (name, points) or None, last seq of this kiosk applied)
+        self.cache = {}
+        self.cache_lock = threading.Lock()
+
+    def pipeline(self, requests: list[dict]) -> list[dict]:
+        """Send requests on a connection of the pool.
+
+        Args:
+            requests (list[dict]): The requests.
+
+        Raises:
+            OSError: The server can't be reached.
+
+        Returns:
+            list[dict]: The answers, in the same order.
+        """
+        with self.slots:
+            try:
+                connection = self.idle.get_nowait()
+                fresh = False
+            except queue.Empty:
+                connection = Connection(self.address, self.timeout)
+                fresh = True
+
+            try:
+                answers = connection.pipeline(requests)
+            except (OSError, ValueError):
+                connection.close()
+                if fresh:
+                    raise
+                # The server may have closed an idle connection, we try once with a new one.
+                # The changes carry their seq, the server never applies one twice.
+                connection = Connection(self.address, self.timeout)
+                try:
+                    answers = connection.pipeline(requests)
+                except (OSError, ValueError):
+                    connection.close()
+                    raise
+            self.idle.put(connection)
+        return answers
+
+    def remember(self, id: str, answer: dict) -> tuple[tuple[str, float] | None, int]:
+        """Put the answer of the server in the cache, unless a newer one is already there.
+
+        Args:
+            id (str): The id of the card.
+            answer (dict): The answer of the server.
+
+        Returns:
+            tuple[tuple[str, float] | None, int]: The name and the points (None if the id isn't accepted), and the
+                seq of the last change of this kiosk included in them.
+        """
+        account = (answer["name"], answer["points"]) if answer.get("found") else None
+        applied = answer.get("applied", 0)
+        with self.cache_lock:
+            cached = self.cache.get(id)
+            # A lookup started before the last confirmed changes must not hide them
+            if cached is None or cached[2] <= applied:
+                self.cache[id] = (time.monotonic() + self.ttl, account, applied)
+        return account, applied
+
+    def lookup(self, id: str) -> tuple[tuple[str, float] | None, int]:
+        """Find the account of a card, from the cache if it's recent enough.
+
+        Args:
+            id (str): The id of the card.
+
+        Raises:
+            OSError: The server can't be reached.
+
+        Returns:
+            tuple[tuple[str, float] | None, int]: The name and the points (None if the id isn't accepted), and the
+                seq of the last change of this kiosk included in them.
+        """
+        with self.cache_lock:
+            cached = self.cache.get(id)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1], cached[2]
+
+        answer = self.pipeline([{"op": "lookup", "id": id, "device": self.device}])[0]
+        return self.remember(id, answer)
+
+    def add_points(self, changes: list[tuple[int, str, float]]):
+        """Send points changes, all in one round trip.
+
+        Args:
+            changes (list[tuple[int, str, float]]): The seq, the id and the points added/removed of each change.
+
+        Raises:
+            OSError: The server can't be reached, the changes may or may not have been applied.
+        """
+        answers = self.pipeline([
+            {"op": "add", "id": id, "delta": delta, "device": self.device, "seq": seq}
+            for seq, id, delta in changes
+        ])
+        for (_, id, _), answer in zip(changes, answers):
+            self.remember(id, answer)
+
+
+class Remote_Store(QtCore.QObject):
+    """The accounts of the server, with the local accounts when the server can't be reached.
+
+    It's used like an accounts.Account_Store. Each points change is applied
+    to the local accounts right away and numbered in an outbox, then sent by
+    the writer thread with his number. The server skips the numbers it
+    already applied, so a change whose answer was lost is simply sent again,
+    until the server confirms it (after an outage too).
+
+    A lookup never waits for the network: it answers from the local accounts
+    and asks the writer thread to read the balance from the server. That
+    balance is completed with the changes the server didn't confirm yet, the
+    local account is corrected to match it and points_signal tells the UI.
+
+    Args:
+        client (Account_Client): The client of the server.
+        local (accounts.Account_Store): The local accounts.
+        writer (persistence.Persistence_Thread, optional): The thread sending the changes. Defaults to None.
+        outbox_path (str, optional): The path of the outbox. Defaults to OUTBOX_FILE.
+        state_path (str, optional): The path of the last confirmed seq. Defaults to OUTBOX_STATE_FILE.
+    """
+
+    # Emitted with the id and the new points when the server changed a balance
+    points_signal = QtCore.pyqtSignal(str, float)
+    # Emitted by the writer thread with the id, the points, the applied seq and the confirmations of a lookup
+    fetched_signal = QtCore.pyqtSignal(str, float, int, int)
+
+    def __init__(self, client: Account_Client, local: accounts.Account_Store, writer=None,
+                 outbox_path: str = OUTBOX_FILE, state_path: str = OUTBOX_STATE_FILE) -> None:
+        super().__init__()
+        self.client = client
+        self.local = local
+        self.writer = writer
+        # The server already shares the points between the kiosks
+        self.replicator = None
+        # The server isn't asked before that time (monotonic clock)
+        self.retry_at = 0.0
+
+        self.state_path = state_path
+        self.acked = self.load_state()
+        self.outbox = journal.Balance_Journal(outbox_path)
+        # [seq, id, delta] of each change the server didn't confirm, seq is None until it's in the outbox
+        self.unsent = [[seq, id, delta] for seq, _, id, delta, _ in self.outbox.read() if seq > self.acked]
+        self.pending_lock = threading.Lock()
+        # Counts the confirmations, a balance read before the last one may miss changes that left unsent
+        self.confirmations = 0
+        # The outbox is emptied after each confirmation, the numbering goes on
+        self.outbox.replay(self.acked)
+
+        # The balances read by the writer thread are applied in the thread of the store (the UI)
+        self.fetched_signal.connect(self.apply_fetched)
+
+    @property
+    def writer(self):
+        return self.local.writer
+
+    @writer.setter
+    def writer(self, writer):
+        # The local accounts are saved by the same thread
+        self.local.writer = writer
+
+    def load_state(self) -> int:
+        """Read the seq of the last change confirmed by the server.
+
+        Returns:
+            int: The seq, 0 if nothing was confirmed yet.
+        """
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as file:
+                return json.load(file).get("acked", 0)
+        except FileNotFoundError:
+            return 0
+
+    def online(self) -> bool:
+        """Check if the server should be asked.
+
+        Returns:
+            bool: False for a while after a failure.
+        """
+        return time.monotonic() >= self.retry_at
+
+    def mark_offline(self, error: Exception):
+        """Stop asking the server for a while.
+
+        Args:
+            error (Exception): The reason.
+        """
+        print("Account server unreachable, using the local accounts: {}".format(error))
+        self.retry_at = time.monotonic() + RETRY_SECONDS
+
+    def run(self, function, *args, key: str):
+        """Run a job on the writer thread, or right away without it.
+
+        Args:
+            function (callable): The job.
+            *args: The arguments for the job.
+            key (str): The key of the job, a waiting job with the same key is replaced.
+        """
+        if self.writer is None:
+            function(*args)
+        else:
+            self.writer.submit(function, *args, key=key)
+
+    def lookup(self, id: str) -> tuple[str, float] | None:
+        """Find the account related to the given id, in the local accounts.
+
+        The balance on the server is read in the background, see apply_fetched().
+
+        Args:
+            id (str): A string representation of the id.
+
+        Returns:
+            tuple[str, float] | None: The name and the points of the user, None if the id isn't accepted.
+        """
+        id = str(id).strip()
+        account = self.local.lookup(id)
+        if account is not None and self.online():
+            self.run(self.fetch, id, key="account_fetch " + id)
+        return account
+
+    def fetch(self, id: str):
+        """Read a balance on the server (done by the writer thread).
+
+        Args:
+            id (str): The id of the card.
+        """
+        if not self.online():
+            return
+        with self.pending_lock:
+            confirmations = self.confirmations
+        try:
+            account, applied = self.client.lookup(id)
+        except (OSError, ValueError) as e:
+            self.mark_offline(e)
+            return
+        if account is not None:
+            self.fetched_signal.emit(id, account[1], applied, confirmations)
+
+    def apply_fetched(self, id: str, points: float, applied: int, confirmations: int):
+        """Bring the local account to the balance of the server, with the changes he didn't confirm yet.
+
+        Args:
+            id (str): The id of the card.
+            points (float): The points on the server.
+            applied (int): The seq of the last change of this kiosk in those points.
+            confirmations (int): The number of confirmations when the server was asked.
+        """
+        with self.pending_lock:
+            # Changes were confirmed in the meantime, the next lookup reads the balance again
+            if confirmations != self.confirmations:
+                return
+            points += sum(
+                delta for seq, change_id, delta in self.unsent
+                if change_id == id and (seq is None or seq > applied))
+
+        local = self.local.lookup(id)
+        if local is None or abs(local[1] - points) <= 1e-9:
+            return
+        # The other kiosks changed this balance, the local copy follows
+        self.local.add_points(id, points - local[1])
+        self.points_signal.emit(id, points)
+
+    def add_points(self, id: str, delta: float):
+        """Add (or remove) points to the given id, locally right away, then on the server.
+
+        Args:
+            id (str): A string representation of the id.
+            delta (float): The amount of points to add/remove.
+        """
+        id = str(id)
+        if self.local.lookup(id) is None:
+            return
+        self.local.add_points(id, delta)
+        with self.pending_lock:
+            self.unsent.append([None, id, delta])
+        self.run(self.send_pending, key="account_server")
+
+    def send_pending(self):
+        """Number the new changes in the outbox, then send every change the server didn't confirm.
+
+        If the server can't be reached (or the answer is lost), nothing is
+        lost: the changes stay in the outbox and are sent again later.
+        """
+        with self.pending_lock:
+            new = [change for change in self.unsent if change[0] is None]
+        for change in new:
+            seq = self.outbox.append(change[1], change[2])
+            with self.pending_lock:
+                change[0] = seq
+
+        with self.pending_lock:
+            changes = [tuple(change) for change in self.unsent]
+        if not changes or not self.online():
+            return
+
+        try:
+            self.client.add_points(changes)
+        except (OSError, ValueError) as e:
+            self.mark_offline(e)
+            return
+
+        storage.write_atomic(self.state_path, json.dumps({"acked": changes[-1][0]}))
+        with self.pending_lock:
+            self.acked = changes[-1][0]
+            self.unsent = [change for change in self.unsent if change[0] is None or change[0] > self.acked]
+            self.confirmations += 1
+        # Everything written in the outbox is confirmed
+        self.outbox.truncate()
+
+
+def make_store(address: str, local: accounts.Account_Store) -> Remote_Store:
+    """Get a store using the given account server.
+
+    Args:
+        address (str): The address of the server, like "192.168.1.10:5050".
+        local (accounts.Account_Store): The local accounts, used when the server can't be reached.
+
+    Returns:
+        Remote_Store: The store.
+    """
+    return Remote_Store(Account_Client(parse_address(address)), local)
+
+
+if __name__ == "__main__":
+    import sys
+
+    # python account_server.py [host[:port]]
+    arguments = sys.argv[1:]
+    address = parse_address(arguments[0] if arguments else "0.0.0.0")
+
+    store = accounts.Account_Store(storage.make_backend(accounts.STORAGE_BACKEND))
+    server = Account_Server(address, store)
+    print("Serving the accounts on {}:{}".format(*server.server_address))
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        store.backend.close()
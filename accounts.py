@@ -0,0 +1,167 @@
+import os
+import threading
+
+import metrics
+import replication
+import storage
+
+
+# The storage backend used by the app, "text" or "sqlite"
+STORAGE_BACKEND = os.environ.get("MIXOMAT_STORAGE", "text")
+# "host:port" of the account server shared by the kiosks, empty to only use the local accounts
+ACCOUNT_SERVER = os.environ.get("MIXOMAT_ACCOUNT_SERVER", "")
+
+
+class Account_Store:
+    """An in-memory index of the accepted ids.
+
+    The accounts are loaded once from the backend and kept in a dict keyed by
+    the card id, so a lookup doesn't need any disk access. The backend is asked
+    before each lookup if someone changed the accounts behind our back.
+
+    When a writer (persistence.Persistence_Thread) is given, the changes are
+    saved by the writer thread and the caller never waits on the disk.
+
+    Args:
+        backend (storage.Storage_Backend, optional): Where the accounts are stored. Defaults to a storage.Text_Backend.
+        writer (persistence.Persistence_Thread, optional): The thread doing the writes. Defaults to None (write directly).
+    """
+
+    def __init__(self, backend: storage.Storage_Backend = None, writer=None) -> None:
+        if backend is None:
+            backend = storage.Text_Backend()
+        self.backend = backend
+        self.writer = writer
+        # Held by whoever uses the backend, the UI and the writer thread never use it at the same time
+        self.lock = threading.Lock()
+        # id -> [name, points]
+        self.accounts = {}
+        # Shares the changes with the other kiosks, see replication.py
+        self.replicator = None
+        # device -> seq of the last change of that device saved here
+        self.applied = {}
+        self.reload()
+
+    def reload(self):
+        """Load all the accounts from the backend and rebuild the index.
+        """
+        self.accounts = self.backend.load()
+        self.applied = self.backend.applied()
+
+    def refresh(self):
+        """Reload the accounts only if they were changed since the last load.
+
+        If the writer is busy with the backend, we don't wait for it and keep
+        the index as it is, the next lookup will check again.
+        """
+        if not self.lock.acquire(blocking=False):
+            return
+        try:
+            if self.backend.changed():
+                self.reload()
+        finally:
+            self.lock.release()
+
+    def lookup(self, id: str) -> tuple[str, float] | None:
+        """Find the account related to the given id.
+
+        Args:
+            id (str): A string representation of the id.
+
+        Returns:
+            tuple[str, float] | None: The name and the points of the user, None if the id isn't accepted.
+        """
+        self.refresh()
+        account = self.accounts.get(str(id).strip())
+        if account is None:
+            return None
+        return account[0], account[1]
+
+    def add_points(self, id: str, delta: float):
+        """Add (or remove) points to the given id and save the change.
+
+        Args:
+            id (str): A string representation of the id.
+            delta (float): The amount of points to add/remove.
+        """
+        self.refresh()
+        id = str(id)
+        account = self.accounts.get(id)
+        if account is None:
+            return
+
+        account[1] += delta
+        if self.writer is None:
+            self.save_points(id, delta)
+        else:
+            self.writer.submit(self.save_points, id, delta)
+
+    @metrics.timed("points_write_seconds", "Duration of the write of a points change")
+    def save_points(self, id: str, delta: float):
+        """Save a points change in the backend.
+
+        Args:
+            id (str): A string representation of the id.
+            delta (float): The amount of points added/removed.
+        """
+        # The replicator shares it from the backend, there is nothing else to write
+        with self.lock:
+            self.backend.add_points(id, delta)
+
+    def apply_remote(self, id: str, delta: float, origin: tuple[str, int]) -> bool:
+        """Apply and save a points change made on another kiosk, only once.
+
+        The origin is saved in the same write as the change, so a change
+        applied just before a power cut is recognized and skipped afterwards.
+
+        Args:
+            id (str): A string representation of the id.
+            delta (float): The amount of points added/removed.
+            origin (tuple[str, int]): The device that made the change and his seq on that device.
+
+        Returns:
+            bool: True if the change was applied, False if it was already applied (or the id isn't accepted).
+        """
+        device, seq = origin
+        with self.lock:
+            if seq <= self.applied.get(device, 0):
+                return False
+            account = self.accounts.get(id)
+            # An id that isn't accepted on this kiosk has nothing to update
+            if account is None:
+                return False
+            account[1] += delta
+            self.backend.add_points(id, delta, origin)
+            self.applied[device] = seq
+            return True
+
+
+_store = None
+
+
+def get_store() -> Account_Store:
+    """Get the Account_Store shared by the whole app, create it on the first call.
+
+    With an ACCOUNT_SERVER, it's an account_server.Remote_Store that uses the
+    local accounts while the server can't be reached. Without it, the changes
+    can be shared through a replication.REPLICATION_HUB.
+
+    Raises:
+        ValueError: The accounts are shared but this kiosk has no unique id.
+
+    Returns:
+        Account_Store: The shared Account_Store.
+    """
+    global _store
+    if _store is None:
+        # The other kiosks and the server tell the kiosks apart by their id
+        if ACCOUNT_SERVER or replication.REPLICATION_HUB:
+            replication.check_device_id(replication.DEVICE_ID)
+        _store = Account_Store(storage.make_backend(STORAGE_BACKEND))
+        if ACCOUNT_SERVER:
+            # Imported here, the server module needs this one
+            import account_server
+            _store = account_server.make_store(ACCOUNT_SERVER, _store)
+        elif replication.REPLICATION_HUB:
+            _store.replicator = replication.Replicator(_store, replication.REPLICATION_HUB)
+    return _store
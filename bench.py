@@ -0,0 +1,313 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from PyQt5 import QtCore
+
+import loadtest
+
+
+# The number of accepted cards of each synthetic roster
+SIZES = [1000, 10000, 100000]
+BASELINE_FILE = "bench_baseline.json"
+# A benchmark regresses when his median is that much slower than in the baseline (0.25 = 25 %)
+THRESHOLD = 0.25
+# Below that, the differences are the noise of the machine (and nobody sees them on the screen)
+MIN_SECONDS = 5e-5
+# The number of calls of each benchmark (the sweeps are done SWEEPS times)
+LOOKUPS = 5000
+SAVES = 2000
+CONSTRUCTIONS = 30
+SWEEPS = 5
+# Each roster is measured in that many processes, a benchmark keeps his fastest run (the others were disturbed)
+RUNS = 5
+
+
+def measure(samples: list[float], function, *args):
+    """Call a function once and add his duration to the samples.
+
+    Args:
+        samples (list[float]): The durations (in seconds) measured so far.
+        function (callable): The function to measure.
+        *args: The arguments for the function.
+    """
+    start = time.perf_counter()
+    function(*args)
+    samples.append(time.perf_counter() - start)
+
+
+def stats(samples: list[float]) -> dict:
+    """Get the statistics of a benchmark.
+
+    Args:
+        samples (list[float]): The durations (in seconds) of each call.
+
+    Returns:
+        dict: The number of calls, the mean, the min, the median and the p99, in seconds.
+    """
+    values = sorted(samples)
+    return {
+        "n": len(values),
+        "mean": sum(values) / len(values) if values else 0.0,
+        "min": values[0] if values else 0.0,
+        "p50": loadtest.percentile(values, 0.5),
+        "p99": loadtest.percentile(values, 0.99),
+    }
+
+
+class Paint_Counter(QtCore.QObject):
+    """Counts the paint events of a widget, to check that a benchmark really painted.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.paints = 0
+
+    def eventFilter(self, watched: QtCore.QObject, event: QtCore.QEvent) -> bool:
+        if event.type() == QtCore.QEvent.Type.Paint:
+            self.paints += 1
+        return False
+
+
+def wait_for_writer(writer, timeout: float = 60):
+    """Wait until the persistence thread has written everything.
+
+    Args:
+        writer (persistence.Persistence_Thread): The thread doing the writes.
+        timeout (float, optional): The maximum seconds to wait. Defaults to 60.
+    """
+    start = time.perf_counter()
+    while writer.pending() and time.perf_counter() - start < timeout:
+        time.sleep(0.001)
+
+
+def run(cards: int) -> dict:
+    """Run every benchmark on a roster of the given size, in the current directory.
+
+    Args:
+        cards (int): The number of accepted cards.
+
+    Returns:
+        dict: A dict matching each benchmark with his statistics.
+    """
+    # Imported here, once the environment is set
+    from PyQt5 import QtWidgets
+
+    import accounts
+    import persistence
+    import theme
+    import windows
+    import workers
+
+    app = QtWidgets.QApplication(sys.argv)
+    theme.install(app)
+    window = windows.Window()
+    window.finish_boot()
+    import tabs
+
+    results = {}
+
+    # The lookup of a card, half of them unknown
+    samples = []
+    for index in range(LOOKUPS):
+        card = 1000000 + (index * 7919) % (cards * 2)
+        measure(samples, windows.check_accepted_id, str(card))
+    results["check_accepted_id"] = stats(samples)
+
+    window.check_id(str(1000000))
+    vertical_tabs = window.tabs
+
+    # A points change, as the UI sees it (the writer thread does the write)
+    samples = []
+    for index in range(SAVES):
+        vertical_tabs.user_id = str(1000000 + (index * 7919) % cards)
+        measure(samples, vertical_tabs.save_accepted, -1)
+    results["save_accepted"] = stats(samples)
+    # Then the write itself, once the writer thread is done
+    wait_for_writer(persistence.get_writer())
+    store = accounts.get_store()
+    store.writer = None
+    samples = []
+    for index in range(SAVES):
+        measure(samples, store.save_points, str(1000000 + (index * 7919) % cards), -1)
+    results["save_points"] = stats(samples)
+
+    # The tabs of the first login, with every tab built
+    samples = []
+    for _ in range(CONSTRUCTIONS):
+        start = time.perf_counter()
+        built = tabs.Vertical_Tabs((str(1000000), "Guest 0", loadtest.POINTS), window.leds)
+        for name in built.CONTENTS.factories:
+            built.CONTENTS[name]
+        samples.append(time.perf_counter() - start)
+        built.deleteLater()
+        app.processEvents()
+    results["vertical_tabs_init"] = stats(samples)
+
+    # Every position of two sliders, the way the mixer fills the glass, with the painting
+    tab2 = vertical_tabs.CONTENTS["2"]
+    vertical_tabs.change_tab(tab2)
+    app.processEvents()
+    glass = tab2.glass
+    if not glass.isVisible():
+        raise RuntimeError("the glass isn't on the screen, nothing would be painted")
+    counter = Paint_Counter()
+    glass.installEventFilter(counter)
+    # Each position is measured once per sweep and keeps his best time, the painting is noisy
+    best = {}
+    for _ in range(SWEEPS):
+        for sl1 in range(glass.capacity + 1):
+            for sl2 in range(glass.capacity + 1 - sl1):
+                start = time.perf_counter()
+                glass.set_layers([
+                    ("{} cl".format(sl1), sl1, theme.color("alcoholic")),
+                    ("{} cl".format(sl2), sl2, theme.color("soft")),
+                ])
+                glass.repaint()
+                duration = time.perf_counter() - start
+                best[sl1, sl2] = min(best.get((sl1, sl2), duration), duration)
+    glass.removeEventFilter(counter)
+    changes = SWEEPS * len(best)
+    if counter.paints < changes:
+        raise RuntimeError("the glass was painted {} times for {} changes".format(counter.paints, changes))
+    results["drink_glass_sweep"] = stats(list(best.values()))
+
+    # Every pump takes every ingredient once (with the save of the config)
+    vertical_tabs.CONTENTS["3"].set_real_layout()
+    multiple_pump = vertical_tabs.CONTENTS["3"].pumps
+    samples = []
+    for _ in range(SWEEPS):
+        for pump in list(multiple_pump.pin_for_pump.values()):
+            for index in range(pump.dropdown.count()):
+                # The save of the previous config must not compete with this one
+                wait_for_writer(persistence.get_writer())
+                measure(samples, multiple_pump.change_other_dropdown,
+                        pump, pump.current_selected_item, pump.dropdown.itemText(index))
+    results["change_other_dropdown"] = stats(samples)
+
+    workers.get_manager().stop_all()
+    return results
+
+
+def run_child(cards: int) -> dict:
+    """Run the benchmarks of one roster in a new process, in a temporary directory.
+
+    Each roster needs his own process, the accounts are only loaded once per process.
+
+    Args:
+        cards (int): The number of accepted cards.
+
+    Returns:
+        dict: A dict matching each benchmark with his statistics.
+    """
+    directory = tempfile.mkdtemp(prefix="mixomat-bench-")
+    try:
+        loadtest.prepare(directory, cards)
+        output = os.path.join(directory, "result.json")
+        environment = dict(os.environ, QT_QPA_PLATFORM=os.environ.get("QT_QPA_PLATFORM", "offscreen"),
+                           MIXOMAT_HARDWARE="sim", MIXOMAT_METRICS_FILE="")
+        subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", str(cards), "--output", output],
+            cwd=directory, env=environment, check=True, stdout=subprocess.DEVNULL)
+        with open(output, "r", encoding="utf-8") as file:
+            return json.load(file)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def best_of(runs: list[dict]) -> dict:
+    """Keep the fastest run of each benchmark.
+
+    Args:
+        runs (list[dict]): The results of each run, {benchmark: statistics}.
+
+    Returns:
+        dict: A dict matching each benchmark with the statistics of his run with the lowest median.
+    """
+    return {name: min((run[name] for run in runs), key=lambda result: result["p50"]) for name in runs[0]}
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """Find the benchmarks slower than in the baseline.
+
+    Args:
+        results (dict): The results, {roster size: {benchmark: statistics}}.
+        baseline (dict): The results of the baseline.
+        threshold (float): The accepted slowdown, 0.25 for 25 %.
+
+    Returns:
+        list[str]: A line for each regression.
+    """
+    regressions = []
+    for size, benchmarks in results.items():
+        for name, current in benchmarks.items():
+            reference = baseline.get(size, {}).get(name)
+            if reference is None:
+                continue
+            before = max(reference["p50"], MIN_SECONDS)
+            after = max(current["p50"], MIN_SECONDS)
+            if after > before * (1 + threshold):
+                regressions.append("{} cards, {}: {:.3f} ms -> {:.3f} ms (+{:.0%})".format(
+                    size, name, before * 1000, after * 1000, after / before - 1))
+    return regressions
+
+
+def report(results: dict):
+    """Print the median and the p99 of each benchmark.
+
+    Args:
+        results (dict): The results, {roster size: {benchmark: statistics}}.
+    """
+    for size, benchmarks in results.items():
+        print("{} cards".format(size))
+        for name, result in benchmarks.items():
+            print("  {:<24} n={:<6} p50={:9.3f} ms  p99={:9.3f} ms".format(
+                name, result["n"], result["p50"] * 1000, result["p99"] * 1000))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the storage, lookup and widget hot paths.")
+    parser.add_argument("--sizes", default=",".join(map(str, SIZES)),
+                        help="the roster sizes, comma separated")
+    parser.add_argument("--output", help="write the results to this json file")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="the json file of the baseline")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="the accepted slowdown (0.25 = 25 %%)")
+    parser.add_argument("--runs", type=int, default=RUNS, help="the number of runs of each roster")
+    parser.add_argument("--save-baseline", action="store_true", help="save the results as the new baseline")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    arguments = parser.parse_args()
+
+    if arguments.child is not None:
+        # Started by run_child(), in the directory of the roster
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        with open(arguments.output, "w", encoding="utf-8") as file:
+            json.dump(run(arguments.child), file)
+        sys.exit(0)
+
+    results = {}
+    for size in arguments.sizes.split(","):
+        results[size] = best_of([run_child(int(size)) for _ in range(arguments.runs)])
+    report(results)
+
+    document = {"python": platform.python_version(), "machine": platform.machine(), "results": results}
+    if arguments.output:
+        with open(arguments.output, "w", encoding="utf-8") as file:
+            json.dump(document, file, indent=4)
+    if arguments.save_baseline:
+        with open(arguments.baseline, "w", encoding="utf-8") as file:
+            json.dump(document, file, indent=4)
+        print("Baseline saved to {}".format(arguments.baseline))
+    elif os.path.exists(arguments.baseline):
+        with open(arguments.baseline, "r", encoding="utf-8") as file:
+            regressions = compare(results, json.load(file)["results"], arguments.threshold)
+        for line in regressions:
+            print("REGRESSION " + line)
+        sys.exit(1 if regressions else 0)
+    else:
+        print("No baseline ({}), run with --save-baseline to create it".format(arguments.baseline))
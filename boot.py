@@ -0,0 +1,140 @@
+import os
+import time
+
+
+# Imported first by windows.py, so the clock starts before anything heavy
+_start = time.monotonic()
+
+# The targets on the Pi (seconds since the process started)
+TARGET_FIRST_PIXEL = float(os.environ.get("MIXOMAT_TARGET_FIRST_PIXEL", 1.5))
+TARGET_READY = float(os.environ.get("MIXOMAT_TARGET_READY", 5.0))
+# The splash screen is drawn once and saved, the next boots only load the picture
+SPLASH_FILE = os.path.join("icons", "splash.png")
+SPLASH_SIZE = (480, 320)
+
+
+def process_age() -> float:
+    """Get the time since the process started, to count the start of Python itself.
+
+    Returns:
+        float: The seconds since the process started, 0 if it can't be known (not on Linux).
+    """
+    try:
+        with open("/proc/self/stat", "r") as file:
+            # The fields after the name of the program, the start time is the 22nd field
+            start_ticks = int(file.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime", "r") as file:
+            uptime = float(file.read().split()[0])
+        return max(0.0, uptime - start_ticks / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError):
+        return 0.0
+
+
+class Boot_Timer:
+    """Times each phase of the start of the app.
+
+    Args:
+        start (float): The time (monotonic clock) the timer starts at.
+        before_start (float, optional): The seconds the process ran before the start. Defaults to 0.
+    """
+
+    def __init__(self, start: float, before_start: float = 0.0) -> None:
+        self.start = start
+        self.last = start
+        # [(phase, seconds), ...] in order
+        self.phases = [("python", before_start)] if before_start else []
+        self.offset = before_start
+        self.first_pixel = None
+        self.ready = None
+
+    def mark(self, phase: str) -> float:
+        """End a phase, the next one starts now.
+
+        Args:
+            phase (str): The name of the phase that just ended.
+
+        Returns:
+            float: The seconds since the process started.
+        """
+        now = time.monotonic()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+        return self.offset + now - self.start
+
+    def mark_first_pixel(self, phase: str = "splash"):
+        """End a phase, the user sees something on the screen.
+
+        Args:
+            phase (str, optional): The name of the phase that just ended. Defaults to "splash".
+        """
+        self.first_pixel = self.mark(phase)
+
+    def mark_ready(self, phase: str = "ready"):
+        """End a phase, a card can be tapped.
+
+        Args:
+            phase (str, optional): The name of the phase that just ended. Defaults to "ready".
+        """
+        self.ready = self.mark(phase)
+
+    def report(self) -> str:
+        """Get the time of each phase and the two milestones against their targets.
+
+        Returns:
+            str: The report, one line per phase.
+        """
+        lines = ["Boot:"]
+        for phase, seconds in self.phases:
+            lines.append("  {:<16}{:8.1f} ms".format(phase, seconds * 1000))
+        for name, value, target in (
+            ("first pixel", self.first_pixel, TARGET_FIRST_PIXEL),
+            ("ready for tap", self.ready, TARGET_READY),
+        ):
+            if value is not None:
+                lines.append("  {:<16}{:8.2f} s (target {:.2f} s{})".format(
+                    name, value, target, "" if value <= target else ", MISSED"))
+        return "\n".join(lines)
+
+
+_timer = None
+
+
+def get_timer() -> Boot_Timer:
+    """Get the Boot_Timer of the app, it started when this module was imported.
+
+    Returns:
+        Boot_Timer: The shared Boot_Timer.
+    """
+    global _timer
+    if _timer is None:
+        _timer = Boot_Timer(_start, process_age() - (time.monotonic() - _start))
+    return _timer
+
+
+def show_splash():
+    """Show the splash screen as soon as the QApplication exists.
+
+    Returns:
+        QtWidgets.QSplashScreen: The splash screen, finish() it once the window is ready.
+    """
+    from PyQt5 import QtCore, QtGui, QtWidgets
+
+    import theme
+
+    pixmap = QtGui.QPixmap(SPLASH_FILE)
+    if pixmap.isNull():
+        # First boot, we draw it and keep it for the next ones
+        pixmap = QtGui.QPixmap(*SPLASH_SIZE)
+        pixmap.fill(theme.color("background"))
+        painter = QtGui.QPainter(pixmap)
+        painter.setPen(theme.color("text"))
+        painter.setFont(QtGui.QFont("Arial", 40))
+        painter.drawText(pixmap.rect(), QtCore.Qt.AlignmentFlag.AlignCenter, "MIXOMAT 3000")
+        painter.end()
+        pixmap.save(SPLASH_FILE)
+
+    splash = QtWidgets.QSplashScreen(pixmap)
+    splash.show()
+    # Painted now, not when the event loop starts
+    QtWidgets.QApplication.processEvents()
+    return splash
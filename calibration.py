@@ -0,0 +1,137 @@
+import json
+
+import persistence
+
+
+CALIBRATION_FILE = "calibration.json"
+ML_PER_CL = 10
+# With those defaults 1 cl takes 1 second, like before the calibration existed
+DEFAULT_ML_PER_SECOND = 10.0
+DEFAULT_DEAD_VOLUME_ML = 0.0
+# How long the pump runs during a calibration
+REFERENCE_SECONDS = 10
+# How long each pump runs during a cleaning
+CLEAN_SECONDS = 10
+
+
+class Calibration:
+    """The flow rate of each pump, used to turn a volume into a running time.
+
+    Each pump has a flow rate (in ml per second, measured with water or
+    whatever liquid was used to calibrate it) and a dead volume (the liquid
+    needed to fill the tube before anything comes out). Thicker liquids can
+    have a viscosity factor, 1.2 means it flows 20% slower.
+
+    Args:
+        path (str, optional): The path of the calibration file. Defaults to CALIBRATION_FILE.
+    """
+
+    def __init__(self, path: str = CALIBRATION_FILE) -> None:
+        self.path = path
+        # pin -> {"ml_per_second": float, "dead_volume_ml": float}
+        self.pumps = {}
+        # liquid -> factor
+        self.viscosity = {}
+        self.load()
+
+    def load(self):
+        """Read the calibration file, a missing file means every pump uses the defaults.
+        """
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                data = json.load(file)
+        except FileNotFoundError:
+            return
+
+        self.pumps = data.get("pumps", {})
+        self.viscosity = data.get("viscosity", {})
+
+    def save(self):
+        """Save the calibration (done by the persistence thread).
+        """
+        data = {"pumps": self.pumps, "viscosity": self.viscosity}
+        text = json.dumps(data, ensure_ascii=False, indent=4)
+        persistence.get_writer().write_file(self.path, text)
+
+    def get_pump(self, pin: str) -> tuple[float, float]:
+        """Get the calibration of a pump.
+
+        Args:
+            pin (str): The pin number of the pump.
+
+        Returns:
+            tuple[float, float]: The flow rate (ml/s) and the dead volume (ml).
+        """
+        pump = self.pumps.get(str(pin), {})
+        return (
+            pump.get("ml_per_second", DEFAULT_ML_PER_SECOND),
+            pump.get("dead_volume_ml", DEFAULT_DEAD_VOLUME_ML),
+        )
+
+    def duration(self, pin: str, liquid: str, ml: float) -> float:
+        """Get the time a pump needs to run to pour the given volume.
+
+        Args:
+            pin (str): The pin number of the pump.
+            liquid (str): The name of the liquid in the pump.
+            ml (float): The wanted volume in ml.
+
+        Returns:
+            float: The running time in seconds.
+        """
+        if ml <= 0:
+            return 0.0
+
+        ml_per_second, dead_volume_ml = self.get_pump(pin)
+        factor = self.viscosity.get(liquid, 1.0)
+        return (ml + dead_volume_ml) * factor / ml_per_second
+
+    def volume(self, pin: str, liquid: str, seconds: float) -> float:
+        """Get the volume a pump pours when it runs for the given time.
+
+        Args:
+            pin (str): The pin number of the pump.
+            liquid (str): The name of the liquid in the pump.
+            seconds (float): The running time in seconds.
+
+        Returns:
+            float: The poured volume in ml.
+        """
+        ml_per_second, dead_volume_ml = self.get_pump(pin)
+        factor = self.viscosity.get(liquid, 1.0)
+        return max(0.0, seconds * ml_per_second / factor - dead_volume_ml)
+
+    def calibrate(self, pin: str, liquid: str, seconds: float, measured_ml: float):
+        """Compute the flow rate of a pump from a reference pour.
+
+        Args:
+            pin (str): The pin number of the pump.
+            liquid (str): The liquid that was poured.
+            seconds (float): How long the pump ran.
+            measured_ml (float): The volume that came out of the pump.
+        """
+        _, dead_volume_ml = self.get_pump(pin)
+        factor = self.viscosity.get(liquid, 1.0)
+        # The pump had to fill the tube before pouring, so it really moved measured + dead volume
+        ml_per_second = (measured_ml + dead_volume_ml) * factor / seconds
+
+        self.pumps[str(pin)] = {
+            "ml_per_second": ml_per_second,
+            "dead_volume_ml": dead_volume_ml,
+        }
+        self.save()
+
+
+_calibration = None
+
+
+def get_calibration() -> Calibration:
+    """Get the Calibration shared by the whole app, load it on the first call.
+
+    Returns:
+        Calibration: The shared Calibration.
+    """
+    global _calibration
+    if _calibration is None:
+        _calibration = Calibration()
+    return _calibration
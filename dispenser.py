@@ -0,0 +1,106 @@
+import time
+
+
+class Dispense_Job:
+    """A pour where each pump runs at the same time, but for his own duration.
+
+    All the deadlines are taken from the monotonic clock when the job starts,
+    so the sleeps can't add up to a drift and each pump is switched off at
+    his own deadline. The start and the total duration are read by the UI to
+    draw the progress, the job itself never reports it.
+
+    Args:
+        durations (dict): A dict matching each pump (LED) with the seconds it needs to run.
+    """
+
+    def __init__(self, durations: dict) -> None:
+        # A pump with nothing to pour isn't switched on at all
+        self.durations = {
+            pump: seconds for pump, seconds in durations.items() if seconds > 0
+        }
+        self.total = max(self.durations.values(), default=0)
+        self.started = None
+        self.deadlines = {}
+        self.running = {}
+        self.cancelled = False
+
+    def start(self, now: float):
+        """Switch on every pump and compute their deadlines.
+
+        Args:
+            now (float): The current time of the monotonic clock.
+        """
+        self.started = now
+        for pump, seconds in self.durations.items():
+            self.deadlines[pump] = now + seconds
+            pump.on()
+            self.running[pump] = True
+
+    def update(self, now: float) -> float | None:
+        """Switch off the pumps whose deadline is passed.
+
+        Args:
+            now (float): The current time of the monotonic clock.
+
+        Returns:
+            float | None: The next deadline, None if every pump is switched off.
+        """
+        next_deadline = None
+        for pump, deadline in self.deadlines.items():
+            if not self.running[pump]:
+                continue
+            if deadline <= now:
+                pump.off()
+                self.running[pump] = False
+            elif next_deadline is None or deadline < next_deadline:
+                next_deadline = deadline
+        return next_deadline
+
+    def progress(self, now: float) -> int:
+        """Get the progress of the whole job.
+
+        Args:
+            now (float): The current time of the monotonic clock.
+
+        Returns:
+            int: The percentage of completion.
+        """
+        if self.started is None:
+            return 0
+        if self.total <= 0:
+            return 100
+        return min(100, int((now - self.started) * 100 / self.total))
+
+    def cancel(self):
+        """Ask the job to stop, the pumps are switched off at the next wake up.
+        """
+        self.cancelled = True
+
+    def stop(self):
+        """Switch off every pump still running.
+        """
+        for pump, running in self.running.items():
+            if running:
+                pump.off()
+                self.running[pump] = False
+
+    def run(self, clock=time.monotonic, sleep=time.sleep):
+        """Do the whole pour, blocking until every pump is switched off.
+
+        The thread only wakes up at the deadlines of the pumps, the progress is
+        read from the UI with progress().
+
+        Args:
+            clock (callable, optional): The monotonic clock. Defaults to time.monotonic.
+            sleep (callable, optional): The sleep function, something that returns early (like
+                threading.Event.wait) makes cancel() immediate. Defaults to time.sleep.
+        """
+        try:
+            self.start(clock())
+            while not self.cancelled:
+                next_deadline = self.update(clock())
+                if next_deadline is None:
+                    return
+                sleep(max(0, next_deadline - clock()))
+        finally:
+            self.stop()
@@ -0,0 +1,103 @@
+import collections
+import os
+import threading
+
+
+# "pi" drives the real pumps and RFID reader, "sim" simulates them (no Pi needed)
+HARDWARE = os.environ.get("MIXOMAT_HARDWARE", "pi")
+
+
+class Sim_Pump:
+    """A pump that only remembers its state, used instead of a gpiozero LED off the Pi.
+
+    Args:
+        pin (int): The pin number of the pump.
+    """
+
+    def __init__(self, pin: int) -> None:
+        self.pin = pin
+        self.is_lit = False
+        # How many times the pump was switched on
+        self.runs = 0
+
+    def on(self):
+        """Switch the pump on.
+        """
+        if not self.is_lit:
+            self.runs += 1
+        self.is_lit = True
+
+    def off(self):
+        """Switch the pump off.
+        """
+        self.is_lit = False
+
+
+class Fake_Reader:
+    """A reader that can be used instead of the MFRC522 when we aren't on the Pi.
+
+    Args:
+        ids (list[str], optional): Cards that will be "tapped" one after the other. Defaults to None.
+    """
+
+    def __init__(self, ids: list[str] = None) -> None:
+        self.lock = threading.Lock()
+        self.ids = collections.deque(ids or [])
+
+    def tap(self, id: str):
+        """Put a card on the reader, it's read once.
+
+        Args:
+            id (str): A string representation of the id.
+        """
+        with self.lock:
+            self.ids.append(id)
+
+    def read_id_no_block(self):
+        """Read the card on the reader, like SimpleMFRC522.read_id_no_block().
+
+        Returns:
+            str | None: The id of the card, None if there's no card.
+        """
+        with self.lock:
+            if self.ids:
+                return self.ids.popleft()
+        return None
+
+
+def is_simulated() -> bool:
+    """Check if the hardware is simulated.
+
+    Returns:
+        bool: True if HARDWARE is "sim".
+    """
+    return HARDWARE == "sim"
+
+
+def make_pump(pin: str):
+    """Get the output driving a pump.
+
+    Args:
+        pin (str): The pin number of the pump.
+
+    Returns:
+        gpiozero.LED | Sim_Pump: Something with on() and off() methods.
+    """
+    if is_simulated():
+        return Sim_Pump(int(pin))
+    # Only imported on the Pi, the library needs the GPIOs
+    from gpiozero import LED
+    return LED(int(pin))
+
+
+def make_reader():
+    """Get the RFID reader.
+
+    Returns:
+        mfrc522.SimpleMFRC522 | Fake_Reader: Something with a read_id_no_block() method.
+    """
+    if is_simulated():
+        return Fake_Reader()
+    # Only imported on the Pi, the library needs the SPI bus
+    from mfrc522 import SimpleMFRC522
+    return SimpleMFRC522()
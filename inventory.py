@@ -0,0 +1,232 @@
+import json
+import time
+
+import persistence
+
+
+INVENTORY_FILE = "inventory.json"
+# A pump that was never filled in the Tab3 is supposed to have a full bottle
+DEFAULT_CAPACITY_ML = 1000.0
+# Below this level the pump is blocked, so it can't run dry (this last bit is never poured)
+LOW_STOCK_ML = 50.0
+# Weight of the last pour in the moving average of the consumption
+RATE_SMOOTHING = 0.2
+SECONDS_PER_HOUR = 3600
+
+
+class Inventory:
+    """How much liquid is left behind each pump.
+
+    Each served order removes his calibrated volume from the levels, and the
+    consumption of each pump is followed with an exponential moving average
+    (in ml per hour) to predict when it will be empty. The volumes of the
+    orders waiting in the queue are reserved until they are served, so an
+    order is only accepted if it fits in what is left after them.
+
+    Args:
+        path (str, optional): The path of the inventory file. Defaults to INVENTORY_FILE.
+    """
+
+    def __init__(self, path: str = INVENTORY_FILE) -> None:
+        self.path = path
+        # pin -> {"level_ml", "capacity_ml", "ml_per_hour", "last_pour"}
+        self.pumps = {}
+        # pin -> ml reserved by the orders in the queue, only kept in memory
+        self.reserved = {}
+        self.load()
+
+    def load(self):
+        """Read the inventory file, a missing file means every bottle is full.
+        """
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                self.pumps = json.load(file)
+        except FileNotFoundError:
+            self.pumps = {}
+
+    def save(self):
+        """Save the inventory (done by the persistence thread, only the last state is written).
+        """
+        text = json.dumps(self.pumps, ensure_ascii=False, indent=4)
+        persistence.get_writer().write_file(self.path, text)
+
+    def get_pump(self, pin: str) -> dict:
+        """Get the inventory of a pump, create it with a full bottle if needed.
+
+        Args:
+            pin (str): The pin number of the pump.
+
+        Returns:
+            dict: The level and capacity (ml), the consumption (ml/h) and the time of the last pour.
+        """
+        pin = str(pin)
+        if pin not in self.pumps:
+            self.pumps[pin] = {
+                "level_ml": DEFAULT_CAPACITY_ML,
+                "capacity_ml": DEFAULT_CAPACITY_ML,
+                "ml_per_hour": 0.0,
+                "last_pour": None,
+            }
+        return self.pumps[pin]
+
+    def level(self, pin: str) -> float:
+        """Get the liquid left behind a pump.
+
+        Args:
+            pin (str): The pin number of the pump.
+
+        Returns:
+            float: The level in ml.
+        """
+        return self.get_pump(pin)["level_ml"]
+
+    def is_low(self, pin: str) -> bool:
+        """Check if a pump is (almost) empty.
+
+        Args:
+            pin (str): The pin number of the pump.
+
+        Returns:
+            bool: True if the pump is blocked.
+        """
+        return self.level(pin) < LOW_STOCK_ML
+
+    def free(self, pin: str) -> float:
+        """Get the volume that can still be ordered from a pump.
+
+        Args:
+            pin (str): The pin number of the pump.
+
+        Returns:
+            float: The level minus the reserved volume and the last LOW_STOCK_ML, in ml.
+        """
+        return self.level(pin) - self.reserved.get(str(pin), 0.0) - LOW_STOCK_ML
+
+    def missing(self, volumes: dict) -> list[str]:
+        """Get the pumps that can't pour the given volumes.
+
+        Args:
+            volumes (dict): A dict matching each pin with the volume (ml) to pour.
+
+        Returns:
+            list[str]: The pins without enough left, empty if the volumes fit.
+        """
+        return [pin for pin, ml in volumes.items() if ml > self.free(pin)]
+
+    def reserve(self, volumes: dict):
+        """Keep some volumes for an order that was accepted.
+
+        Args:
+            volumes (dict): A dict matching each pin with the volume (ml) to pour.
+        """
+        for pin, ml in volumes.items():
+            self.reserved[str(pin)] = self.reserved.get(str(pin), 0.0) + ml
+
+    def release(self, volumes: dict):
+        """Give back the volumes of an order that left the queue.
+
+        Args:
+            volumes (dict): A dict matching each pin with the volume (ml) that was reserved.
+        """
+        for pin, ml in volumes.items():
+            left = self.reserved.get(str(pin), 0.0) - ml
+            if left > 1e-6:
+                self.reserved[str(pin)] = left
+            else:
+                self.reserved.pop(str(pin), None)
+
+    def low_pins(self, pins: list[str]) -> set:
+        """Get the pumps that are blocked.
+
+        Args:
+            pins (list[str]): The pins to check.
+
+        Returns:
+            set: The pins of the blocked pumps.
+        """
+        return {pin for pin in pins if self.is_low(pin)}
+
+    def time_to_empty(self, pin: str) -> float | None:
+        """Predict when a pump will be empty, at the current consumption.
+
+        Args:
+            pin (str): The pin number of the pump.
+
+        Returns:
+            float | None: The hours left, None if the pump isn't used.
+        """
+        pump = self.get_pump(pin)
+        if pump["ml_per_hour"] <= 0:
+            return None
+        return max(0.0, pump["level_ml"] - LOW_STOCK_ML) / pump["ml_per_hour"]
+
+    def consume(self, pin: str, ml: float, now: float = None) -> bool:
+        """Remove a poured volume from a pump.
+
+        Args:
+            pin (str): The pin number of the pump.
+            ml (float): The poured volume.
+            now (float, optional): The time of the pour (time.time()). Defaults to now.
+
+        Returns:
+            bool: True if the pump just became low.
+        """
+        if now is None:
+            now = time.time()
+        pump = self.get_pump(pin)
+        was_low = pump["level_ml"] < LOW_STOCK_ML
+        pump["level_ml"] = max(0.0, pump["level_ml"] - ml)
+
+        # The consumption since the last pour, smoothed with the older ones
+        if pump["last_pour"] is not None and now > pump["last_pour"]:
+            rate = ml * SECONDS_PER_HOUR / (now - pump["last_pour"])
+            pump["ml_per_hour"] += RATE_SMOOTHING * (rate - pump["ml_per_hour"])
+        pump["last_pour"] = now
+
+        return not was_low and pump["level_ml"] < LOW_STOCK_ML
+
+    def record_order(self, order) -> bool:
+        """Remove the volumes of a served order and save the inventory.
+
+        Args:
+            order (orders.Order): The order.
+
+        Returns:
+            bool: True if a pump just became low.
+        """
+        if not order.volumes:
+            return False
+        now = time.time()
+        changed = False
+        for pin, ml in order.volumes.items():
+            changed |= self.consume(pin, ml, now)
+        self.save()
+        return changed
+
+    def refill(self, pin: str, capacity_ml: float = None):
+        """Put a new bottle behind a pump.
+
+        Args:
+            pin (str): The pin number of the pump.
+            capacity_ml (float, optional): The volume of the new bottle. Defaults to the last one.
+        """
+        pump = self.get_pump(pin)
+        if capacity_ml is not None:
+            pump["capacity_ml"] = capacity_ml
+        pump["level_ml"] = pump["capacity_ml"]
+        self.save()
+
+
+_inventory = None
+
+
+def get_inventory() -> Inventory:
+    """Get the Inventory shared by the whole app, read the file on the first call.
+
+    Returns:
+        Inventory: The shared Inventory.
+    """
+    global _inventory
+    if _inventory is None:
+        _inventory = Inventory()
+    return _inventory
@@ -0,0 +1,171 @@
+import os
+import time
+
+
+JOURNAL_FILE = "accepted_id.journal"
+
+
+class Balance_Journal:
+    """An append-only journal of the points changes (write-ahead log).
+
+    Each change is written as one line "seq, timestamp, id, delta" and synced to
+    the disk before the call returns, so a power cut can at worst lose the line
+    that was being written, never the rest of the file.
+
+    A change that comes from another kiosk carries his origin at the end of the line, "device, seq", so the change
+    and the fact that it was applied are written together.
+
+    Args:
+        path (str, optional): The path of the journal file. Defaults to JOURNAL_FILE.
+    """
+
+    def __init__(self, path: str = JOURNAL_FILE) -> None:
+        self.path = path
+        self.file = None
+        self.last_seq = 0
+        self.entries = 0
+        # device -> last seq of that device in the journal
+        self.origins = {}
+
+    def replay(self, after_seq: int = 0) -> list[tuple[str, float]]:
+        """Read the journal and return the changes that aren't in the snapshot yet.
+
+        Args:
+            after_seq (int, optional): The last sequence number already in the snapshot. Defaults to 0.
+
+        Returns:
+            list[tuple[str, float]]: A list of (id, delta) in the order they were written.
+        """
+        changes = []
+        self.entries = 0
+        for seq, _, id, delta, origin in self.read():
+            self.last_seq = max(self.last_seq, seq)
+            if origin is not None:
+                device, origin_seq = origin
+                self.origins[device] = max(self.origins.get(device, 0), origin_seq)
+            if seq > after_seq:
+                changes.append((id, delta))
+                self.entries += 1
+
+        self.last_seq = max(self.last_seq, after_seq)
+        return changes
+
+    def read(self) -> list[tuple[int, float, str, float, tuple[str, int] | None]]:
+        """Read all the entries of the journal.
+
+        Returns:
+            list[tuple[int, float, str, float, tuple[str, int] | None]]: The seq, timestamp, id, delta and
+                origin (device, seq) of each entry, the origin is None for a local change.
+        """
+        try:
+            with open(self.path, "r") as file:
+                # A broken line is the one that was being written during a power cut
+                return [entry for entry in map(self.parse_line, file) if entry is not None]
+        except FileNotFoundError:
+            return []
+
+    def parse_line(self, line: str) -> tuple[int, float, str, float, tuple[str, int] | None] | None:
+        """Parse a single line of the journal.
+
+        Args:
+            line (str): A raw line of the journal.
+
+        Returns:
+            tuple[int, float, str, float, tuple[str, int] | None] | None: The seq, timestamp, id, delta and origin,
+                None if the line is broken.
+        """
+        if not line.endswith("\n"):
+            return None
+
+        fields = [field.strip() for field in line.split(",")]
+        if len(fields) not in (4, 6):
+            return None
+
+        try:
+            origin = (fields[4], int(fields[5])) if len(fields) == 6 else None
+            return int(fields[0]), float(fields[1]), fields[2], float(fields[3]), origin
+        except ValueError:
+            return None
+
+    def format_line(self, seq: int, timestamp: float, id: str, delta: float,
+                    origin: tuple[str, int] = None) -> str:
+        """Format an entry the way it's written in the journal.
+
+        Args:
+            seq (int): The sequence number of the entry.
+            timestamp (float): The time of the change (time.time()).
+            id (str): A string representation of the id.
+            delta (float): The amount of points added/removed.
+            origin (tuple[str, int], optional): The device and seq of a remote change. Defaults to None (local).
+
+        Returns:
+            str: The line, with the line break.
+        """
+        line = "{}, {:.3f}, {}, {!r}".format(seq, timestamp, id, float(delta))
+        if origin is not None:
+            line += ", {}, {}".format(*origin)
+        return line + "\n"
+
+    def open(self):
+        """Open the journal for appending.
+        """
+        if self.file is not None:
+            return
+
+        self.file = open(self.path, "a+b")
+        # If the last line was cut by a power loss, we start on a new line so the
+        # next entry isn't glued to the broken one.
+        self.file.seek(0, os.SEEK_END)
+        if self.file.tell() > 0:
+            self.file.seek(-1, os.SEEK_END)
+            if self.file.read(1) != b"\n":
+                self.file.write(b"\n")
+
+    def append(self, id: str, delta: float, origin: tuple[str, int] = None) -> int:
+        """Write a points change at the end of the journal and sync it to the disk.
+
+        Args:
+            id (str): A string representation of the id.
+            delta (float): The amount of points added/removed.
+            origin (tuple[str, int], optional): The device and seq of a remote change. Defaults to None (local).
+
+        Returns:
+            int: The sequence number of the new entry.
+        """
+        self.open()
+
+        self.last_seq += 1
+        if origin is not None:
+            device, origin_seq = origin
+            self.origins[device] = max(self.origins.get(device, 0), origin_seq)
+        self.file.write(self.format_line(self.last_seq, time.time(), id, delta, origin).encode())
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+        self.entries += 1
+        return self.last_seq
+
+    def truncate(self, keep: list = None):
+        """Empty the journal, once all of his entries are in the snapshot.
+
+        Args:
+            keep (list, optional): Entries (as returned by read()) to leave in the journal, they are
+                already in the snapshot but still needed by someone else. Defaults to None.
+        """
+        self.close()
+        text = "".join(self.format_line(*entry) for entry in keep or [])
+        # Replaced in one go, a power cut leaves either the old or the new journal
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "wb") as file:
+            file.write(text.encode())
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, self.path)
+        self.entries = 0
+
+    def close(self):
+        """Close the journal file.
+        """
+        if self.file is not None:
+            self.file.close()
+            self.file = None
@@ -0,0 +1,367 @@
+import collections
+import csv
+import datetime
+import glob
+import mmap
+import os
+import struct
+import threading
+import time
+
+import persistence
+
+
+LEDGER_DIR = "ledger"
+MAGIC = b"MIXLEDG1"
+# The magic and the number of records
+HEADER = struct.Struct("<8sQ")
+# time, kind, user id, pin, volume (ml), points
+RECORD = struct.Struct("<dB16sHff")
+# The file grows by this number of records when it's full
+GROW_RECORDS = 4096
+# The file grows in advance when there's less room left than that
+GROW_MARGIN = 1024
+# Records read at once by the readers
+CHUNK_RECORDS = 4096
+
+POINTS = 1
+DISPENSE = 2
+KIND_NAMES = {POINTS: "points", DISPENSE: "dispense"}
+
+Entry = collections.namedtuple("Entry", ["time", "kind", "user", "pin", "ml", "points"])
+
+
+class Ledger:
+    """Every points change and every pour, one fixed-width record each, one file per day.
+
+    The file of the day is memory-mapped, adding a record is only a copy in
+    memory. Everything touching the disk (opening the file of a new day,
+    making room at the end of the file, writing the pages) is done by the
+    persistence thread, and never while holding the lock the UI needs to add
+    a record. A record arriving before the file is ready waits in memory.
+
+    Args:
+        directory (str, optional): The directory of the files. Defaults to LEDGER_DIR.
+        writer (persistence.Persistence_Thread, optional): The thread doing the disk work. Defaults to None (done
+            on each record).
+    """
+
+    def __init__(self, directory: str = LEDGER_DIR, writer: persistence.Persistence_Thread = None) -> None:
+        self.directory = directory
+        self.writer = writer
+        # Only held to copy a record or swap the map, never during a disk access
+        self.lock = threading.Lock()
+        self.day = None
+        self.file = None
+        self.map = None
+        self.count = 0
+        self.capacity = 0
+        # (day, packed record) waiting for the file of their day or for room in it
+        self.pending = collections.deque()
+
+    def path_for(self, day: datetime.date) -> str:
+        """Get the file of a day.
+
+        Args:
+            day (datetime.date): The day.
+
+        Returns:
+            str: The path of the file.
+        """
+        return os.path.join(self.directory, "{}.bin".format(day.isoformat()))
+
+    def map_file(self, day: datetime.date) -> tuple:
+        """Map the file of a day, create it if needed.
+
+        Args:
+            day (datetime.date): The day.
+
+        Raises:
+            ValueError: The file isn't a ledger file.
+
+        Returns:
+            tuple: The file, the map, the number of records and the capacity.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path_for(day)
+        if not os.path.exists(path):
+            with open(path, "wb") as file:
+                file.write(HEADER.pack(MAGIC, 0))
+                file.truncate(HEADER.size + GROW_RECORDS * RECORD.size)
+
+        file = open(path, "r+b")
+        map = mmap.mmap(file.fileno(), 0)
+        magic, count = HEADER.unpack_from(map, 0)
+        if magic != MAGIC:
+            map.close()
+            file.close()
+            raise ValueError("{} is not a ledger file".format(path))
+        return file, map, count, (len(map) - HEADER.size) // RECORD.size
+
+    def open(self, day: datetime.date):
+        """Switch to the file of a day, the previous one is written and closed.
+
+        Args:
+            day (datetime.date): The day.
+        """
+        file, map, count, capacity = self.map_file(day)
+        with self.lock:
+            old_file, old_map = self.file, self.map
+            self.file, self.map = file, map
+            self.count, self.capacity = count, capacity
+            self.day = day
+        if old_map is not None:
+            old_map.flush()
+            old_map.close()
+            old_file.close()
+
+    def grow(self):
+        """Make room for more records at the end of the file.
+        """
+        capacity = self.capacity + GROW_RECORDS
+        self.file.truncate(HEADER.size + capacity * RECORD.size)
+        # The records added meanwhile through the old map are in the same pages
+        map = mmap.mmap(self.file.fileno(), 0)
+        with self.lock:
+            old_map, self.map = self.map, map
+            self.capacity = capacity
+        old_map.close()
+
+    def write(self, record: bytes):
+        """Copy a packed record at the end of the map, the lock must be held and there must be room.
+
+        Args:
+            record (bytes): The packed record.
+        """
+        offset = HEADER.size + self.count * RECORD.size
+        self.map[offset:offset + RECORD.size] = record
+        self.count += 1
+        HEADER.pack_into(self.map, 0, MAGIC, self.count)
+
+    def append(self, kind: int, user: str, pin: str = None, ml: float = 0, points: float = 0):
+        """Add a record to the file of the day.
+
+        Args:
+            kind (int): POINTS or DISPENSE.
+            user (str): The id of the user.
+            pin (str, optional): The pin of the pump. Defaults to None.
+            ml (float, optional): The poured volume. Defaults to 0.
+            points (float, optional): The points added/removed. Defaults to 0.
+        """
+        now = time.time()
+        day = datetime.date.fromtimestamp(now)
+        record = RECORD.pack(
+            now, kind, str(user or "").encode("utf-8")[:16], int(pin or 0), ml, points)
+        with self.lock:
+            if self.pending or day != self.day or self.count == self.capacity:
+                self.pending.append((day, record))
+            else:
+                self.write(record)
+            # The file is made bigger before it's full
+            busy = bool(self.pending) or self.capacity - self.count <= GROW_MARGIN
+
+        if self.writer is None:
+            if busy:
+                self.maintain()
+            self.flush()
+        else:
+            if busy:
+                self.writer.submit(self.maintain, key="ledger_maintain")
+            # A lot of records in a row are flushed once
+            self.writer.submit(self.flush, key="ledger")
+
+    def maintain(self):
+        """Open the file of a new day or make room, then write the records waiting in memory.
+        """
+        while True:
+            with self.lock:
+                day = self.pending[0][0] if self.pending else self.day
+                if day is None:
+                    return
+                if day == self.day:
+                    while self.pending and self.pending[0][0] == day and self.count < self.capacity:
+                        self.write(self.pending.popleft()[1])
+                    if not self.pending and self.capacity - self.count > GROW_MARGIN:
+                        return
+
+            # Only this method changes the file, so it can be read without the lock
+            if day != self.day:
+                self.open(day)
+            else:
+                self.grow()
+
+    def record_points(self, user: str, points: float):
+        """Record a points change.
+
+        Args:
+            user (str): The id of the user.
+            points (float): The points added/removed.
+        """
+        self.append(POINTS, user, points=points)
+
+    def record_order(self, order):
+        """Record the pumps of a served order.
+
+        Args:
+            order (orders.Order): The order.
+        """
+        for pin, ml in (order.volumes or {}).items():
+            self.append(DISPENSE, order.user_id, pin=pin, ml=ml)
+
+    def flush(self):
+        """Write the mapped pages to the disk.
+        """
+        # The map is only replaced by maintain(), on this same thread
+        with self.lock:
+            map = self.map
+        if map is not None:
+            map.flush()
+
+    def close(self):
+        """Write the records waiting in memory, then write and unmap the current file.
+        """
+        self.maintain()
+        with self.lock:
+            map, file = self.map, self.file
+            self.map = None
+            self.file = None
+            self.day = None
+        if map is not None:
+            map.flush()
+            map.close()
+            file.close()
+
+
+def ledger_files(directory: str = LEDGER_DIR) -> list[str]:
+    """Get all the ledger files.
+
+    Args:
+        directory (str, optional): The directory of the files. Defaults to LEDGER_DIR.
+
+    Returns:
+        list[str]: The paths, from the oldest to the newest.
+    """
+    return sorted(glob.glob(os.path.join(directory, "*.bin")))
+
+
+def iter_records(path: str, chunk: int = CHUNK_RECORDS):
+    """Read the records of a file, a chunk at a time.
+
+    Args:
+        path (str): The path of the file.
+        chunk (int, optional): The number of records read at once. Defaults to CHUNK_RECORDS.
+
+    Yields:
+        Entry: Each record, in the order they were added.
+    """
+    with open(path, "rb") as file:
+        magic, count = HEADER.unpack(file.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError("{} is not a ledger file".format(path))
+        while count > 0:
+            size = min(chunk, count)
+            data = file.read(size * RECORD.size)
+            for moment, kind, user, pin, ml, points in RECORD.iter_unpack(data):
+                yield Entry(moment, kind, user.rstrip(b"\0").decode("utf-8"), pin, ml, points)
+            count -= size
+
+
+def export_csv(paths: list[str], prefix: str, rows_per_file: int = 1000000) -> list[str]:
+    """Export records to csv files, a new file is started every rows_per_file rows.
+
+    Args:
+        paths (list[str]): The ledger files.
+        prefix (str): The start of the path of the csv files.
+        rows_per_file (int, optional): The maximum number of rows of a csv file. Defaults to 1000000.
+
+    Returns:
+        list[str]: The written csv files.
+    """
+    written = []
+    output = None
+    rows = rows_per_file
+    try:
+        for path in paths:
+            for entry in iter_records(path):
+                if rows == rows_per_file:
+                    if output is not None:
+                        output.close()
+                    name = "{}-{:04d}.csv".format(prefix, len(written) + 1)
+                    output = open(name, "w", encoding="utf-8", newline="")
+                    writer = csv.writer(output)
+                    writer.writerow(Entry._fields)
+                    written.append(name)
+                    rows = 0
+                writer.writerow([
+                    datetime.datetime.fromtimestamp(entry.time).isoformat(),
+                    KIND_NAMES.get(entry.kind, entry.kind),
+                    entry.user, entry.pin or "", round(entry.ml, 2), round(entry.points, 2),
+                ])
+                rows += 1
+    finally:
+        if output is not None:
+            output.close()
+    return written
+
+
+def summarize(paths: list[str]) -> dict:
+    """Sum the records up, without keeping them in memory.
+
+    Args:
+        paths (list[str]): The ledger files.
+
+    Returns:
+        dict: The number of records and pours, the points of each user and the volume (ml) of each pump.
+    """
+    summary = {
+        "records": 0,
+        "pours": 0,
+        "points": collections.defaultdict(float),
+        "ml": collections.defaultdict(float),
+    }
+    for path in paths:
+        for entry in iter_records(path):
+            summary["records"] += 1
+            if entry.kind == POINTS:
+                summary["points"][entry.user] += entry.points
+            elif entry.kind == DISPENSE:
+                summary["pours"] += 1
+                summary["ml"][str(entry.pin)] += entry.ml
+    summary["points"] = dict(summary["points"])
+    summary["ml"] = dict(summary["ml"])
+    return summary
+
+
+_ledger = None
+
+
+def get_ledger() -> Ledger:
+    """Get the Ledger shared by the whole app, create it on the first call.
+
+    Returns:
+        Ledger: The shared Ledger.
+    """
+    global _ledger
+    if _ledger is None:
+        _ledger = Ledger(writer=persistence.get_writer())
+    return _ledger
+
+
+if __name__ == "__main__":
+    import sys
+
+    # python ledger.py summary [files...]
+    # python ledger.py export PREFIX [files...]
+    arguments = sys.argv[1:]
+    command = arguments[0] if arguments else "summary"
+    if command == "export":
+        prefix = arguments[1]
+        files = export_csv(arguments[2:] or ledger_files(), prefix)
+        print("Exported to {}".format(", ".join(files) or "nothing"))
+    else:
+        summary = summarize(arguments[1:] or ledger_files())
+        print("{} records, {} pours".format(summary["records"], summary["pours"]))
+        for pin, ml in sorted(summary["ml"].items()):
+            print("Pump {}: {:.0f} ml".format(pin, ml))
+        for user, points in sorted(summary["points"].items()):
+            print("User {}: {:+.2f} points".format(user, points))
@@ -1,4 +1,3 @@
-import sys
 from PyQt5 import QtWidgets, QtGui
 import widgets
 
@@ -43,4 +42,5 @@ class Loading(QtWidgets.QWidget):
         self.setLayout(layout)
         
     def exit_app(self):
-        sys.exit(0)
+        # We quit the event loop, so the pending writes are done before leaving
+        QtWidgets.QApplication.quit()
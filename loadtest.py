@@ -0,0 +1,154 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+
+# The files the app reads, copied into the working directory of the test
+DATA_FILES = ["pump_config.txt", "recipes.json", "pricing.json"]
+DATA_DIRS = ["icons"]
+# Enough points and liquid to never run out during the test (a level must fit in the int of a Qt progress bar)
+POINTS = 1e9
+LEVEL_ML = 1e9
+# Fast enough that the pours don't slow the test down
+ML_PER_SECOND = 1e6
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    """Get a percentile of some values.
+
+    Args:
+        values (list[float]): The values, sorted.
+        fraction (float): The percentile, 0.99 for the p99.
+
+    Returns:
+        float: The value.
+    """
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def prepare(directory: str, cards: int):
+    """Fill the working directory with a copy of the config and a synthetic roster.
+
+    Args:
+        directory (str): The working directory of the test.
+        cards (int): The number of accepted cards.
+    """
+    source = os.path.dirname(os.path.abspath(__file__))
+    for name in DATA_FILES:
+        if os.path.exists(os.path.join(source, name)):
+            shutil.copy(os.path.join(source, name), directory)
+    for name in DATA_DIRS:
+        shutil.copytree(os.path.join(source, name), os.path.join(directory, name))
+
+    with open(os.path.join(directory, "accepted_id.txt"), "w", encoding="utf-8") as file:
+        for card in range(cards):
+            file.write("{}, Guest {}, {}\n".format(1000000 + card, card, POINTS))
+
+    with open(os.path.join(directory, "pump_config.txt"), "r", encoding="utf-8") as file:
+        pins = list(json.load(file))
+    with open(os.path.join(directory, "calibration.json"), "w", encoding="utf-8") as file:
+        json.dump({"pumps": {pin: {"ml_per_second": ML_PER_SECOND} for pin in pins}}, file)
+    with open(os.path.join(directory, "inventory.json"), "w", encoding="utf-8") as file:
+        json.dump({pin: {"level_ml": LEVEL_ML, "capacity_ml": LEVEL_ML,
+                         "ml_per_hour": 0.0, "last_pour": None} for pin in pins}, file)
+
+
+def run(taps: int, cards: int) -> dict:
+    """Log in, order a drink of the menu and a custom drink, then log out, taps times.
+
+    Args:
+        taps (int): The number of logins.
+        cards (int): The number of accepted cards.
+
+    Returns:
+        dict: The latencies (in seconds) of each step, the total time and the number of served drinks.
+    """
+    # Imported here, once the environment is set
+    from PyQt5 import QtWidgets
+
+    import theme
+    import windows
+    import workers
+
+    app = QtWidgets.QApplication(sys.argv)
+    theme.install(app)
+    window = windows.Window()
+    # Done by the event loop otherwise
+    window.finish_boot()
+
+    latencies = {"login": [], "order_menu": [], "order_custom": [], "logout": []}
+    served = []
+
+    def measure(step: str, function, *args):
+        start = time.perf_counter()
+        function(*args)
+        latencies[step].append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for tap in range(taps):
+        measure("login", window.check_id, str(1000000 + tap % cards))
+        if tap == 0:
+            window.tabs.orders.served_signal.connect(served.append)
+
+        measure("order_menu", window.tabs.CONTENTS["1"].start)
+
+        custom = window.tabs.CONTENTS["2"]
+        custom.mixer.sliders[0].setValue(1 + tap % 10)
+        custom.mixer.sliders[1].setValue(10)
+        measure("order_custom", custom.start)
+
+        measure("logout", window.set_loading)
+        app.processEvents()
+
+    # The last drinks are still being served
+    while window.tabs is not None and len(window.tabs.orders) and time.perf_counter() - start < 60 + taps:
+        app.processEvents()
+        time.sleep(0.001)
+    total = time.perf_counter() - start
+
+    workers.get_manager().stop_all()
+    return {"latencies": latencies, "total": total, "served": len(served)}
+
+
+def report(result: dict):
+    """Print the throughput and the latencies.
+
+    Args:
+        result (dict): The result of run().
+    """
+    operations = 0
+    for step, values in result["latencies"].items():
+        values = sorted(values)
+        operations += len(values)
+        print("{:<13} n={:<7} p50={:8.3f} ms  p99={:8.3f} ms".format(
+            step, len(values), percentile(values, 0.5) * 1000, percentile(values, 0.99) * 1000))
+    print("{} operations in {:.2f} s ({:.0f} ops/s), {} drinks served ({:.1f} drinks/s)".format(
+        operations, result["total"], operations / result["total"],
+        result["served"], result["served"] / result["total"]))
+
+
+if __name__ == "__main__":
+    # python loadtest.py [taps] [cards]
+    arguments = sys.argv[1:]
+    taps = int(arguments[0]) if len(arguments) > 0 else 1000
+    cards = int(arguments[1]) if len(arguments) > 1 else 100
+
+    # No screen, no GPIOs and no RFID reader needed
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    os.environ["MIXOMAT_HARDWARE"] = "sim"
+
+    # The test never touches the real accounts, ledger or inventory
+    directory = tempfile.mkdtemp(prefix="mixomat-loadtest-")
+    try:
+        prepare(directory, cards)
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        os.chdir(directory)
+        report(run(taps, cards))
+    finally:
+        os.chdir(tempfile.gettempdir())
+        shutil.rmtree(directory, ignore_errors=True)
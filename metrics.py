@@ -0,0 +1,278 @@
+import array
+import functools
+import os
+import threading
+import time
+
+import storage
+
+
+# The Prometheus text file read by node_exporter (textfile collector), empty to disable the export
+METRICS_FILE = os.environ.get("MIXOMAT_METRICS_FILE", "metrics.prom")
+# Seconds between two exports
+EXPORT_SECONDS = 15
+# The number of last values kept by each histogram
+HISTORY = 1024
+# The quantiles computed from the last values
+QUANTILES = (0.5, 0.9, 0.99)
+# Every metric name starts with it
+PREFIX = "mixomat_"
+
+
+class Counter:
+    """A number that only goes up, like the number of cards read.
+
+    Args:
+        name (str): The name of the metric.
+        help (str): What it counts.
+    """
+
+    def __init__(self, name: str, help: str) -> None:
+        self.name = name
+        self.help = help
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        """Add to the counter.
+
+        Args:
+            amount (float, optional): The amount added. Defaults to 1.
+        """
+        with self.lock:
+            self.value += amount
+
+    def render(self) -> list[str]:
+        """Get the lines of the counter in the Prometheus text format.
+
+        Returns:
+            list[str]: The lines.
+        """
+        return [
+            "# HELP {} {}".format(self.name, self.help),
+            "# TYPE {} counter".format(self.name),
+            "{} {}".format(self.name, self.value),
+        ]
+
+
+class Histogram:
+    """The durations of an operation, the last ones are kept in a ring buffer.
+
+    The buffer is allocated once, so observing a value never allocates
+    anything. The quantiles are only computed when the metrics are exported.
+
+    Args:
+        name (str): The name of the metric.
+        help (str): What it measures.
+        size (int, optional): The number of last values kept. Defaults to HISTORY.
+    """
+
+    def __init__(self, name: str, help: str, size: int = HISTORY) -> None:
+        self.name = name
+        self.help = help
+        self.values = array.array("d", bytes(8 * size))
+        self.size = size
+        # Since the start of the app
+        self.count = 0
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value: float):
+        """Add a value.
+
+        Args:
+            value (float): The value, in seconds for a duration.
+        """
+        with self.lock:
+            self.values[self.count % self.size] = value
+            self.count += 1
+            self.sum += value
+
+    def time(self):
+        """Measure the duration of a block: with histogram.time(): ...
+
+        Returns:
+            Timer: The context manager.
+        """
+        return Timer(self)
+
+    def quantiles(self) -> dict:
+        """Get the quantiles of the last values.
+
+        Returns:
+            dict: A dict matching each of QUANTILES with its value, empty if nothing was observed.
+        """
+        with self.lock:
+            values = sorted(self.values[:min(self.count, self.size)])
+        if not values:
+            return {}
+        return {
+            quantile: values[min(len(values) - 1, int(quantile * len(values)))]
+            for quantile in QUANTILES
+        }
+
+    def render(self) -> list[str]:
+        """Get the lines of the histogram in the Prometheus text format (as a summary).
+
+        Returns:
+            list[str]: The lines.
+        """
+        lines = [
+            "# HELP {} {}".format(self.name, self.help),
+            "# TYPE {} summary".format(self.name),
+        ]
+        for quantile, value in self.quantiles().items():
+            lines.append('{}{{quantile="{}"}} {!r}'.format(self.name, quantile, value))
+        lines.append("{}_sum {!r}".format(self.name, self.sum))
+        lines.append("{}_count {}".format(self.name, self.count))
+        return lines
+
+
+class Timer:
+    """Measure the duration of a block on the monotonic clock.
+
+    Args:
+        histogram (Histogram): The histogram getting the duration.
+    """
+
+    def __init__(self, histogram: Histogram) -> None:
+        self.histogram = histogram
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *_):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+class Metrics:
+    """All the metrics of the app, exported together to a Prometheus text file.
+
+    Args:
+        path (str, optional): The path of the text file. Defaults to METRICS_FILE.
+    """
+
+    def __init__(self, path: str = METRICS_FILE) -> None:
+        self.path = path
+        # name -> Counter | Histogram, in creation order
+        self.metrics = {}
+        self.lock = threading.Lock()
+        # The sum of the counts when the metrics were last exported
+        self.exported = None
+
+    def get(self, kind, name: str, help: str):
+        """Get a metric, it's created the first time.
+
+        Args:
+            kind (type): Counter or Histogram.
+            name (str): The name of the metric, without PREFIX.
+            help (str): What it measures.
+
+        Returns:
+            Counter | Histogram: The metric.
+        """
+        name = PREFIX + name
+        with self.lock:
+            if name not in self.metrics:
+                self.metrics[name] = kind(name, help)
+            return self.metrics[name]
+
+    def counter(self, name: str, help: str = "") -> Counter:
+        """Get a counter, it's created the first time.
+
+        Args:
+            name (str): The name of the counter, without PREFIX.
+            help (str, optional): What it counts. Defaults to "".
+
+        Returns:
+            Counter: The counter.
+        """
+        return self.get(Counter, name, help)
+
+    def histogram(self, name: str, help: str = "") -> Histogram:
+        """Get a histogram, it's created the first time.
+
+        Args:
+            name (str): The name of the histogram, without PREFIX.
+            help (str, optional): What it measures. Defaults to "".
+
+        Returns:
+            Histogram: The histogram.
+        """
+        return self.get(Histogram, name, help)
+
+    def render(self) -> str:
+        """Get all the metrics in the Prometheus text format.
+
+        Returns:
+            str: The text.
+        """
+        with self.lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def changed(self) -> bool:
+        """Check if something was measured since the last export.
+
+        Returns:
+            bool: True if the file needs to be written again.
+        """
+        with self.lock:
+            metrics = list(self.metrics.values())
+        state = sum(metric.count if isinstance(metric, Histogram) else metric.value for metric in metrics)
+        if state == self.exported:
+            return False
+        self.exported = state
+        return True
+
+    def export(self):
+        """Write the metrics to the text file, if they changed and the export is enabled.
+        """
+        if self.path and self.changed():
+            storage.write_atomic(self.path, self.render())
+
+
+def timed(name: str, help: str = ""):
+    """Measure each call of a function in a histogram.
+
+    Args:
+        name (str): The name of the histogram, without PREFIX.
+        help (str, optional): What it measures. Defaults to "".
+
+    Returns:
+        callable: The decorator.
+    """
+    def decorator(function):
+        histogram = get_metrics().histogram(name, help)
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+_metrics = None
+
+
+def get_metrics() -> Metrics:
+    """Get the Metrics shared by the whole app.
+
+    Returns:
+        Metrics: The shared Metrics.
+    """
+    global _metrics
+    if _metrics is None:
+        _metrics = Metrics()
+    return _metrics
+
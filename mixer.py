@@ -0,0 +1,97 @@
+class Mixer:
+    """The volumes of a custom drink, sharing the volume of one glass.
+
+    The total and the price are kept up to date on each change, so checking
+    that a new volume fits in the glass and showing the price don't depend on
+    the number of ingredients.
+
+    Args:
+        budget (int, optional): The volume (in cl) of the glass. Defaults to 25.
+        count (int, optional): The number of ingredients at the start. Defaults to 2.
+    """
+
+    def __init__(self, budget: int = 25, count: int = 2) -> None:
+        self.budget = budget
+        self.volumes = [0] * count
+        # The price of 1 cl of each ingredient
+        self.unit_prices = [0] * count
+        self.total = 0
+        self.cost = 0
+
+    def __len__(self) -> int:
+        return len(self.volumes)
+
+    def set(self, index: int, volume: int) -> int:
+        """Change the volume of an ingredient, as far as the glass allows it.
+
+        Args:
+            index (int): The index of the ingredient.
+            volume (int): The wanted volume (in cl).
+
+        Returns:
+            int: The volume that was really set.
+        """
+        old = self.volumes[index]
+        # What's left in the glass if this ingredient was removed
+        volume = max(0, min(volume, self.budget - self.total + old))
+        self.volumes[index] = volume
+        self.total += volume - old
+        self.cost += (volume - old) * self.unit_prices[index]
+        return volume
+
+    def set_unit_price(self, index: int, price: float):
+        """Change the price of an ingredient, when another one is chosen.
+
+        Args:
+            index (int): The index of the ingredient.
+            price (float): The price of 1 cl.
+        """
+        self.cost += (price - self.unit_prices[index]) * self.volumes[index]
+        self.unit_prices[index] = price
+
+    def add(self, price: float = 0) -> int:
+        """Add an empty ingredient.
+
+        Args:
+            price (float, optional): The price of 1 cl. Defaults to 0.
+
+        Returns:
+            int: The index of the new ingredient.
+        """
+        self.volumes.append(0)
+        self.unit_prices.append(price)
+        return len(self.volumes) - 1
+
+    def remove(self, index: int = -1):
+        """Remove an ingredient and give his volume back to the glass.
+
+        Args:
+            index (int, optional): The index of the ingredient. Defaults to -1 (the last one).
+        """
+        volume = self.volumes.pop(index)
+        self.total -= volume
+        self.cost -= volume * self.unit_prices.pop(index)
+
+    def remaining(self) -> int:
+        """Get the volume that is still free in the glass.
+
+        Returns:
+            int: The free volume (in cl).
+        """
+        return self.budget - self.total
+
+    def volume_vector(self, ingredients: list[str]) -> dict:
+        """Match the volumes with their ingredients, the way the drink is poured.
+
+        Args:
+            ingredients (list[str]): The ingredient of each index.
+
+        Returns:
+            dict: A dict matching each ingredient with his volume (in cl), the empty ones are left out.
+        """
+        vector = {}
+        for ingredient, volume in zip(ingredients, self.volumes):
+            if volume > 0:
+                # The same ingredient chosen twice is poured once
+                vector[ingredient] = vector.get(ingredient, 0) + volume
+        return vector
@@ -0,0 +1,209 @@
+import collections
+import time
+
+from PyQt5 import QtCore
+
+
+# How many times per second the progress of the current order is drawn
+PROGRESS_FPS = 20
+
+
+class Order:
+    """Something that needs the pumps: a drink, a cleaning or a calibration.
+
+    Args:
+        durations (dict): A dict matching each led with the seconds it needs to stay on.
+        cost (float, optional): The points the user pays for it. Defaults to 0.
+        on_progress (callable, optional): Called with the percentage of completion. Defaults to None.
+        on_queued (callable, optional): Called with the position in the queue (0 means it's being served). Defaults to None.
+        on_finished (callable, optional): Called once the order is served. Defaults to None.
+        on_cancelled (callable, optional): Called instead of on_finished if the order is cancelled. Defaults to None.
+        cancel_on_logout (bool, optional): True for the staff jobs that stop with the session. Defaults to False.
+        user_id (str, optional): The id of the user who ordered it. Defaults to None.
+        volumes (dict, optional): A dict matching each pin with the volume (ml) it pours. Defaults to None.
+    """
+
+    def __init__(
+        self,
+        durations: dict,
+        cost: float = 0,
+        on_progress=None,
+        on_queued=None,
+        on_finished=None,
+        on_cancelled=None,
+        cancel_on_logout: bool = False,
+        user_id: str = None,
+        volumes: dict = None,
+    ) -> None:
+        self.durations = durations
+        self.cost = cost
+        self.on_progress = on_progress
+        self.on_queued = on_queued
+        self.on_finished = on_finished
+        self.on_cancelled = on_cancelled
+        self.cancel_on_logout = cancel_on_logout
+        self.user_id = user_id
+        self.volumes = volumes
+
+
+class Order_Queue(QtCore.QObject):
+    """The only way to the pumps, the orders are served one after the other.
+
+    An order is paid when it's added to the queue, so the guest (or the next
+    one) can already prepare another drink while the pumps are busy. Its
+    volumes are reserved in the stock at the same time, so the orders waiting
+    together never ask for more than what is left behind a pump.
+
+    The progress of the order being served is computed in the UI thread by
+    a timer, from the start and the duration of the dispense job, so the
+    worker thread doesn't send anything while pouring.
+
+    Args:
+        charge (callable): Called with the amount of points to add/remove from the user.
+        worker (thread.Dispense_Worker): The thread driving the pumps.
+        fps (int, optional): How many times per second the progress is updated. Defaults to PROGRESS_FPS.
+        stock (inventory.Inventory, optional): The levels of the pumps. Defaults to None (never checked).
+    """
+    length_signal = QtCore.pyqtSignal(int)
+    # Emitted with each order that was served until the end
+    served_signal = QtCore.pyqtSignal(object)
+
+    def __init__(self, charge, worker, fps: int = PROGRESS_FPS, stock=None) -> None:
+        super().__init__()
+        self.charge = charge
+        self.stock = stock
+        self.waiting = collections.deque()
+        self.current = None
+        self.job = None
+        self.last_progress = None
+
+        self.timer = QtCore.QTimer(self)
+        self.timer.setInterval(int(1000 / fps))
+        self.timer.timeout.connect(self.report_progress)
+
+        self.worker = worker
+        self.worker.job_started_signal.connect(self.follow_job)
+        self.worker.job_finished_signal.connect(self.finish_current)
+
+    def __len__(self) -> int:
+        return len(self.waiting) + (self.current is not None)
+
+    def enqueue(self, order: Order) -> bool:
+        """Charge the order and add it to the queue, if there's enough left behind his pumps.
+
+        Args:
+            order (Order): The order to serve.
+
+        Returns:
+            bool: False if a pump doesn't have enough left, the order isn't paid nor queued.
+        """
+        if self.stock is not None and order.volumes:
+            if self.stock.missing(order.volumes):
+                return False
+            self.stock.reserve(order.volumes)
+
+        # Both happen in the UI thread without giving the hand back to Qt,
+        # so an order can't be paid without being queued (and the other way around)
+        if order.cost:
+            self.charge(-order.cost)
+        self.waiting.append(order)
+
+        self.notify_positions()
+        self.start_next()
+        return True
+
+    def release(self, order: Order):
+        """Give back the volumes reserved by an order that left the queue.
+
+        Args:
+            order (Order): The order.
+        """
+        if self.stock is not None and order.volumes:
+            self.stock.release(order.volumes)
+
+    def notify_positions(self):
+        """Tell each waiting order his position in the queue.
+        """
+        for position, order in enumerate(self.waiting, start=1):
+            if order.on_queued is not None:
+                order.on_queued(position)
+        self.length_signal.emit(len(self))
+
+    def start_next(self):
+        """Start serving the next order if the pumps are free.
+        """
+        if self.current is not None or not self.waiting:
+            return
+
+        self.current = self.waiting.popleft()
+        if self.current.on_queued is not None:
+            self.current.on_queued(0)
+        self.notify_positions()
+
+        self.worker.submit(self.current.durations)
+
+    def follow_job(self, job):
+        """Start drawing the progress of the job that just started.
+
+        Args:
+            job (dispenser.Dispense_Job): The job of the order being served.
+        """
+        self.job = job
+        self.last_progress = None
+        self.report_progress()
+        self.timer.start()
+
+    def report_progress(self):
+        """Forward the progress to the order being served, only if it changed.
+        """
+        if self.job is None or self.current is None:
+            self.timer.stop()
+            return
+
+        progress = self.job.progress(time.monotonic())
+        if progress != self.last_progress:
+            self.last_progress = progress
+            if self.current.on_progress is not None:
+                self.current.on_progress(progress)
+
+    def finish_current(self, cancelled: bool):
+        """Close the order being served and start the next one.
+
+        Args:
+            cancelled (bool): True if the order was stopped before the end.
+        """
+        self.timer.stop()
+        self.job = None
+
+        order = self.current
+        self.current = None
+        if order is not None:
+            # A served order is removed from the levels by the receivers of served_signal
+            self.release(order)
+            if not cancelled and order.on_progress is not None:
+                order.on_progress(100)
+            callback = order.on_cancelled if cancelled else order.on_finished
+            if callback is not None:
+                callback()
+            if not cancelled:
+                self.served_signal.emit(order)
+
+        self.start_next()
+        self.length_signal.emit(len(self))
+
+    def cancel_session(self):
+        """Cancel the staff jobs (cleaning, calibration) when the user logs out.
+
+        The drinks were already paid, they are still served.
+        """
+        for order in [order for order in self.waiting if order.cancel_on_logout]:
+            self.waiting.remove(order)
+            self.release(order)
+            if order.on_cancelled is not None:
+                order.on_cancelled()
+
+        if self.current is not None and self.current.cancel_on_logout:
+            # finish_current() is called once the worker stopped the pumps
+            self.worker.cancel()
+
+        self.notify_positions()
@@ -0,0 +1,97 @@
+import collections
+import itertools
+import threading
+
+from PyQt5 import QtCore
+
+import storage
+import workers
+
+
+class Persistence_Thread(QtCore.QThread):
+    """A thread that does all the writes to the disk, so the UI never waits on the SD card.
+
+    The jobs are done in the order they were submitted. A job submitted with a
+    key replaces the pending job with the same key, so writing the same file
+    ten times in a row only writes it once.
+    """
+    error_signal = QtCore.pyqtSignal(str)
+
+    def __init__(self):
+        super(Persistence_Thread, self).__init__()
+        self.condition = threading.Condition()
+        # key -> (function, args), in submission order
+        self.jobs = collections.OrderedDict()
+        # Unique keys for the jobs that can't be coalesced
+        self.counter = itertools.count()
+        self.running = True
+
+    def submit(self, function, *args, key: str = None):
+        """Add a job to the queue.
+
+        Args:
+            function (callable): The function to call in the thread.
+            *args: The arguments for the function.
+            key (str, optional): A key to coalesce the jobs. Defaults to None (never coalesced).
+        """
+        with self.condition:
+            if key is None:
+                key = next(self.counter)
+            # Replacing a pending job keeps his place in the queue
+            self.jobs[key] = (function, args)
+            self.condition.notify()
+
+    def write_file(self, path: str, text: str):
+        """Replace the content of a file (atomically), only the last pending content is written.
+
+        Args:
+            path (str): The path of the file.
+            text (str): The new content of the file.
+        """
+        self.submit(storage.write_atomic, path, text, key=path)
+
+    def pending(self) -> int:
+        """Get the number of jobs waiting in the queue.
+
+        Returns:
+            int: The number of pending jobs.
+        """
+        with self.condition:
+            return len(self.jobs)
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.jobs and self.running:
+                    self.condition.wait()
+                # We only leave once everything is written
+                if not self.jobs:
+                    return
+                _, (function, args) = self.jobs.popitem(last=False)
+
+            try:
+                function(*args)
+            except Exception as e:
+                self.error_signal.emit("Error: {}".format(e))
+
+    def stop(self):
+        """Write the pending jobs and stop the thread.
+        """
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        self.wait()
+
+
+def get_writer() -> Persistence_Thread:
+    """Get the Persistence_Thread shared by the whole app, create and start it on the first call.
+
+    Returns:
+        Persistence_Thread: The shared Persistence_Thread.
+    """
+    manager = workers.get_manager()
+    writer = manager.get("persistence")
+    if writer is None:
+        writer = manager.add("persistence", Persistence_Thread())
+        manager.start("persistence")
+    return writer
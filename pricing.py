@@ -0,0 +1,180 @@
+import datetime
+import json
+import os
+
+import recipes
+
+
+PRICING_FILE = "pricing.json"
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+# The ingredient tables go up to a full glass (see widgets.Mixer_Widget)
+TABLE_CL = 25
+
+
+def parse_minutes(text: str) -> int:
+    """Read a time of the day.
+
+    Args:
+        text (str): The time, like "17:30".
+
+    Returns:
+        int: The minutes since midnight.
+    """
+    hours, minutes = text.split(":")
+    return int(hours) * 60 + int(minutes)
+
+
+class Price_List:
+    """The price of every drink, for every user and at every time of the week.
+
+    The unit prices come from the recipes file (price_per_cl), the happy
+    hours and the user discounts from the pricing file. Everything that can be
+    is computed once when the prices are loaded: the price of each recipe,
+    the price of each volume of each ingredient and the happy hour discount
+    of each minute of the week. Getting a price is then a few lookups.
+
+    Args:
+        book (recipes.Recipe_Book, optional): The menu. Defaults to the shared Recipe_Book.
+        path (str, optional): The path of the pricing file. Defaults to PRICING_FILE.
+    """
+
+    def __init__(self, book: recipes.Recipe_Book = None, path: str = PRICING_FILE) -> None:
+        if book is None:
+            book = recipes.get_book()
+        self.book = book
+        # ingredient -> points for 1 cl
+        self.unit_prices = {}
+        # ingredient -> [points for 0 cl, for 1 cl, ..., for TABLE_CL cl]
+        self.volume_table = {}
+        # recipe name -> points, before the discounts
+        self.recipe_prices = {}
+        # minute of the week -> happy hour discount (0.5 is half price)
+        self.happy_hour_table = [0.0] * MINUTES_PER_WEEK
+        # user id -> discount
+        self.user_discounts = {}
+        self.load(path)
+
+    def load(self, path: str):
+        """Compute the tables from the recipes and the pricing file.
+
+        Args:
+            path (str): The path of the pricing file, missing means no discount at all.
+        """
+        config = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as file:
+                config = json.load(file)
+
+        self.unit_prices = {
+            ingredient: info.get("price_per_cl", 0)
+            for ingredient, info in self.book.ingredients.items()
+        }
+        self.volume_table = {
+            ingredient: [price * cl for cl in range(TABLE_CL + 1)]
+            for ingredient, price in self.unit_prices.items()
+        }
+        self.recipe_prices = {
+            name: recipe.price for name, recipe in self.book.recipes.items()
+        }
+
+        self.happy_hour_table = [0.0] * MINUTES_PER_WEEK
+        for window in config.get("happy_hours", []):
+            start = parse_minutes(window["start"])
+            end = parse_minutes(window["end"])
+            # A window that ends before it starts goes over midnight
+            length = (end - start) % MINUTES_PER_DAY
+            for day in window.get("days", range(7)):
+                first = day * MINUTES_PER_DAY + start
+                for minute in range(first, first + length):
+                    minute %= MINUTES_PER_WEEK
+                    self.happy_hour_table[minute] = max(
+                        self.happy_hour_table[minute], window["discount"])
+
+        self.user_discounts = dict(config.get("user_discounts", {}))
+
+    def factor(self, user_id: str = None, now: datetime.datetime = None) -> float:
+        """Get the part of the price the user pays.
+
+        Args:
+            user_id (str, optional): The id of the user. Defaults to None (no user discount).
+            now (datetime.datetime, optional): The time of the order. Defaults to now.
+
+        Returns:
+            float: 1 for the full price, 0.5 for half price.
+        """
+        if now is None:
+            now = datetime.datetime.now()
+        minute = now.weekday() * MINUTES_PER_DAY + now.hour * 60 + now.minute
+        return ((1 - self.happy_hour_table[minute])
+                * (1 - self.user_discounts.get(user_id, 0)))
+
+    def ingredient_price(self, ingredient: str, cl: int) -> float:
+        """Get the price of a volume of an ingredient, before the discounts.
+
+        Args:
+            ingredient (str): The name of the ingredient.
+            cl (int): The volume in cl.
+
+        Returns:
+            float: The points.
+        """
+        table = self.volume_table.get(ingredient)
+        if table is not None and 0 <= cl <= TABLE_CL and cl == int(cl):
+            return table[int(cl)]
+        return self.unit_prices.get(ingredient, 0) * cl
+
+    def recipe_price(self, name: str, user_id: str = None, now: datetime.datetime = None) -> float:
+        """Get the price of a drink of the menu.
+
+        Args:
+            name (str): The name of the recipe.
+            user_id (str, optional): The id of the user. Defaults to None.
+            now (datetime.datetime, optional): The time of the order. Defaults to now.
+
+        Returns:
+            float: The points the drink costs.
+        """
+        return self.discounted(self.recipe_prices[name], user_id, now)
+
+    def volumes_price(self, volumes: dict, user_id: str = None, now: datetime.datetime = None) -> float:
+        """Get the price of a custom drink.
+
+        Args:
+            volumes (dict): A dict matching each ingredient with his volume in cl.
+            user_id (str, optional): The id of the user. Defaults to None.
+            now (datetime.datetime, optional): The time of the order. Defaults to now.
+
+        Returns:
+            float: The points the drink costs.
+        """
+        price = sum(self.ingredient_price(ingredient, cl) for ingredient, cl in volumes.items())
+        return self.discounted(price, user_id, now)
+
+    def discounted(self, price: float, user_id: str = None, now: datetime.datetime = None) -> float:
+        """Apply the happy hour and the user discount to a price.
+
+        Args:
+            price (float): The full price.
+            user_id (str, optional): The id of the user. Defaults to None.
+            now (datetime.datetime, optional): The time of the order. Defaults to now.
+
+        Returns:
+            float: The points the user pays.
+        """
+        return round(price * self.factor(user_id, now), 2)
+
+
+_prices = None
+
+
+def get_prices() -> Price_List:
+    """Get the Price_List shared by the whole app, load it on the first call.
+
+    Returns:
+        Price_List: The shared Price_List.
+    """
+    global _prices
+    if _prices is None:
+        _prices = Price_List()
+    return _prices
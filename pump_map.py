@@ -0,0 +1,128 @@
+import json
+
+
+PUMP_CONFIG_FILE = "pump_config.txt"
+
+
+class Not_Mounted(LookupError):
+    """Raised when an ingredient isn't on any pump.
+
+    Args:
+        ingredient (str): The name of the missing ingredient.
+    """
+
+    def __init__(self, ingredient: str) -> None:
+        super().__init__("{} is not mounted".format(ingredient))
+        self.ingredient = ingredient
+
+
+class Pump_Map:
+    """Which ingredient is on which pump, in both directions.
+
+    Args:
+        config (dict): A dict matching each pin with his ingredient.
+    """
+
+    def __init__(self, config: dict) -> None:
+        # pin -> ingredient, in the order of the config
+        self.ingredient_for_pin = dict(config)
+        # ingredient -> pin
+        self.pin_for_ingredient = {
+            ingredient: pin for pin, ingredient in config.items()
+        }
+
+    def pins(self) -> list[str]:
+        """Get all the pins.
+
+        Returns:
+            list[str]: The pins, in the order of the config.
+        """
+        return list(self.ingredient_for_pin.keys())
+
+    def ingredient_for(self, pin: str) -> str:
+        """Get the ingredient on a pump.
+
+        Args:
+            pin (str): The pin of the pump.
+
+        Returns:
+            str: The name of the ingredient.
+        """
+        return self.ingredient_for_pin[pin]
+
+    def pin_for(self, ingredient: str) -> str:
+        """Get the pump of an ingredient.
+
+        Args:
+            ingredient (str): The name of the ingredient.
+
+        Raises:
+            Not_Mounted: The ingredient isn't on any pump.
+
+        Returns:
+            str: The pin of the pump.
+        """
+        try:
+            return self.pin_for_ingredient[ingredient]
+        except KeyError:
+            raise Not_Mounted(ingredient) from None
+
+    def is_mounted(self, ingredient: str) -> bool:
+        """Check if an ingredient is on a pump.
+
+        Args:
+            ingredient (str): The name of the ingredient.
+
+        Returns:
+            bool: True if a pump has the ingredient.
+        """
+        return ingredient in self.pin_for_ingredient
+
+    def swap(self, pin: str, ingredient: str) -> str | None:
+        """Put an ingredient on a pump, the pump that had it takes the old ingredient of this pump.
+
+        Args:
+            pin (str): The pin of the pump.
+            ingredient (str): The name of the ingredient.
+
+        Returns:
+            str | None: The pin of the other pump that changed, None if the ingredient wasn't mounted.
+        """
+        old_ingredient = self.ingredient_for_pin[pin]
+        other_pin = self.pin_for_ingredient.get(ingredient)
+
+        self.ingredient_for_pin[pin] = ingredient
+        self.pin_for_ingredient[ingredient] = pin
+
+        if other_pin is not None and other_pin != pin:
+            self.ingredient_for_pin[other_pin] = old_ingredient
+            self.pin_for_ingredient[old_ingredient] = other_pin
+        elif other_pin is None:
+            # The old ingredient isn't on any pump anymore
+            del self.pin_for_ingredient[old_ingredient]
+
+        return other_pin
+
+    def to_config(self) -> dict:
+        """Get the map the way it's saved in the config file.
+
+        Returns:
+            dict: A dict matching each pin with his ingredient.
+        """
+        return dict(self.ingredient_for_pin)
+
+
+_pump_map = None
+
+
+def get_pump_map() -> Pump_Map:
+    """Get the Pump_Map shared by the whole app, read the config file on the first call.
+
+    Returns:
+        Pump_Map: The shared Pump_Map.
+    """
+    global _pump_map
+    if _pump_map is None:
+        with open(PUMP_CONFIG_FILE, "r", encoding="utf-8") as config:
+            _pump_map = Pump_Map(json.load(config))
+    return _pump_map
@@ -0,0 +1,176 @@
+import json
+
+import pump_map
+
+
+RECIPES_FILE = "recipes.json"
+
+
+class Recipe:
+    """A drink of the menu.
+
+    Args:
+        name (str): The name of the drink.
+        volumes (dict): A dict matching each ingredient with his volume in cl.
+        price (float): The points the drink costs.
+    """
+
+    def __init__(self, name: str, volumes: dict, price: float) -> None:
+        self.name = name
+        self.volumes = volumes
+        self.price = price
+
+
+class Recipe_Book:
+    """The menu, loaded once from the recipes file.
+
+    Each time the pumps change, the book computes which recipes can be served
+    and which pump pours each of their ingredients, so ordering a drink is a
+    simple dict lookup.
+
+    Args:
+        path (str, optional): The path of the recipes file. Defaults to RECIPES_FILE.
+        pumps (pump_map.Pump_Map, optional): The ingredient on each pump. Defaults to the shared Pump_Map.
+    """
+
+    def __init__(self, path: str = RECIPES_FILE, pumps: pump_map.Pump_Map = None) -> None:
+        # ingredient -> {"alcoholic": bool, "price_per_cl": float}
+        self.ingredients = {}
+        # name -> Recipe, in the order of the file
+        self.recipes = {}
+        # name -> [(pin, ingredient, cl), ...], only for the recipes that can be served
+        self.pumps_for_recipe = {}
+        # The pumps that are (almost) empty, see inventory.py
+        self.blocked_pins = set()
+        self.load(path)
+
+        if pumps is None:
+            pumps = pump_map.get_pump_map()
+        self.set_pumps(pumps)
+
+    def load(self, path: str):
+        """Read the recipes file.
+
+        Args:
+            path (str): The path of the recipes file.
+        """
+        with open(path, "r", encoding="utf-8") as file:
+            data = json.load(file)
+
+        self.ingredients = data.get("ingredients", {})
+        self.recipes = {}
+        for name, recipe in data.get("recipes", {}).items():
+            volumes = recipe["ingredients"]
+            price = recipe.get("price")
+            # Without a fixed price, the drink costs the price of his ingredients
+            if price is None:
+                price = self.cost(volumes)
+            self.recipes[name] = Recipe(name, volumes, price)
+
+    def cost(self, volumes: dict) -> float:
+        """Get the price of some ingredients.
+
+        Args:
+            volumes (dict): A dict matching each ingredient with his volume in cl.
+
+        Returns:
+            float: The points the ingredients cost.
+        """
+        return sum(
+            self.ingredients.get(ingredient, {}).get("price_per_cl", 0) * cl
+            for ingredient, cl in volumes.items()
+        )
+
+    def is_alcoholic(self, ingredient: str) -> bool:
+        """Check if an ingredient contains alcohol.
+
+        Args:
+            ingredient (str): The name of the ingredient.
+
+        Returns:
+            bool: True if the ingredient is alcoholic.
+        """
+        return self.ingredients.get(ingredient, {}).get("alcoholic", False)
+
+    def set_pumps(self, pumps: pump_map.Pump_Map):
+        """Compute the recipes that can be served with the given pumps.
+
+        Args:
+            pumps (pump_map.Pump_Map): The ingredient on each pump.
+        """
+        self.pumps = pumps
+        self.pumps_for_recipe = {}
+        for name, recipe in self.recipes.items():
+            # A recipe with an ingredient that isn't mounted, or on an empty pump, is hidden
+            if all(pumps.is_mounted(ingredient) for ingredient in recipe.volumes):
+                pins = [
+                    (pumps.pin_for(ingredient), ingredient, cl)
+                    for ingredient, cl in recipe.volumes.items()
+                ]
+                if not any(pin in self.blocked_pins for pin, _, _ in pins):
+                    self.pumps_for_recipe[name] = pins
+
+    def set_blocked(self, pins: set):
+        """Hide the recipes that need one of the given pumps.
+
+        Args:
+            pins (set): The pins of the pumps that can't be used.
+        """
+        self.blocked_pins = set(pins)
+        self.set_pumps(self.pumps)
+
+    def available(self) -> list[str]:
+        """Get the names of the recipes that can be served.
+
+        Returns:
+            list[str]: The names of the recipes, in the order of the file.
+        """
+        return list(self.pumps_for_recipe.keys())
+
+    def is_available(self, name: str) -> bool:
+        """Check if a recipe can be served with the current pumps.
+
+        Args:
+            name (str): The name of the recipe.
+
+        Returns:
+            bool: True if every ingredient is mounted on a pump.
+        """
+        return name in self.pumps_for_recipe
+
+    def pumps_for(self, name: str) -> list[tuple[str, str, float]]:
+        """Get the pumps needed by a recipe.
+
+        Args:
+            name (str): The name of the recipe.
+
+        Returns:
+            list[tuple[str, str, float]]: The pin, the ingredient and the volume (cl) of each ingredient.
+        """
+        return self.pumps_for_recipe[name]
+
+    def price(self, name: str) -> float:
+        """Get the price of a recipe.
+
+        Args:
+            name (str): The name of the recipe.
+
+        Returns:
+            float: The points the drink costs.
+        """
+        return self.recipes[name].price
+
+
+_book = None
+
+
+def get_book() -> Recipe_Book:
+    """Get the Recipe_Book shared by the whole app, load it on the first call.
+
+    Returns:
+        Recipe_Book: The shared Recipe_Book.
+    """
+    global _book
+    if _book is None:
+        _book = Recipe_Book()
+    return _book
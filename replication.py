@@ -0,0 +1,202 @@
+import bisect
+import json
+import os
+import socket
+
+import journal
+import storage
+
+
+# The directory shared by the kiosks (network share, usb stick...), empty to disable the replication
+REPLICATION_HUB = os.environ.get("MIXOMAT_HUB", "")
+# The files holding the id of the installed system, generated on the first boot
+MACHINE_ID_FILES = ["/etc/machine-id", "/var/lib/dbus/machine-id"]
+REPLICATION_DIR = "replication"
+# Seconds between two syncs with the hub
+SYNC_SECONDS = 30
+
+
+def default_device_id(paths: list[str] = MACHINE_ID_FILES) -> str:
+    """Get a name for this kiosk that no other kiosk has.
+
+    The host name alone isn't enough, every Raspberry Pi is called
+    "raspberrypi" until someone changes it, so the machine id is added.
+
+    Args:
+        paths (list[str], optional): The files that may hold the machine id. Defaults to MACHINE_ID_FILES.
+
+    Returns:
+        str: "hostname-machineid", empty if there is no machine id.
+    """
+    for path in paths:
+        try:
+            with open(path, "r") as file:
+                machine_id = file.read().strip()
+        except OSError:
+            continue
+        if machine_id:
+            return "{}-{}".format(socket.gethostname(), machine_id[:12])
+    return ""
+
+
+# The name of this kiosk in the hub and on the account server, it must be unique
+DEVICE_ID = os.environ.get("MIXOMAT_DEVICE") or default_device_id()
+
+
+def check_device_id(device: str):
+    """Refuse to share the accounts without a name for this kiosk.
+
+    Args:
+        device (str): The name of this kiosk.
+
+    Raises:
+        ValueError: There is no name, set MIXOMAT_DEVICE.
+    """
+    if not device:
+        raise ValueError(
+            "No unique id for this kiosk (no machine id found), set MIXOMAT_DEVICE to share the accounts")
+
+
+class Replicator:
+    """Shares the points changes of this kiosk with the others, through a hub directory.
+
+    The changes of a kiosk are numbered by his own backend (the seq of the
+    journal or of the transactions table), so a change is saved and queued
+    for the other kiosks in a single write. A sync pushes the local changes
+    after the last pushed seq to the hub, as one batch file named after his
+    first seq, and pulls the batches of the other kiosks that come after the
+    last change already applied. The batches of a kiosk are
+    sorted by their first seq, so a sync only opens the batch holding the
+    next seq and the ones after it, however long the history is.
+
+    A balance is the sum of all the changes of all the kiosks, the order they
+    are applied in doesn't matter, so there is nothing to merge. Each change
+    pulled is saved in the local accounts together with his origin (kiosk and
+    seq), in the same write, so none is applied twice, even after a power cut
+    between the change and the state file.
+
+    Args:
+        store (accounts.Account_Store): The local accounts, the changes of the other kiosks are applied to it.
+        hub (str): The hub directory.
+        device (str, optional): The name of this kiosk. Defaults to DEVICE_ID.
+        directory (str, optional): The local directory of the state. Defaults to REPLICATION_DIR.
+    """
+
+    def __init__(self, store, hub: str, device: str = DEVICE_ID, directory: str = REPLICATION_DIR) -> None:
+        self.store = store
+        self.hub = hub
+        self.device = device
+        os.makedirs(directory, exist_ok=True)
+        self.state_path = os.path.join(directory, "state.json")
+        # The last seq of this kiosk in the hub, and of each other kiosk applied here
+        self.pushed = 0
+        self.seen = {}
+        if not self.load_state():
+            # The changes made before the replication was turned on stay on this kiosk
+            self.pushed = self.store.backend.last_seq()
+            self.save_state()
+        self.store.backend.mark_shared(self.pushed)
+
+    def load_state(self) -> bool:
+        """Read what was already pushed and pulled.
+
+        Returns:
+            bool: False if there is no state yet.
+        """
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as file:
+                state = json.load(file)
+        except FileNotFoundError:
+            return False
+        self.pushed = state.get("pushed", 0)
+        self.seen = state.get("seen", {})
+        return True
+
+    def save_state(self):
+        """Save what was already pushed and pulled.
+        """
+        text = json.dumps({"pushed": self.pushed, "seen": self.seen}, indent=4)
+        storage.write_atomic(self.state_path, text)
+
+    def batch_path(self, device: str, first_seq: int) -> str:
+        """Get the path of a batch in the hub.
+
+        Args:
+            device (str): The name of the kiosk.
+            first_seq (int): The seq of the first change of the batch.
+
+        Returns:
+            str: The path.
+        """
+        return os.path.join(self.hub, device, "{:012d}.log".format(first_seq))
+
+    def read_chain(self, device: str, after_seq: int):
+        """Read the batches of a kiosk that come after a seq.
+
+        Args:
+            device (str): The name of the kiosk.
+            after_seq (int): The last seq already known.
+
+        Yields:
+            tuple[int, float, str, float, None]: The seq, timestamp, id, delta and origin of each new change.
+        """
+        try:
+            names = os.listdir(os.path.join(self.hub, device))
+        except FileNotFoundError:
+            return
+        firsts = sorted(int(name[:-4]) for name in names if name.endswith(".log") and name[:-4].isdigit())
+
+        # A sync can stop in the middle of a batch, we start again from the batch holding the next seq
+        start = max(bisect.bisect_right(firsts, after_seq + 1) - 1, 0)
+        for first_seq in firsts[start:]:
+            for entry in journal.Balance_Journal(self.batch_path(device, first_seq)).read():
+                if entry[0] > after_seq:
+                    yield entry
+
+    def push(self):
+        """Write the local changes that aren't in the hub yet as a new batch.
+        """
+        # A batch may have been written just before a power cut, without the state
+        for seq, *_ in self.read_chain(self.device, self.pushed):
+            self.pushed = seq
+
+        with self.store.lock:
+            changes = self.store.backend.local_changes(self.pushed)
+        if changes:
+            os.makedirs(os.path.join(self.hub, self.device), exist_ok=True)
+            text = "".join(
+                "{}, {:.3f}, {}, {!r}\n".format(seq, moment, id, delta)
+                for seq, moment, id, delta in changes)
+            storage.write_atomic(self.batch_path(self.device, changes[0][0]), text)
+            self.pushed = changes[-1][0]
+
+        self.save_state()
+        with self.store.lock:
+            self.store.backend.mark_shared(self.pushed)
+
+    def pull(self) -> int:
+        """Apply the new changes of the other kiosks.
+
+        Returns:
+            int: The number of applied changes.
+        """
+        applied = 0
+        for device in os.listdir(self.hub):
+            if device == self.device or not os.path.isdir(os.path.join(self.hub, device)):
+                continue
+            for seq, _, id, delta, _ in self.read_chain(device, self.seen.get(device, 0)):
+                # Saved with his origin, a change applied before a power cut is skipped here
+                applied += self.store.apply_remote(id, delta, (device, seq))
+                self.seen[device] = seq
+            self.save_state()
+        return applied
+
+    def sync(self):
+        """Push the changes of this kiosk and pull the others, if the hub can be reached.
+        """
+        try:
+            self.push()
+            self.pull()
+        except OSError as e:
+            # The kiosk keeps working offline, the changes wait in the backend
+            print("Replication hub unreachable: {}".format(e))
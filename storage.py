@@ -0,0 +1,529 @@
+import os
+import sqlite3
+import time
+
+import journal
+
+
+ACCEPTED_ID_FILE = "accepted_id.txt"
+DATABASE_FILE = "accounts.db"
+# The snapshot is rewritten (and the journal emptied) after this amount of changes
+COMPACT_EVERY = 100
+# Marker line of the snapshot, it has no "," so older code just skips it
+SEQ_MARKER = "# seq "
+# Marker line of the snapshot with the last change applied from a device, "# applied SEQ DEVICE"
+APPLIED_MARKER = "# applied "
+
+
+def parse_accepted_line(line: str) -> tuple[str, str, float] | None:
+    """Parse a single line of the accepted ids file.
+
+    Args:
+        line (str): A raw line of the file, like "12345,    Bob, 464.4".
+
+    Returns:
+        tuple[str, str, float] | None: The id, the name and the points, or None if the line is blank or broken.
+    """
+    line = line.replace("\n", "")
+    # Blank lines (or lines without data) are simply ignored
+    if "," not in line:
+        return None
+
+    fields = [field.strip() for field in line.split(",")]
+    if len(fields) < 3:
+        return None
+
+    try:
+        points = float(fields[2])
+    except ValueError:
+        return None
+
+    return fields[0], fields[1], points
+
+
+def format_accepted_line(id: str, name: str, points: float) -> str:
+    """Format an account the same way it's written in the accepted ids file.
+
+    Args:
+        id (str): A string representation of the id.
+        name (str): The name related to the id.
+        points (float): The points of the user.
+
+    Returns:
+        str: The formated line, with the line break.
+    """
+    return "{}, {}, {}\n".format(id, name, points)
+
+
+def write_atomic(path: str, text: str, encoding: str = "utf-8"):
+    """Replace the content of a file without ever leaving it half written.
+
+    Args:
+        path (str): The path of the file.
+        text (str): The new content of the file.
+        encoding (str, optional): The encoding of the file. Defaults to "utf-8".
+    """
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding=encoding) as file:
+        file.write(text)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, path)
+
+
+class Storage_Backend:
+    """An abstract class representing the place where the accounts are stored.
+
+    The dict returned by load() belongs to the Account_Store, the backend is
+    only told about the changes made to it.
+    """
+
+    def load(self) -> dict:
+        """Load all the accounts.
+
+        Returns:
+            dict: A dict matching each id with a [name, points] list.
+        """
+        raise NotImplementedError
+
+    def changed(self) -> bool:
+        """Check if the accounts were changed by someone else since the last load.
+
+        Returns:
+            bool: True if load() need to be called again.
+        """
+        return False
+
+    def add_points(self, id: str, delta: float, origin: tuple[str, int] = None):
+        """Save a points change that was already applied to the loaded dict.
+
+        Args:
+            id (str): A string representation of the id.
+            delta (float): The amount of points added/removed.
+            origin (tuple[str, int], optional): The device and seq of a change made elsewhere, saved in the same
+                write as the change. Defaults to None (local change).
+        """
+        raise NotImplementedError
+
+    def applied(self) -> dict:
+        """Get the last change applied from each other device.
+
+        Returns:
+            dict: A dict matching each device with the seq of his last change saved here.
+        """
+        return {}
+
+    def last_seq(self) -> int:
+        """Get the seq of the last saved change.
+
+        Returns:
+            int: The seq, 0 if nothing was saved yet.
+        """
+        raise NotImplementedError
+
+    def local_changes(self, after_seq: int) -> list[tuple[int, float, str, float]]:
+        """Get the changes made on this kiosk after a seq, to share them with the others.
+
+        Args:
+            after_seq (int): The last seq already shared.
+
+        Returns:
+            list[tuple[int, float, str, float]]: The seq, timestamp, id and delta of each change, in order.
+        """
+        raise NotImplementedError
+
+    def mark_shared(self, seq: int):
+        """Tell the backend that the local changes up to a seq were shared, he doesn't need to keep them anymore.
+
+        Args:
+            seq (int): The last seq shared.
+        """
+
+    def close(self):
+        """Release the files/connections used by the backend.
+        """
+
+
+class Text_Backend(Storage_Backend):
+    """Store the accounts in the accepted ids file, used as a snapshot, and a journal.
+
+    Points changes are appended to the journal and replayed on top of the
+    snapshot when loading. The snapshot is rewritten every COMPACT_EVERY changes.
+
+    Args:
+        path (str, optional): The path of the accepted ids file. Defaults to ACCEPTED_ID_FILE.
+        journal_path (str, optional): The path of the journal. Defaults to journal.JOURNAL_FILE.
+    """
+
+    def __init__(
+        self,
+        path: str = ACCEPTED_ID_FILE,
+        journal_path: str = journal.JOURNAL_FILE,
+    ) -> None:
+        self.path = path
+        self.journal = journal.Balance_Journal(journal_path)
+        self.accounts = {}
+        self.file_state = None
+        # device -> seq of his last change saved here
+        self.origins = {}
+        # The local changes after this seq are kept in the journal until they are shared, None if nobody shares them
+        self.shared = None
+
+    def get_file_state(self) -> tuple[int, int] | None:
+        """Get the modification time and the size of the file.
+
+        Returns:
+            tuple[int, int] | None: The mtime (in ns) and size of the file, None if it doesn't exist.
+        """
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def load(self) -> dict:
+        """Read the whole snapshot and replay the journal on it.
+
+        Returns:
+            dict: A dict matching each id with a [name, points] list.
+        """
+        accounts = {}
+        snapshot_seq = 0
+        origins = {}
+        try:
+            with open(self.path, "r") as file:
+                for line in file:
+                    if line.startswith(SEQ_MARKER):
+                        snapshot_seq = int(line[len(SEQ_MARKER):])
+                        continue
+                    if line.startswith(APPLIED_MARKER):
+                        seq, _, device = line[len(APPLIED_MARKER):].rstrip("\n").partition(" ")
+                        origins[device] = int(seq)
+                        continue
+
+                    account = parse_accepted_line(line)
+                    if account is not None:
+                        id, name, points = account
+                        accounts[id] = [name, points]
+        except FileNotFoundError:
+            pass
+
+        self.journal.origins = origins
+        for id, delta in self.journal.replay(snapshot_seq):
+            if id in accounts:
+                accounts[id][1] += delta
+        self.origins = dict(self.journal.origins)
+
+        # Our own copy, it only contains the changes that are in the journal, so
+        # the snapshot never gets a change before the journal does.
+        self.accounts = {id: list(account) for id, account in accounts.items()}
+        self.file_state = self.get_file_state()
+        return accounts
+
+    def changed(self) -> bool:
+        """Check if the snapshot was edited by hand since the last load.
+
+        Returns:
+            bool: True if load() need to be called again.
+        """
+        return self.get_file_state() != self.file_state
+
+    def add_points(self, id: str, delta: float, origin: tuple[str, int] = None):
+        """Append the points change to the journal.
+
+        Args:
+            id (str): A string representation of the id.
+            delta (float): The amount of points added/removed.
+            origin (tuple[str, int], optional): The device and seq of a change made elsewhere. Defaults to None.
+        """
+        self.journal.append(id, delta, origin)
+        if origin is not None:
+            self.origins[origin[0]] = max(self.origins.get(origin[0], 0), origin[1])
+        if id in self.accounts:
+            self.accounts[id][1] += delta
+
+        if self.journal.entries >= COMPACT_EVERY:
+            self.compact()
+
+    def compact(self):
+        """Write all the accounts in a new snapshot and empty the journal.
+
+        If the snapshot was edited by hand since the last load, it's left as
+        it is: the store reloads it (with the journal) on his next lookup, and
+        the snapshot is written on a later change.
+        """
+        if self.changed():
+            return
+
+        lines = [
+            format_accepted_line(id, name, points)
+            for id, (name, points) in self.accounts.items()
+        ]
+        lines.extend(
+            "{}{} {}\n".format(APPLIED_MARKER, seq, device)
+            for device, seq in self.origins.items())
+        lines.append("{}{}\n".format(SEQ_MARKER, self.journal.last_seq))
+        write_atomic(self.path, "".join(lines))
+
+        # The snapshot knows the last seq, so a crash before the truncate
+        # won't replay those entries twice. The local changes not shared yet
+        # stay in the journal, they are before the seq of the snapshot.
+        keep = []
+        if self.shared is not None:
+            keep = [entry for entry in self.journal.read() if entry[4] is None and entry[0] > self.shared]
+        self.journal.truncate(keep)
+        self.file_state = self.get_file_state()
+
+    def applied(self) -> dict:
+        """Get the last change applied from each other device.
+
+        Returns:
+            dict: A dict matching each device with the seq of his last change saved here.
+        """
+        return dict(self.origins)
+
+    def last_seq(self) -> int:
+        """Get the seq of the last saved change.
+
+        Returns:
+            int: The seq, 0 if nothing was saved yet.
+        """
+        return self.journal.last_seq
+
+    def local_changes(self, after_seq: int) -> list[tuple[int, float, str, float]]:
+        """Get the changes made on this kiosk after a seq, from the journal.
+
+        Args:
+            after_seq (int): The last seq already shared.
+
+        Returns:
+            list[tuple[int, float, str, float]]: The seq, timestamp, id and delta of each change, in order.
+        """
+        return [
+            (seq, timestamp, id, delta)
+            for seq, timestamp, id, delta, origin in self.journal.read()
+            if origin is None and seq > after_seq
+        ]
+
+    def mark_shared(self, seq: int):
+        """Let the next compaction drop the local changes up to a seq.
+
+        Args:
+            seq (int): The last seq shared.
+        """
+        self.shared = seq
+
+    def close(self):
+        """Close the journal.
+        """
+        self.journal.close()
+
+
+class SQLite_Backend(Storage_Backend):
+    """Store the accounts and every points change in a SQLite database.
+
+    The connection is kept open for the whole life of the app (so sqlite3 can
+    reuse his prepared statements) and the database runs in WAL mode, so a
+    points change is a single row UPDATE plus a single INSERT.
+
+    Args:
+        path (str, optional): The path of the database. Defaults to DATABASE_FILE.
+    """
+
+    def __init__(self, path: str = DATABASE_FILE) -> None:
+        self.path = path
+        # isolation_level=None, we open the transactions ourselves
+        self.connection = sqlite3.connect(
+            path, isolation_level=None, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=FULL")
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS accounts (
+                id TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                points REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS transactions (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                account_id TEXT NOT NULL,
+                delta REAL NOT NULL,
+                timestamp REAL NOT NULL,
+                remote INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS transactions_account
+                ON transactions (account_id);
+            CREATE TABLE IF NOT EXISTS applied (
+                device TEXT PRIMARY KEY,
+                seq INTEGER NOT NULL
+            );
+        """)
+        # Databases created before the replication don't know which changes came from another kiosk
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(transactions)")]
+        if "remote" not in columns:
+            self.connection.execute("ALTER TABLE transactions ADD COLUMN remote INTEGER NOT NULL DEFAULT 0")
+        self.data_version = None
+
+    def get_data_version(self) -> int:
+        """Get the SQLite data version, it changes when another connection writes.
+
+        Returns:
+            int: The current data version.
+        """
+        return self.connection.execute("PRAGMA data_version").fetchone()[0]
+
+    def is_empty(self) -> bool:
+        """Check if there's no account in the database.
+
+        Returns:
+            bool: True if the accounts table is empty.
+        """
+        row = self.connection.execute("SELECT 1 FROM accounts LIMIT 1").fetchone()
+        return row is None
+
+    def load(self) -> dict:
+        """Read all the accounts.
+
+        Returns:
+            dict: A dict matching each id with a [name, points] list.
+        """
+        rows = self.connection.execute("SELECT id, name, points FROM accounts")
+        accounts = {id: [name, points] for id, name, points in rows}
+        self.data_version = self.get_data_version()
+        return accounts
+
+    def changed(self) -> bool:
+        """Check if another connection wrote in the database since the last load.
+
+        Returns:
+            bool: True if load() need to be called again.
+        """
+        return self.get_data_version() != self.data_version
+
+    def add_points(self, id: str, delta: float, origin: tuple[str, int] = None):
+        """Update the points of the account and record the transaction.
+
+        Args:
+            id (str): A string representation of the id.
+            delta (float): The amount of points added/removed.
+            origin (tuple[str, int], optional): The device and seq of a change made elsewhere, saved in the same
+                transaction. Defaults to None (local change).
+        """
+        with self.connection:
+            self.connection.execute("BEGIN")
+            self.connection.execute(
+                "UPDATE accounts SET points = points + ? WHERE id = ?",
+                (delta, id))
+            self.connection.execute(
+                "INSERT INTO transactions (account_id, delta, timestamp, remote) VALUES (?, ?, ?, ?)",
+                (id, delta, time.time(), origin is not None))
+            if origin is not None:
+                self.connection.execute(
+                    "INSERT INTO applied (device, seq) VALUES (?, ?) "
+                    "ON CONFLICT (device) DO UPDATE SET seq = MAX(seq, excluded.seq)",
+                    origin)
+
+    def applied(self) -> dict:
+        """Get the last change applied from each other device.
+
+        Returns:
+            dict: A dict matching each device with the seq of his last change saved here.
+        """
+        return dict(self.connection.execute("SELECT device, seq FROM applied"))
+
+    def last_seq(self) -> int:
+        """Get the seq of the last transaction.
+
+        Returns:
+            int: The seq, 0 if there is no transaction yet.
+        """
+        return self.connection.execute("SELECT COALESCE(MAX(seq), 0) FROM transactions").fetchone()[0]
+
+    def local_changes(self, after_seq: int) -> list[tuple[int, float, str, float]]:
+        """Get the transactions made on this kiosk after a seq.
+
+        Args:
+            after_seq (int): The last seq already shared.
+
+        Returns:
+            list[tuple[int, float, str, float]]: The seq, timestamp, id and delta of each change, in order.
+        """
+        return self.connection.execute(
+            "SELECT seq, timestamp, account_id, delta FROM transactions "
+            "WHERE seq > ? AND remote = 0 ORDER BY seq",
+            (after_seq,)).fetchall()
+
+    def import_accounts(self, accounts: dict):
+        """Insert (or replace) the given accounts in the database.
+
+        Args:
+            accounts (dict): A dict matching each id with a [name, points] list.
+        """
+        with self.connection:
+            self.connection.execute("BEGIN")
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO accounts (id, name, points) VALUES (?, ?, ?)",
+                ((id, name, points) for id, (name, points) in accounts.items()))
+
+    def close(self):
+        """Close the connection.
+        """
+        self.connection.close()
+
+
+def import_accepted_file(
+    backend: SQLite_Backend,
+    path: str = ACCEPTED_ID_FILE,
+    journal_path: str = journal.JOURNAL_FILE,
+) -> int:
+    """Copy the accounts of the accepted ids file (and his journal) in the database.
+
+    Args:
+        backend (SQLite_Backend): The database to fill.
+        path (str, optional): The path of the accepted ids file. Defaults to ACCEPTED_ID_FILE.
+        journal_path (str, optional): The path of the journal. Defaults to journal.JOURNAL_FILE.
+
+    Returns:
+        int: The number of imported accounts.
+    """
+    text_backend = Text_Backend(path, journal_path)
+    accounts = text_backend.load()
+    text_backend.close()
+
+    backend.import_accounts(accounts)
+    return len(accounts)
+
+
+def make_backend(name: str) -> Storage_Backend:
+    """Create the backend with the given name.
+
+    Args:
+        name (str): "text" or "sqlite".
+
+    Returns:
+        Storage_Backend: The new backend.
+    """
+    if name == "sqlite":
+        backend = SQLite_Backend()
+        # First start with the database, we take the accounts of the old file
+        if backend.is_empty() and os.path.exists(ACCEPTED_ID_FILE):
+            import_accepted_file(backend)
+        return backend
+
+    if name == "text":
+        return Text_Backend()
+
+    raise ValueError("Unknown storage backend: {}".format(name))
+
+
+if __name__ == "__main__":
+    import sys
+
+    # python storage.py [accepted_id.txt] [accounts.db]
+    arguments = sys.argv[1:]
+    source = arguments[0] if len(arguments) > 0 else ACCEPTED_ID_FILE
+    target = arguments[1] if len(arguments) > 1 else DATABASE_FILE
+
+    database = SQLite_Backend(target)
+    count = import_accepted_file(database, source)
+    database.close()
+    print("Imported {} accounts from {} into {}".format(count, source, target))
@@ -2,61 +2,142 @@ import sys
 from PyQt5 import QtWidgets, QtCore, QtGui
 import json
 
-from gpiozero import LED
+import accounts
+import calibration
+import inventory
+import ledger
+import metrics
+import orders
+import persistence
+import pricing
+import pump_map
+import recipes
 import theme
 import widgets
-import thread
+import workers
+
+
+class Lazy_Contents(dict):
+    """A dict of tabs where each tab is only built the first time it's asked for.
+
+    Args:
+        factories (dict): A dict matching each tab name with a function building the tab.
+    """
+
+    def __init__(self, factories: dict) -> None:
+        super().__init__()
+        self.factories = factories
+
+    def __missing__(self, key: str):
+        tab = self.factories[key]()
+        self[key] = tab
+        return tab
 
 
 class Vertical_Tabs(QtWidgets.QWidget):
     """A class implementing vertical tabs.
 
+    The tabs are built once and kept for the whole life of the app, each
+    login only binds them to the new user.
+
     Args:
         user_info (tuple[str, float]): A tuple containing all the needed user info.
     """
 
-    def __init__(self, user_info: tuple[str, float], leds: list[LED]) -> None:
+    def __init__(self, user_info: tuple[str, float], leds: dict) -> None:
         super().__init__()
         (self.user_id,
          self.user_name,
          self.user_points) = user_info
 
-        # The differents tabs
-        self.CONTENTS = {
-            "HOME": Home(self),
-            "1": Tab1(self),
-            "2": Tab2(self),
-            "3": Tab3(self),
-            "4": Tab4(self),
-            "EXIT": Exit(),
-        }
+        # Which ingredient is on which pump, shared with the Tab3 pumps
+        self.pump_map = pump_map.get_pump_map()
+
+        # The differents tabs, each one is built on his first visit
+        self.CONTENTS = Lazy_Contents({
+            "HOME": lambda: Home(self),
+            "1": lambda: Tab1(self),
+            "2": lambda: Tab2(self),
+            "3": lambda: Tab3(self),
+            "4": lambda: Tab4(self),
+            "EXIT": lambda: Exit(),
+        })
+        # The Pump widgets are only needed by the Tab3, see get_pin_for_pump()
+        self.pin_for_pump = None
+        # Match the pump number with his led
+        self.pin_for_led = leds
+        # The levels of the pumps, an order is only accepted if it fits in them
+        self.inventory = inventory.get_inventory()
+        # Every tab sends his orders here, they are served one after the other
+        self.orders = orders.Order_Queue(
+            self.change_points, workers.get_manager().get("dispense"), stock=self.inventory)
+        # Every pour and every points change is kept for the end of the night
+        self.ledger = ledger.get_ledger()
+        self.orders.served_signal.connect(self.ledger.record_order)
+        # The poured volumes are removed from the levels, an empty pump is blocked
+        self.orders.served_signal.connect(self.use_stock)
+        # Each order reserves (or gives back) some liquid, the menus show what still fits
+        self.orders.length_signal.connect(self.refresh_menus)
+        recipes.get_book().set_blocked(self.inventory.low_pins(self.pump_map.pins()))
+
+        self.setObjectName("Vertical_Tab")
+        self.init_ui()
+
+    def get_pin_for_pump(self) -> dict:
+        """Get the Pump widget of each pin, build them on the first call.
+
+        Returns:
+            dict: A dict matching each pin with his Pump.
+        """
+        if self.pin_for_pump is not None:
+            return self.pin_for_pump
+
         font = QtGui.QFont("Arial", 15)
 
         # We get a list of the current config as a base_list of names for the drinks.
         base_list = self.get_config()
 
         big_list = []
-        # This part will make 6 list, each when starting with a different element,
+        # This part will make a list per pump, each when starting with a different element,
         # vodka for the 1, Bacardi for the 2, etc etc
         for _ in range(len(base_list)):
             big_list.append(base_list.copy())
             first_elem = base_list.pop(0)
             base_list.append(first_elem)
 
-        # Each pump number as his own Pump attached to it. Each Pump as one of the 6 list generated above.
-        self.pin_for_pump = {
-            "17": widgets.Pump(big_list[0], "Pumpe 1", font),
-            "18": widgets.Pump(big_list[1], "Pumpe 2", font),
-            "19": widgets.Pump(big_list[2], "Pumpe 3", font),
-            "20": widgets.Pump(big_list[3], "Pumpe 4", font),
-            "21": widgets.Pump(big_list[4], "Pumpe 5", font),
-            "22": widgets.Pump(big_list[5], "Pumpe 6", font),
-        }
-        # Match the pump number with his led
-        self.pin_for_led = leds
+        # Each pump number as his own Pump attached to it. Each Pump as one of the lists generated above.
+        self.pin_for_pump = {}
+        for index, pin in enumerate(self.pump_map.pins()):
+            self.pin_for_pump[pin] = widgets.Pump(
+                big_list[index], "Pumpe {}".format(index + 1), font)
+        return self.pin_for_pump
 
-        self.setObjectName("Vertical_Tab")
-        self.init_ui()
+    def bind_user(self, user_info: tuple[str, float]):
+        """Show the tabs for a new user.
+
+        Args:
+            user_info (tuple[str, float]): A tuple containing all the needed user info.
+        """
+        (self.user_id,
+         self.user_name,
+         self.user_points) = user_info
+
+        self.CONTENTS["HOME"].show_user()
+        if "4" in self.CONTENTS:
+            self.CONTENTS["4"].points.setText(str(self.user_points))
+
+    def unbind_user(self):
+        """Get the tabs ready for the next user, the staff tabs are locked again.
+        """
+        self.change_tab(self.CONTENTS["HOME"])
+        self.orders.cancel_session()
+        # The next user starts with an empty mix and no order status
+        for name in ("1", "2"):
+            if name in self.CONTENTS:
+                self.CONTENTS[name].reset()
+        for name in ("3", "4"):
+            if name in self.CONTENTS:
+                self.CONTENTS[name].lock()
 
     def init_ui(self):
         """Initialize the UI
@@ -93,26 +174,52 @@ class Vertical_Tabs(QtWidgets.QWidget):
         Args:
             items (list[str]): List of string representing the drinks to find. 
 
+        Raises:
+            pump_map.Not_Mounted: One of the drinks isn't on any pump.
+
         Returns:
             list[str]: A list of string representing the pump number of each drinks. 
         """
-        pumps_number = []
-        for item in items:
-            for key, pump in self.pin_for_pump.items():
-                if pump.current_selected_item == item:
-                    pumps_number.append(key)
-                    break
-        return pumps_number
+        return [self.pump_map.pin_for(item) for item in items]
 
+    @metrics.timed("save_config_seconds", "Duration of a save of the pump config")
     def save_config(self):
         """Save the current config of the different pumps
         """
-        readable_dict = self.pin_for_pump.copy()
-        for key, pump in readable_dict.items():
-            pump = pump.current_selected_item
-            readable_dict[key] = pump
-        with open("pump_config.txt", "w", encoding="utf-8") as config:
-            json.dump(readable_dict, config, ensure_ascii=False, indent=4)
+        text = json.dumps(self.pump_map.to_config(), ensure_ascii=False, indent=4)
+        # The file is written by the persistence thread, the UI doesn't wait for it
+        persistence.get_writer().write_file(pump_map.PUMP_CONFIG_FILE, text)
+
+        # The tabs only offer the drinks that can be served with the new pumps
+        recipes.get_book().set_pumps(self.pump_map)
+        self.refresh_stock()
+
+    def refresh_menus(self):
+        """Show the drinks that can be served in the tabs that are already built.
+        """
+        if "1" in self.CONTENTS:
+            self.CONTENTS["1"].refresh_menu()
+        if "2" in self.CONTENTS:
+            self.CONTENTS["2"].refresh_availability()
+
+    def use_stock(self, order: orders.Order):
+        """Remove the volumes of a served order from the inventory.
+
+        Args:
+            order (orders.Order): The served order.
+        """
+        if self.inventory.record_order(order):
+            self.refresh_stock()
+        elif "3" in self.CONTENTS:
+            self.CONTENTS["3"].refresh_inventory()
+
+    def refresh_stock(self):
+        """Block the empty pumps (and unblock the refilled ones) everywhere.
+        """
+        recipes.get_book().set_blocked(self.inventory.low_pins(self.pump_map.pins()))
+        self.refresh_menus()
+        if "3" in self.CONTENTS:
+            self.CONTENTS["3"].refresh_inventory()
 
     def get_config(self) -> list[str]:
         """Get the current config of each pump
@@ -120,45 +227,38 @@ class Vertical_Tabs(QtWidgets.QWidget):
         Returns:
             [list[str]: A list of string representing the names of each drinks in order.
         """
-        with open("pump_config.txt", "r", encoding="utf-8") as config:
-            drinks = json.load(config)
-        return list(drinks.values())
+        return list(self.pump_map.to_config().values())
 
+    @metrics.timed("change_points_seconds", "Duration of a points change in the UI")
     def change_points(self, amount):
         """Change the amount of points of the user and the display of those points.
 
         Args:
             amount (int | float): The amount of points to add/remove.
         """
-        self.user_points += amount
-        self.CONTENTS["HOME"].points.setText(str(self.user_points))
-        self.CONTENTS["4"].points.setText(str(self.user_points))
-        self.save_accepted()
+        self.show_points(self.user_points + amount)
+        self.save_accepted(amount)
+        self.ledger.record_points(self.user_id, amount)
 
-    def save_accepted(self):
-        """Check if the given id is in the DB.
-        """
-        with open("accepted_id.txt", "r") as file:
-            lines = file.readlines()
+    def show_points(self, points: float):
+        """Display new points for the user, without saving anything.
 
-        valid_lines = []
-        # Clean up the DB in case there're blank lines in it
-        for line in lines:
-            line = line.replace("\n", "")
-            if "," in line:
-                line = line.split(",")
-                valid_lines.append(line)
-
-        clean_accepted = []
-        for line in valid_lines:
-            if str(self.user_id) in line:
-                line[2] = str(self.user_points)
+        Args:
+            points (float): The points of the user.
+        """
+        self.user_points = points
+        self.CONTENTS["HOME"].points.setText(str(self.user_points))
+        if "4" in self.CONTENTS:
+            self.CONTENTS["4"].points.setText(str(self.user_points))
 
-            new = ", ".join(line)+"\n"
-            clean_accepted.append(new)
+    @metrics.timed("save_accepted_seconds", "Duration of the submission of a points change")
+    def save_accepted(self, amount):
+        """Save the points change of the user in the DB.
 
-        with open("accepted_id.txt", "w") as file:
-            file.writelines(clean_accepted)
+        Args:
+            amount (int | float): The amount of points added/removed.
+        """
+        accounts.get_store().add_points(self.user_id, amount)
 
 
 class Tab_Bar(QtWidgets.QLabel):
@@ -193,7 +293,7 @@ class Tab_Bar(QtWidgets.QLabel):
             if elem.lower() == "spacer":
                 widget = QtWidgets.QLabel()
             else:
-                widget = Tab_Button(self, elem, self.parent().CONTENTS[elem])
+                widget = Tab_Button(self, elem, elem)
 
             self.lay.addWidget(widget)
 
@@ -204,17 +304,22 @@ class Tab_Button(QtWidgets.QPushButton):
     Args:
         parent (Tab_Bar): A Tab_Bar object.
         text (str): A string object representing the text to display on the button
-        tab_content (Tab): A Tab object (or child).
+        tab_name (str): The name of the tab in Vertical_Tabs.CONTENTS.
     """
 
-    def __init__(self, parent: Tab_Bar, text: str, tab_content) -> None:
+    def __init__(self, parent: Tab_Bar, text: str, tab_name: str) -> None:
         super().__init__(parent=parent)
         self.text = text
         self.init_ui()
-        self.tab_content = tab_content
-        self.clicked.connect(
-            lambda: self.parent().parent().change_tab(self.tab_content)
-        )
+        self.tab_name = tab_name
+        # The tab is only built when the button is clicked for the first time
+        self.clicked.connect(self.open_tab)
+
+    def open_tab(self):
+        """Show the tab linked to this button.
+        """
+        tabs = self.parent().parent()
+        tabs.change_tab(tabs.CONTENTS[self.tab_name])
 
     def init_ui(self):
         """Initialize the UI
@@ -222,7 +327,7 @@ class Tab_Button(QtWidgets.QPushButton):
         self.setText(self.text)
         self.setFixedSize(QtCore.QSize(60, 60))
         self.setFlat(True)
-        self.setStyleSheet(theme.TAB_BUTTON)
+        theme.apply(self, "tab_button")
 
 
 class Tab(QtWidgets.QWidget):
@@ -232,6 +337,31 @@ class Tab(QtWidgets.QWidget):
     def __init__(self) -> None:
         super().__init__()
 
+    def for_user(self, callback):
+        """Wrap a callback of an order, so it's only called while the user who ordered is logged in.
+
+        The drinks are still served after a logout, their progress must not
+        show up for the next user.
+
+        Args:
+            callback (callable): The callback.
+
+        Returns:
+            callable: The wrapped callback.
+        """
+        user_id = self.par.user_id
+
+        def call(*args):
+            if self.par.user_id == user_id:
+                callback(*args)
+        return call
+
+    def reset_progress(self):
+        """Clear the progress bar of the tab.
+        """
+        self.progress.reset()
+        self.progress.setFormat("%p%")
+
 
 class Home(Tab):
     """The Home tab.
@@ -256,17 +386,24 @@ class Home(Tab):
 
         title = widgets.Centered_label("HOME", font)
 
-        user = widgets.Centered_label("{} {}".format(
-            self.par.user_name, self.par.user_id), font)
+        self.user = widgets.Centered_label("", font)
 
-        self.points = widgets.Centered_label(str(self.par.user_points), font)
+        self.points = widgets.Centered_label("", font)
 
         layout.addWidget(title)
-        layout.addWidget(user)
+        layout.addWidget(self.user)
         layout.addWidget(self.points)
 
         self.setLayout(layout)
 
+        self.show_user()
+
+    def show_user(self):
+        """Display the name and the points of the current user.
+        """
+        self.user.setText("{} {}".format(self.par.user_name, self.par.user_id))
+        self.points.setText(str(self.par.user_points))
+
 
 class Tab1(Tab):
     """The first tab.
@@ -286,49 +423,103 @@ class Tab1(Tab):
         layout = QtWidgets.QGridLayout()
 
         self.dropdown = widgets.Dropdown()
-        self.dropdown.addItems(["Vodka Cola", "Bacardi Cola", "Fanta Korn"])
+        self.dropdown.addItems(recipes.get_book().available())
+        self.dropdown.currentTextChanged.connect(self.show_price)
+
+        self.price = widgets.Centered_label()
 
         self.progress = widgets.ProgressBar()
 
         self.button = widgets.Button("Start")
         self.button.clicked.connect(self.start)
 
-        layout.addWidget(self.dropdown, 0, 0, 1, 10)
+        layout.addWidget(self.dropdown, 0, 0, 1, 8)
+        layout.addWidget(self.price, 0, 8, 1, 2)
         layout.addWidget(self.progress, 1, 0, 1, 8)
         layout.addWidget(self.button, 1, 8, 1, 2)
 
         self.setLayout(layout)
 
-    def start(self):
-        """Start the process of serving the drink
+    def refresh_menu(self):
+        """Show the drinks that can be served with the current pumps, grey out the ones that don't fit in the stock.
+        """
+        current = self.dropdown.currentText()
+        available = recipes.get_book().available()
+
+        if available != [self.dropdown.itemText(index) for index in range(self.dropdown.count())]:
+            self.dropdown.clear()
+            self.dropdown.addItems(available)
+            # Keep the selected drink if it's still there
+            self.dropdown.setCurrentText(current)
+
+        for index, name in enumerate(available):
+            self.dropdown.set_item_enabled(index, not self.par.inventory.missing(self.volumes_for(name)))
+
+    def volumes_for(self, name: str) -> dict:
+        """Get the volume poured by each pump for a drink of the menu.
+
+        Args:
+            name (str): The name of the drink.
+
+        Returns:
+            dict: A dict matching each pin with the volume (ml) it pours.
         """
-        # Disable the button so we can't click it before the process is finished
-        self.button.setEnabled(False)
+        return {
+            pin: cl * calibration.ML_PER_CL
+            for pin, _, cl in recipes.get_book().pumps_for(name)
+        }
 
-        ingredients = {"Bacardi Cola": ["Bacardi", "Coca Cola"],
-                       "Fanta Korn": ["Fanta", "Vodka"],
-                       "Vodka Cola": ["Vodka", "Coca Cola"]}
+    def showEvent(self, event: QtGui.QShowEvent):
+        # The user or the happy hour may have changed since the last visit
+        self.show_price()
+        super().showEvent(event)
 
+    def reset(self):
+        """Forget the order status of the previous user.
+        """
+        self.reset_progress()
+
+    def show_price(self):
+        """Show the price of the selected drink for the current user.
+        """
         current_mixed = self.dropdown.currentText()
-        # The current selected drink
-        items = ingredients[current_mixed]
-        # Get the pump related to this drink
-        pump_number = self.parent().match_item_with_pump_number(items)
-        pump_alcohol_number = pump_number[0]
-        pump_soft_number = pump_number[1]
-
-        # Match the pumps with their leds
-        leds_dict = self.par.pin_for_led
-        leds = [leds_dict[pump_alcohol_number], leds_dict[pump_soft_number]]
+        if not recipes.get_book().is_available(current_mixed):
+            self.price.setText("")
+            return
+        price = pricing.get_prices().recipe_price(current_mixed, self.par.user_id)
+        self.price.setText("{} points".format(price))
 
-        # Remove 25 points for the drink
-        self.par.change_points(-25)
+    def start(self):
+        """Order the selected drink, it's served as soon as the pumps are free
+        """
+        book = recipes.get_book()
+        current_mixed = self.dropdown.currentText()
+        # Nothing can be served with the current pumps
+        if not book.is_available(current_mixed):
+            return
 
-        # Start serving the drink
-        self.thread = thread.Progress_Thread(25, leds)
-        self.thread.start()
-        self.thread.progress_signal.connect(self.make_progress)
-        self.thread.finished.connect(lambda: self.button.setEnabled(True))
+        # Match the pumps with their leds, the running time comes from the calibration
+        leds_dict = self.par.pin_for_led
+        calibration_table = calibration.get_calibration()
+        volumes = self.volumes_for(current_mixed)
+        durations = {}
+        for pin, ingredient, _ in book.pumps_for(current_mixed):
+            durations[leds_dict[pin]] = calibration_table.duration(
+                pin, ingredient, volumes[pin])
+
+        # The drink is paid when it enters the queue
+        order = orders.Order(
+            durations,
+            cost=pricing.get_prices().recipe_price(current_mixed, self.par.user_id),
+            on_progress=self.for_user(self.make_progress),
+            on_queued=self.for_user(self.show_position),
+            user_id=self.par.user_id,
+            volumes=volumes,
+        )
+        if not self.par.orders.enqueue(order):
+            # The orders already in the queue need what is left
+            self.progress.setValue(0)
+            self.progress.setFormat("Not enough left")
 
     def make_progress(self, percentages: int):
         """Display the progress on the progress bar
@@ -338,6 +529,18 @@ class Tab1(Tab):
         """
         self.progress.setValue(percentages)
 
+    def show_position(self, position: int):
+        """Display the position of the order in the queue on the progress bar
+
+        Args:
+            position (int): The position in the queue, 0 when the drink is being served.
+        """
+        if position == 0:
+            self.progress.setFormat("%p%")
+        else:
+            self.progress.setValue(0)
+            self.progress.setFormat("Queued ({})".format(position))
+
 
 class Tab2(Tab):
     """The second tab.
@@ -356,73 +559,133 @@ class Tab2(Tab):
         """
         layout = QtWidgets.QGridLayout()
 
-        self.dropdown_alcohol = widgets.Dropdown()
-        self.dropdown_alcohol.addItems(["Vodka", "Bacardi", "Lelet"])
+        self.book = recipes.get_book()
+        ingredients = list(self.book.ingredients)
+        # We start with an alcohol and a soft, more can be added with the "+" button
+        defaults = [
+            next(item for item in ingredients if self.book.is_alcoholic(item)),
+            next(item for item in ingredients if not self.book.is_alcoholic(item)),
+        ]
+        self.prices = pricing.get_prices()
+        self.mixer = widgets.Mixer_Widget(
+            ingredients, defaults, unit_prices=self.prices.unit_prices)
+        self.mixer.changed_signal.connect(self.change_glass)
+        self.mixer.changed_signal.connect(self.show_price)
 
-        self.dropdown_soft = widgets.Dropdown()
-        self.dropdown_soft.addItems(["Coca Cola", "Orange Juice", "Fanta"])
+        self.glass = widgets.Drink_Glass(self.mixer.mixer.budget)
 
-        self.sliders_duo = widgets.Double_Slider(self)
-
-        self.glass = widgets.Drink_Glass()
+        self.price = widgets.Centered_label()
 
         self.progress = widgets.ProgressBar()
 
         self.button = widgets.Button("Start")
         self.button.clicked.connect(self.start)
 
-        layout.addWidget(self.dropdown_alcohol, 0, 0, 1, 5)
-        layout.addWidget(self.dropdown_soft, 1, 0, 1, 5)
-        layout.addWidget(self.sliders_duo, 2, 0, 4, 5)
+        layout.addWidget(self.mixer, 0, 0, 6, 5)
         layout.addWidget(self.glass, 1, 6, 4, 3)
+        layout.addWidget(self.price, 5, 6, 1, 3)
         layout.addWidget(self.progress, 6, 0, 1, 8)
         layout.addWidget(self.button, 6, 8, 1, 2)
 
         self.setLayout(layout)
 
+        self.mixer.added_signal.connect(self.refresh_availability)
+        self.refresh_availability()
         self.change_glass()
 
+    def refresh_availability(self):
+        """Grey out the drinks that aren't on any pump.
+        """
+        for dropdown in self.mixer.dropdowns:
+            for index in range(dropdown.count()):
+                item = dropdown.itemText(index)
+                dropdown.set_item_enabled(index, self.can_pour(item))
+
+    def can_pour(self, item: str) -> bool:
+        """Check if a drink is on a pump that still has some left, once the queued orders are served.
+
+        Args:
+            item (str): The name of the drink.
+
+        Returns:
+            bool: True if the drink can be poured.
+        """
+        if not self.par.pump_map.is_mounted(item):
+            return False
+        pin = self.par.pump_map.pin_for(item)
+        return pin not in self.book.blocked_pins and self.par.inventory.free(pin) > 0
+
     def change_glass(self):
         """Change the appearance of the glass based on the amount of drinks
         """
-        values = self.sliders_duo.values
+        layers = []
+        for item, cl in self.mixer.layers():
+            color = theme.color("alcoholic" if self.book.is_alcoholic(item) else "soft")
+            layers.append(("{} cl".format(cl), cl, color))
+        self.glass.set_layers(layers)
+
+    def showEvent(self, event: QtGui.QShowEvent):
+        # The user or the happy hour may have changed since the last visit
+        self.show_price()
+        super().showEvent(event)
+
+    def reset(self):
+        """Forget the mix and the order status of the previous user.
+        """
+        self.mixer.reset()
+        self.reset_progress()
 
-        self.glass.change_layout_from_value(values)
+    def show_price(self):
+        """Show the price of the drink for the current user, the mixer keeps the full price up to date.
+        """
+        price = self.prices.discounted(self.mixer.cost(), self.par.user_id)
+        self.price.setText("{} points".format(price))
 
     def start(self):
-        """Start the process of serving the drink
+        """Order the drink, it's served as soon as the pumps are free
         """
-        # Disable the button so we can't click it before the process is finished
-        self.button.setEnabled(False)
-
-        # The current selected drinks
-        items = [self.dropdown_alcohol.currentText(
-        ), self.dropdown_soft.currentText()]
+        # The volume (in cl) of each selected drink
+        volumes = self.mixer.volumes()
         # Get the pumps related to those drinks
-        pump_number = self.par.match_item_with_pump_number(items)
-
-        pump_alcohol_number = pump_number[0]
-        pump_soft_number = pump_number[1]
-
-        # Match the pumps with their leds
-        leds_dict = self.par.pin_for_led
-        leds = [leds_dict[pump_alcohol_number], leds_dict[pump_soft_number]]
-
-        # The values taken from the 2 sliders
-        values = list(self.sliders_duo.values.values())
+        try:
+            pump_number = self.par.match_item_with_pump_number(list(volumes))
+        except pump_map.Not_Mounted as e:
+            self.progress.setValue(0)
+            self.progress.setFormat(str(e))
+            return
+        empty = [item for item in volumes if not self.can_pour(item)]
+        if empty:
+            self.progress.setValue(0)
+            self.progress.setFormat("{} is empty".format(empty[0]))
+            return
 
         # Calculate the point cost based on the values
-        points_cost = (values[0]*-1) + ((values[1]/10)*-1)
-        self.par.change_points(points_cost)
-
-        # Get the max quantity of the two drinks
-        quantity = max(values)
+        points_cost = self.prices.volumes_price(volumes, self.par.user_id)
 
-        # Start serving the drinks
-        self.thread = thread.Progress_Thread(quantity, leds)
-        self.thread.start()
-        self.thread.progress_signal.connect(self.make_progress)
-        self.thread.finished.connect(lambda: self.button.setEnabled(True))
+        # Match the pumps with their leds, each one runs for his own quantity (in cl)
+        leds_dict = self.par.pin_for_led
+        calibration_table = calibration.get_calibration()
+        durations = {}
+        poured = {}
+        for pin, (item, cl) in zip(pump_number, volumes.items()):
+            poured[pin] = cl * calibration.ML_PER_CL
+            durations[leds_dict[pin]] = calibration_table.duration(pin, item, poured[pin])
+
+        # The drink is paid when it enters the queue
+        order = orders.Order(
+            durations,
+            cost=points_cost,
+            on_progress=self.for_user(self.make_progress),
+            on_queued=self.for_user(self.show_position),
+            user_id=self.par.user_id,
+            volumes=poured,
+        )
+        if not self.par.orders.enqueue(order):
+            # The drink is bigger than what is left (once the queued orders are served)
+            self.progress.setValue(0)
+            self.progress.setFormat("Not enough {} left".format(", ".join(
+                item for pin, item in zip(pump_number, volumes)
+                if pin in self.par.inventory.missing(poured))))
 
     def make_progress(self, percentages: int):
         """Display the progress on the progress bar
@@ -432,6 +695,18 @@ class Tab2(Tab):
         """
         self.progress.setValue(percentages)
 
+    def show_position(self, position: int):
+        """Display the position of the order in the queue on the progress bar
+
+        Args:
+            position (int): The position in the queue, 0 when the drink is being served.
+        """
+        if position == 0:
+            self.progress.setFormat("%p%")
+        else:
+            self.progress.setValue(0)
+            self.progress.setFormat("Queued ({})".format(position))
+
 
 class Tab3(Tab):
     """The third tab.
@@ -445,6 +720,8 @@ class Tab3(Tab):
         # I can't simply use setParent here because this widget would be display on
         # all the other tab
         self.par = parent
+        # The widgets shown once the password is correct
+        self.unlocked_widgets = []
         self.init_ui()
 
     def init_ui(self):
@@ -473,29 +750,134 @@ class Tab3(Tab):
     def set_real_layout(self):
         """Set the "real" layout of the tab
         """
-        self.password.setParent(None)
+        self.password.hide()
 
-        self.pumps = widgets.Multiple_Pump(self, self.par.pin_for_pump)
+        # The real layout is only built the first time, after that it's just shown again
+        if self.unlocked_widgets:
+            for widget in self.unlocked_widgets:
+                widget.show()
+            self.inventory.refresh()
+            return
+
+        self.pumps = widgets.Multiple_Pump(
+            self, self.par.get_pin_for_pump(), self.par.pump_map)
 
         spacer = QtWidgets.QWidget()
 
         self.button = widgets.Button("Spuelen")
         self.button.clicked.connect(self.clean)
 
+        self.calibrate_button = widgets.Button("Kalibrieren")
+        self.calibrate_button.clicked.connect(self.calibrate)
+
+        self.inventory = widgets.Inventory_Panel(
+            self, self.par.inventory, self.par.pump_map)
+
         self.lay.addWidget(self.pumps, 0, 0, 2, 2)
-        self.lay.addWidget(spacer, 2, 0, 1, 1)
-        self.lay.addWidget(self.button, 2, 1, 2, 1)
+        self.lay.addWidget(self.inventory, 2, 0, 1, 2)
+        self.lay.addWidget(spacer, 3, 0, 1, 1)
+        self.lay.addWidget(self.button, 3, 1, 1, 1)
+        self.lay.addWidget(self.calibrate_button, 4, 1, 1, 1)
+
+        self.unlocked_widgets = [
+            self.pumps, self.inventory, spacer, self.button, self.calibrate_button]
+
+    def lock(self):
+        """Hide the real layout and ask for the password again.
+        """
+        for widget in self.unlocked_widgets:
+            widget.hide()
+        self.password.input_field.clear()
+        self.password.show()
+
+    def refresh_inventory(self):
+        """Show the new levels of the pumps, if the panel is built.
+        """
+        if self.unlocked_widgets:
+            self.inventory.refresh()
 
     def clean(self):
-        self.button.setEnabled(False)
+        """Run every pump for the cleaning time, once the pumps are free.
+        """
+        calibration_table = calibration.get_calibration()
+        durations = {}
+        # What comes out of each pump is taken from his stock, like a drink
+        volumes = {}
+        for pin, led in self.par.pin_for_led.items():
+            durations[led] = calibration.CLEAN_SECONDS
+            volumes[pin] = calibration_table.volume(
+                pin, self.par.pump_map.ingredient_for(pin), calibration.CLEAN_SECONDS)
+
+        order = orders.Order(
+            durations,
+            on_finished=lambda: self.button.setEnabled(True),
+            on_cancelled=lambda: self.button.setEnabled(True),
+            cancel_on_logout=True,
+            volumes=volumes,
+        )
+        if self.par.orders.enqueue(order):
+            self.button.setEnabled(False)
+        else:
+            self.warn_missing("Spuelen", volumes)
 
-        # We get all the leds
-        leds = list(self.par.pin_for_led.values())
+    def calibrate(self):
+        """Run a pump for a reference time, then ask how much came out.
+        """
+        pumps = self.par.pump_map
+        choices = [
+            "{} ({})".format(pin, pumps.ingredient_for(pin)) for pin in pumps.pins()
+        ]
+        choice, ok = QtWidgets.QInputDialog.getItem(
+            self, "Kalibrieren", "Put a measuring cup under the pump:", choices, editable=False)
+        if not ok:
+            return
+
+        pin = choice.split(" ")[0]
+        liquid = pumps.ingredient_for(pin)
+        # Reserved with the current flow rate, the measured volume is what leaves the stock
+        volumes = {pin: calibration.get_calibration().volume(pin, liquid, calibration.REFERENCE_SECONDS)}
+
+        # Run the pump for the reference time once the pumps are free
+        order = orders.Order(
+            {self.par.pin_for_led[pin]: calibration.REFERENCE_SECONDS},
+            on_cancelled=lambda: self.calibrate_button.setEnabled(True),
+            cancel_on_logout=True,
+            volumes=volumes,
+        )
+        order.on_finished = lambda: self.finish_calibration(order, pin)
+        if self.par.orders.enqueue(order):
+            self.calibrate_button.setEnabled(False)
+        else:
+            self.warn_missing("Kalibrieren", volumes)
 
-        # Start cleaning the pump
-        self.thread = thread.Progress_Thread(10, leds)
-        self.thread.start()
-        self.thread.finished.connect(lambda: self.button.setEnabled(True))
+    def finish_calibration(self, order: orders.Order, pin: str):
+        """Save the flow rate of the pump from the measured volume.
+
+        Args:
+            order (orders.Order): The order of the reference pour.
+            pin (str): The pin number of the calibrated pump.
+        """
+        self.calibrate_button.setEnabled(True)
+
+        measured_ml, ok = QtWidgets.QInputDialog.getDouble(
+            self, "Kalibrieren", "How much ml were poured:", min=0.1, max=10000, decimals=1)
+        if ok:
+            liquid = self.par.pump_map.ingredient_for(pin)
+            calibration.get_calibration().calibrate(
+                pin, liquid, calibration.REFERENCE_SECONDS, measured_ml)
+            # on_finished is called before the served order leaves the stock (and goes in the ledger)
+            order.volumes = {pin: measured_ml}
+
+    def warn_missing(self, title: str, volumes: dict):
+        """Tell the staff which pumps don't have enough left for a job.
+
+        Args:
+            title (str): The title of the message.
+            volumes (dict): A dict matching each pin with the volume (ml) the job needs.
+        """
+        pins = self.par.inventory.missing(volumes)
+        QtWidgets.QMessageBox.warning(self, title, "Not enough left behind {}".format(", ".join(
+            "{} ({})".format(pin, self.par.pump_map.ingredient_for(pin)) for pin in pins)))
 
 
 class Tab4(Tab):
@@ -508,6 +890,8 @@ class Tab4(Tab):
     def __init__(self, parent: Vertical_Tabs) -> None:
         super().__init__()
         self.par = parent
+        # The widgets shown once the password is correct
+        self.unlocked_widgets = []
         self.init_ui()
 
     def init_ui(self):
@@ -540,7 +924,13 @@ class Tab4(Tab):
     def set_real_layout(self):
         """Set the "real" layout of the tab
         """
-        self.password.setParent(None)
+        self.password.hide()
+
+        # The real layout is only built the first time, after that it's just shown again
+        if self.unlocked_widgets:
+            for widget in self.unlocked_widgets:
+                widget.show()
+            return
 
         font = QtGui.QFont("Arial", 35)
 
@@ -554,6 +944,16 @@ class Tab4(Tab):
         self.lay.addWidget(self.points)
         self.lay.addWidget(button)
 
+        self.unlocked_widgets = [title, self.points, button]
+
+    def lock(self):
+        """Hide the real layout and ask for the password again.
+        """
+        for widget in self.unlocked_widgets:
+            widget.hide()
+        self.password.input_field.clear()
+        self.password.show()
+
     def recharge_points(self):
         """Recharge the user points base on the inputed points
         """
@@ -563,30 +963,13 @@ class Tab4(Tab):
         if ok:
             self.par.change_points(value)
 
-    def save_accepted(self):
-        """Check if the given id is in the DB.
-        """
-        with open("accepted_id.txt", "r") as file:
-            lines = file.readlines()
+    def save_accepted(self, amount):
+        """Save the points change of the user in the DB.
 
-        valid_lines = []
-        # Clean up the DB in case there're blank lines in it
-        for line in lines:
-            line = line.replace("\n", "")
-            if "," in line:
-                line = line.split(",")
-                valid_lines.append(line)
-
-        clean_accepted = []
-        for line in valid_lines:
-            if str(self.par.user_id) in line:
-                line[2] = str(self.par.user_points)
-                break
-            new = ", ".join(line)+"\n"
-            clean_accepted.append(new)
-
-        with open("accepted_id.txt", "w") as file:
-            file.writelines(clean_accepted)
+        Args:
+            amount (int | float): The amount of points added/removed.
+        """
+        self.par.save_accepted(amount)
 
 
 class Exit(Tab):
@@ -620,4 +1003,4 @@ class Exit(Tab):
 
     def exit(self):
         # Acces the main window set_loading() method
-        self.parent().parent().set_loading()
+        self.window().set_loading()
@@ -0,0 +1,6 @@
+import os
+import sys
+
+
+# The modules of the app are at the root of the repo
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
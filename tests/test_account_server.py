@@ -0,0 +1,106 @@
+import pathlib
+import threading
+import time
+
+import account_server
+import accounts
+import storage
+
+
+CARD = "1234"
+
+
+def make_store(root: pathlib.Path) -> accounts.Account_Store:
+    """Load (or create) the accounts of a kiosk or of the server.
+
+    Args:
+        root (pathlib.Path): The directory of the accounts.
+
+    Returns:
+        accounts.Account_Store: The accounts, Bob has 100 points at the start.
+    """
+    root.mkdir(exist_ok=True)
+    accepted = root / "accepted_id.txt"
+    if not accepted.exists():
+        accepted.write_text(storage.format_accepted_line(CARD, "Bob", 100.0))
+    return accounts.Account_Store(storage.Text_Backend(str(accepted), str(root / "journal")))
+
+
+def make_kiosk(root: pathlib.Path, address: tuple[str, int]) -> account_server.Remote_Store:
+    """Start (or restart) a kiosk using the given server.
+
+    Args:
+        root (pathlib.Path): The directory of the kiosk.
+        address (tuple[str, int]): The address of the server.
+
+    Returns:
+        account_server.Remote_Store: The accounts of the kiosk.
+    """
+    local = make_store(root)
+    client = account_server.Account_Client(address, device="kiosk", ttl=0)
+    return account_server.Remote_Store(
+        client, local, outbox_path=str(root / "outbox.journal"), state_path=str(root / "outbox.json"))
+
+
+def test_a_late_answer_doesnt_charge_twice(tmp_path, monkeypatch):
+    server_store = make_store(tmp_path / "server")
+    server = account_server.start_loopback(server_store)
+    kiosk = make_kiosk(tmp_path / "kiosk", server.server_address)
+
+    # The server applies the change, but answers after the kiosk gave up
+    answer = account_server.Account_Server.answer
+
+    def slow_answer(self, request):
+        result = answer(self, request)
+        if request["op"] == "add":
+            time.sleep(account_server.TIMEOUT * 1.5)
+        return result
+
+    monkeypatch.setattr(account_server.Account_Server, "answer", slow_answer)
+    kiosk.add_points(CARD, -10)
+    assert not kiosk.online()
+    assert kiosk.local.lookup(CARD)[1] == 90
+
+    # The change is sent again once the server is back, he already has it
+    monkeypatch.setattr(account_server.Account_Server, "answer", answer)
+    kiosk.retry_at = 0
+    kiosk.send_pending()
+    assert kiosk.unsent == []
+    assert server_store.lookup(CARD)[1] == 90
+    assert kiosk.lookup(CARD)[1] == 90
+    assert kiosk.local.lookup(CARD)[1] == 90
+    server.shutdown()
+    server.server_close()
+
+
+def test_the_offline_changes_are_sent_after_a_restart(tmp_path):
+    server_store = make_store(tmp_path / "server")
+    server = account_server.start_loopback(server_store)
+    address = server.server_address
+    server.shutdown()
+    server.server_close()
+
+    kiosk = make_kiosk(tmp_path / "kiosk", address)
+    kiosk.add_points(CARD, -10)
+    kiosk.add_points(CARD, -5)
+    assert kiosk.lookup(CARD)[1] == 85
+    assert server_store.lookup(CARD)[1] == 100
+
+    # Another kiosk adds points while this one is offline and restarts
+    server_store.add_points(CARD, 50)
+    server = account_server.Account_Server(address, server_store)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    kiosk = make_kiosk(tmp_path / "kiosk", address)
+    assert len(kiosk.unsent) == 2
+
+    kiosk.send_pending()
+    assert kiosk.unsent == []
+    assert server_store.lookup(CARD)[1] == 135
+    # The lookup answers from the local accounts, they follow the server right after
+    changes = []
+    kiosk.points_signal.connect(lambda id, points: changes.append((id, points)))
+    assert kiosk.lookup(CARD)[1] == 85
+    assert changes == [(CARD, 135)]
+    assert kiosk.lookup(CARD)[1] == 135
+    server.shutdown()
+    server.server_close()
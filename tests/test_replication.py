@@ -0,0 +1,166 @@
+import pathlib
+
+import pytest
+
+import accounts
+import replication
+import storage
+
+
+CARD = "1234"
+
+
+def make_kiosk(root: pathlib.Path, hub: pathlib.Path, device: str, backend: str) -> replication.Replicator:
+    """Start (or restart) a kiosk from his files.
+
+    Args:
+        root (pathlib.Path): The directory of the kiosk.
+        hub (pathlib.Path): The hub directory.
+        device (str): The name of the kiosk.
+        backend (str): "text" or "sqlite".
+
+    Returns:
+        replication.Replicator: The replicator, his store is the accounts of the kiosk.
+    """
+    root.mkdir(exist_ok=True)
+    accepted = root / "accepted_id.txt"
+    if not accepted.exists():
+        accepted.write_text(storage.format_accepted_line(CARD, "Bob", 100.0))
+    if backend == "sqlite":
+        database = storage.SQLite_Backend(str(root / "accounts.db"))
+        if database.is_empty():
+            storage.import_accepted_file(database, str(accepted), str(root / "journal"))
+    else:
+        database = storage.Text_Backend(str(accepted), str(root / "journal"))
+    store = accounts.Account_Store(database)
+    store.replicator = replication.Replicator(store, str(hub), device, str(root / "replication"))
+    return store.replicator
+
+
+@pytest.mark.parametrize("backend", ["text", "sqlite"])
+def test_power_cut_before_the_state_is_saved(tmp_path, monkeypatch, backend):
+    hub = tmp_path / "hub"
+    hub.mkdir()
+    kiosk_a = make_kiosk(tmp_path / "a", hub, "a", backend)
+    kiosk_b = make_kiosk(tmp_path / "b", hub, "b", backend)
+
+    kiosk_a.store.add_points(CARD, -10)
+    kiosk_a.store.add_points(CARD, -10)
+    kiosk_a.sync()
+
+    # B applies both changes, then the power goes out before his state file is written
+    def power_cut():
+        raise KeyboardInterrupt("power cut")
+    monkeypatch.setattr(kiosk_b, "save_state", power_cut)
+    with pytest.raises(KeyboardInterrupt):
+        kiosk_b.pull()
+    kiosk_b.store.backend.close()
+    monkeypatch.undo()
+
+    kiosk_b = make_kiosk(tmp_path / "b", hub, "b", backend)
+    assert kiosk_b.seen == {}
+    kiosk_b.sync()
+
+    assert kiosk_b.store.lookup(CARD) == ("Bob", 80.0)
+    assert kiosk_b.seen == {"a": 2}
+
+
+def test_applied_changes_survive_a_compaction(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "COMPACT_EVERY", 1)
+    hub = tmp_path / "hub"
+    hub.mkdir()
+    kiosk_a = make_kiosk(tmp_path / "a", hub, "a", "text")
+    kiosk_b = make_kiosk(tmp_path / "b", hub, "b", "text")
+
+    kiosk_a.store.add_points(CARD, -10)
+    kiosk_a.sync()
+    kiosk_b.sync()
+    kiosk_b.store.backend.close()
+
+    # The change is only in the snapshot now, with the marker of his origin
+    (tmp_path / "b" / "replication" / "state.json").unlink()
+    kiosk_b = make_kiosk(tmp_path / "b", hub, "b", "text")
+    assert kiosk_b.store.applied == {"a": 1}
+    kiosk_b.sync()
+
+    assert kiosk_b.store.lookup(CARD) == ("Bob", 90.0)
+
+
+def test_two_pis_with_the_same_hostname_get_different_ids(tmp_path):
+    first = tmp_path / "first-machine-id"
+    second = tmp_path / "second-machine-id"
+    first.write_text("0123456789abcdef0123456789abcdef\n")
+    second.write_text("fedcba9876543210fedcba9876543210\n")
+
+    assert replication.default_device_id([str(first)]) != replication.default_device_id([str(second)])
+    assert replication.default_device_id([str(tmp_path / "missing")]) == ""
+
+
+def test_a_shared_store_needs_a_device_id(monkeypatch):
+    monkeypatch.setattr(accounts, "_store", None)
+    monkeypatch.setattr(accounts, "ACCOUNT_SERVER", "127.0.0.1:5050")
+    monkeypatch.setattr(replication, "DEVICE_ID", "")
+
+    with pytest.raises(ValueError):
+        accounts.get_store()
+
+
+def test_a_pull_stopped_in_the_middle_of_a_batch_goes_on(tmp_path, monkeypatch):
+    hub = tmp_path / "hub"
+    hub.mkdir()
+    kiosk_a = make_kiosk(tmp_path / "a", hub, "a", "text")
+    kiosk_b = make_kiosk(tmp_path / "b", hub, "b", "text")
+
+    for _ in range(3):
+        kiosk_a.store.add_points(CARD, -10)
+    kiosk_a.sync()
+
+    # The second change of the batch can't be saved (disk full, share gone...)
+    apply_remote = kiosk_b.store.apply_remote
+    calls = []
+
+    def failing_apply(*args):
+        calls.append(args)
+        if len(calls) == 2:
+            raise OSError("no space left on device")
+        return apply_remote(*args)
+    monkeypatch.setattr(kiosk_b.store, "apply_remote", failing_apply)
+    kiosk_b.sync()
+    assert kiosk_b.store.lookup(CARD) == ("Bob", 90.0)
+
+    monkeypatch.undo()
+    kiosk_b.sync()
+    assert kiosk_b.store.lookup(CARD) == ("Bob", 70.0)
+
+    kiosk_a.store.add_points(CARD, -10)
+    kiosk_a.sync()
+    kiosk_b.sync()
+    assert kiosk_b.store.lookup(CARD) == ("Bob", 60.0)
+    assert kiosk_b.seen == {"a": 4}
+
+
+@pytest.mark.parametrize("backend", ["text", "sqlite"])
+def test_a_saved_change_reaches_the_hub_after_a_power_cut(tmp_path, monkeypatch, backend):
+    # The text journal is compacted after each change, the changes not pushed must stay
+    monkeypatch.setattr(storage, "COMPACT_EVERY", 1)
+    hub = tmp_path / "hub"
+    hub.mkdir()
+    kiosk_a = make_kiosk(tmp_path / "a", hub, "a", backend)
+    kiosk_b = make_kiosk(tmp_path / "b", hub, "b", backend)
+
+    # A saves two changes, then the power goes out before any sync
+    kiosk_a.store.add_points(CARD, -10)
+    kiosk_a.store.add_points(CARD, -5)
+    kiosk_a.store.backend.close()
+
+    kiosk_a = make_kiosk(tmp_path / "a", hub, "a", backend)
+    assert kiosk_a.store.lookup(CARD) == ("Bob", 85.0)
+    kiosk_a.sync()
+    kiosk_b.store.add_points(CARD, -1)
+    kiosk_b.sync()
+    kiosk_a.sync()
+
+    assert kiosk_a.store.lookup(CARD) == ("Bob", 84.0)
+    assert kiosk_b.store.lookup(CARD) == ("Bob", 84.0)
+    # The change pulled from B isn't sent back to the hub
+    assert [entry[2:4] for entry in kiosk_a.read_chain("a", 0)] == [(CARD, -10.0), (CARD, -5.0)]
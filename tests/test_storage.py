@@ -0,0 +1,31 @@
+import os
+
+import accounts
+import storage
+
+
+def test_a_card_added_by_hand_survives_the_compaction(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "COMPACT_EVERY", 3)
+    accepted = tmp_path / "accepted_id.txt"
+    accepted.write_text(storage.format_accepted_line("1234", "Bob", 100.0))
+    store = accounts.Account_Store(storage.Text_Backend(str(accepted), str(tmp_path / "journal")))
+    store.add_points("1234", -10)
+
+    # The staff adds a card while the kiosk is running (the mtime moves forward even on a coarse clock)
+    with open(accepted, "a") as file:
+        file.write(storage.format_accepted_line("5678", "Alice", 50.0))
+    stat = os.stat(accepted)
+    os.utime(accepted, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000))
+
+    # The writer thread saves changes before the next lookup, up to the compaction threshold
+    store.save_points("1234", -10)
+    store.save_points("1234", -10)
+    assert "5678" in accepted.read_text()
+
+    assert store.lookup("5678") == ("Alice", 50.0)
+    assert store.lookup("1234") == ("Bob", 70.0)
+    store.add_points("1234", -10)
+    store.add_points("1234", -10)
+    store.add_points("1234", -10)
+    reloaded = storage.Text_Backend(str(accepted), str(tmp_path / "journal")).load()
+    assert reloaded == {"1234": ["Bob", 40.0], "5678": ["Alice", 50.0]}
@@ -1,171 +1,259 @@
-BACKGROUND = """background-color: rgb(40, 44, 52);"""
+import os
+import string
 
-TAB_BUTTON = """
-QPushButton {
-	background-color:  rgb(33, 37, 43);
-	color: rgb(221, 221, 221);
+from PyQt5 import QtGui
+
+
+# The theme used when the app starts, see THEMES
+DEFAULT_THEME = os.environ.get("MIXOMAT_THEME", "dark")
+
+# Each widget only sets his "theme" property (see apply()), the rules below
+# select the widgets with it. The whole sheet is given once to the QApplication
+# so Qt parses it a single time, instead of once per widget.
+STYLESHEET = string.Template("""
+QWidget {
+	background-color: $background;
+}
+
+QPushButton[theme="tab_button"] {
+	background-color: $tab_bar;
+	color: $text;
     border: none;
 }
 
-QPushButton:pressed {
+QPushButton[theme="tab_button"]:pressed {
     border: none;
 }
 
-QPushButton:focus {
-	background-color: rgb(40, 44, 52);
-    color: rgb(113, 126, 149);
+QPushButton[theme="tab_button"]:focus {
+	background-color: $background;
+    color: $text_focus;
     border: none;
-	border-left:3px solid rgb(189, 147, 249);
+	border-left:3px solid $accent;
 }
 
-QPushButton:hover {
-	background-color: rgb(40, 44, 52);
-}"""
+QPushButton[theme="tab_button"]:hover {
+	background-color: $background;
+}
 
-SLIDER = """
-QSlider::groove:vertical {
+QSlider[theme="slider"]::groove:vertical {
     border-radius: 5px;
     width: 15 px;
     margin: 0px;
-	background-color: rgb(52, 59, 72);
+	background-color: $panel;
 }
-QSlider::groove:vertical:hover {
-	background-color: rgb(55, 62, 76);
+QSlider[theme="slider"]::groove:vertical:hover {
+	background-color: $panel_hover;
 }
-QSlider::handle:vertical {
-    background-color: rgb(165, 124, 225);
+QSlider[theme="slider"]::handle:vertical {
+    background-color: $handle;
 	border: none;
     height: 15 px;
     width: 15 px;
     margin: 0px;
 	border-radius: 5px;
 }
-QSlider::handle:vertical:hover {
-    background-color: rgb(195, 155, 255);
+QSlider[theme="slider"]::handle:vertical:hover {
+    background-color: $handle_hover;
 }
-QSlider::handle:vertical:pressed {
-    background-color: rgb(255, 121, 198);
+QSlider[theme="slider"]::handle:vertical:pressed {
+    background-color: $highlight;
 }
-QSlider::add-page:vertical {
-    background: rgb(189, 147, 249);
+QSlider[theme="slider"]::add-page:vertical {
+    background: $accent;
 	border-radius: 5px;
 }
-"""
 
-BUTTON = """
-QPushButton {
-	border: 2px solid rgb(52, 59, 72);
-	border-radius: 5px;	
-	background-color: rgb(52, 59, 72);
+QPushButton[theme="button"] {
+	border: 2px solid $panel;
+	border-radius: 5px;
+	background-color: $panel;
+}
+QPushButton[theme="button"]:hover {
+	background-color: $button_hover;
+	border: 2px solid $border_hover;
 }
-QPushButton:hover {
-	background-color: rgb(57, 65, 80);
-	border: 2px solid rgb(61, 70, 86);
+QPushButton[theme="button"]:pressed {
+	background-color: $button_pressed;
+	border: 2px solid $border_pressed;
 }
-QPushButton:pressed {	
-	background-color: rgb(35, 40, 49);
-	border: 2px solid rgb(43, 50, 61);
-}"""
 
-EXIT_BUTTON = """
-QPushButton {
-	border: 2px solid rgb(52, 59, 72);
-	border-radius: 5px;	
-	background-color: rgb(52, 59, 72);
+QPushButton[theme="exit_button"] {
+	border: 2px solid $panel;
+	border-radius: 5px;
+	background-color: $panel;
 }
-QPushButton:hover {
-	background-color: rgb(220,20,60);
-	border: 2px solid rgb(61, 70, 86);
+QPushButton[theme="exit_button"]:hover {
+	background-color: $danger;
+	border: 2px solid $border_hover;
 }
-QPushButton:pressed {	
-	background-color: rgb(220,20,60);
-	border: 2px solid rgb(43, 50, 61);
+QPushButton[theme="exit_button"]:pressed {
+	background-color: $danger;
+	border: 2px solid $border_pressed;
 }
-"""
 
-DROPDOWN = """
-QComboBox{
-	background-color: rgb(27, 29, 35);
+QComboBox[theme="dropdown"] {
+	background-color: $field;
 	border-radius: 5px;
-	border: 2px solid rgb(33, 37, 43);
+	border: 2px solid $tab_bar;
 	padding: 5px;
 	padding-left: 10px;
 }
-QComboBox:hover{
-	border: 2px solid rgb(64, 71, 88);
+QComboBox[theme="dropdown"]:hover {
+	border: 2px solid $field_hover;
 }
-QComboBox::drop-down {
+QComboBox[theme="dropdown"]::drop-down {
 	subcontrol-origin: padding;
 	subcontrol-position: top right;
-	width: 25px; 
+	width: 25px;
 	border-left-width: 3px;
 	border-left-color: rgba(39, 44, 54, 150);
 	border-left-style: solid;
 	border-top-right-radius: 3px;
-	border-bottom-right-radius: 3px;	
+	border-bottom-right-radius: 3px;
 	background-image: url(./icons/cil-arrow-bottom.png);
 	background-position: center;
 	background-repeat: no-reperat;
  }
-QComboBox QAbstractItemView {
-	color: rgb(255, 121, 198);	
-	background-color: rgb(33, 37, 43);
+QComboBox[theme="dropdown"] QAbstractItemView {
+	color: $highlight;
+	background-color: $tab_bar;
 	padding: 5px;
-	selection-background-color: rgb(39, 44, 54);
-}"""
+	selection-background-color: $selection;
+}
 
-PROGRESSBAR = """
-QProgressBar {
-	background-color: rgb(52, 59, 72);
+QProgressBar[theme="progress_bar"] {
+	background-color: $panel;
     border-radius: 5px;
     text-align: center;
 	height:30px;
 }
 
-QProgressBar::chunk {
-    background-color: rgb(189, 147, 249);
+QProgressBar[theme="progress_bar"]::chunk {
+    background-color: $accent;
 	border-radius:5px;
-}"""
-
-GLASS = """
-border-color: black;
-border-style: solid;
-border-width: 0px 10px 10px 10px;
-border-top-left-radius: 0px;
-border-top-right-radius: 0px;
-border-bottom-right-radius: 20px;
-border-bottom-left-radius: 20px;
-"""
-
-ALCOHOLIC = """
-background: #ba55d3;
-border-top-left-radius: 0px;
-border-top-right-radius: 0px;
-border-bottom-right-radius: 10px;
-border-bottom-left-radius: 10px;
-"""
-
-SOFT = """
-background: #1e90ff;
-"""
-
-SOFT_ONLY = """
-background: #1e90ff;
-border-top-left-radius: 0px;
-border-top-right-radius: 0px;
-border-bottom-right-radius: 10px;
-border-bottom-left-radius: 10px;
-"""
-
-PASSWORD = """
-QLineEdit {
+}
+
+QLineEdit[theme="password"] {
 	width: 25px;
 	height: 30px;
-    border: 2px solid rgb(33, 37, 43);
+    border: 2px solid $tab_bar;
     border-radius: 5px;
-    background: rgb(27, 29, 35);
+    background: $field;
     selection-background-color: red;
-	color: rgb(255, 121, 198);
+	color: $highlight;
 	font-size: 20px;
 }
-"""
+""")
+
+# The colors of each theme
+THEMES = {
+    "dark": {
+        "background": "rgb(40, 44, 52)",
+        "tab_bar": "rgb(33, 37, 43)",
+        "text": "rgb(221, 221, 221)",
+        "text_focus": "rgb(113, 126, 149)",
+        "accent": "rgb(189, 147, 249)",
+        "handle": "rgb(165, 124, 225)",
+        "handle_hover": "rgb(195, 155, 255)",
+        "highlight": "rgb(255, 121, 198)",
+        "panel": "rgb(52, 59, 72)",
+        "panel_hover": "rgb(55, 62, 76)",
+        "button_hover": "rgb(57, 65, 80)",
+        "button_pressed": "rgb(35, 40, 49)",
+        "border_hover": "rgb(61, 70, 86)",
+        "border_pressed": "rgb(43, 50, 61)",
+        "danger": "rgb(220,20,60)",
+        "field": "rgb(27, 29, 35)",
+        "field_hover": "rgb(64, 71, 88)",
+        "selection": "rgb(39, 44, 54)",
+        "glass": "black",
+        "alcoholic": "#ba55d3",
+        "soft": "#1e90ff",
+    },
+    # Darker and less bright, for the evening at the bar
+    "night": {
+        "background": "rgb(18, 19, 23)",
+        "tab_bar": "rgb(12, 13, 16)",
+        "text": "rgb(160, 160, 160)",
+        "text_focus": "rgb(90, 100, 120)",
+        "accent": "rgb(120, 90, 165)",
+        "handle": "rgb(105, 80, 145)",
+        "handle_hover": "rgb(130, 100, 175)",
+        "highlight": "rgb(175, 85, 135)",
+        "panel": "rgb(32, 35, 43)",
+        "panel_hover": "rgb(36, 39, 48)",
+        "button_hover": "rgb(38, 42, 52)",
+        "button_pressed": "rgb(22, 24, 30)",
+        "border_hover": "rgb(44, 49, 60)",
+        "border_pressed": "rgb(28, 31, 38)",
+        "danger": "rgb(150,20,45)",
+        "field": "rgb(14, 15, 19)",
+        "field_hover": "rgb(44, 49, 60)",
+        "selection": "rgb(26, 28, 35)",
+        "glass": "rgb(70, 70, 70)",
+        "alcoholic": "#7d3a8e",
+        "soft": "#1563b0",
+    },
+}
+
+# name -> the built stylesheet, each theme is only built once
+_built = {}
+# The theme given to the application
+_current = DEFAULT_THEME
+
+
+def build(name: str) -> str:
+    """Get the whole stylesheet of a theme.
+
+    Args:
+        name (str): The name of the theme, a key of THEMES.
+
+    Returns:
+        str: The stylesheet.
+    """
+    if name not in _built:
+        _built[name] = STYLESHEET.substitute(THEMES[name])
+    return _built[name]
+
+
+def install(app, name: str = DEFAULT_THEME):
+    """Give the stylesheet of a theme to the whole application.
+
+    Args:
+        app (QtWidgets.QApplication): The application.
+        name (str, optional): The name of the theme. Defaults to DEFAULT_THEME.
+    """
+    global _current
+    app.setStyleSheet(build(name))
+    _current = name
+
+
+def color(key: str) -> QtGui.QColor:
+    """Get a color of the current theme, for the widgets that paint themselves.
+
+    Args:
+        key (str): The name of the color, like "glass" or "alcoholic".
+
+    Returns:
+        QtGui.QColor: The color.
+    """
+    value = THEMES[_current][key]
+    # QColor doesn't read the css notation
+    if value.startswith("rgb("):
+        return QtGui.QColor(*(int(part) for part in value[4:-1].split(",")))
+    return QtGui.QColor(value)
+
+
+def apply(widget, style: str):
+    """Tell which rules of the application stylesheet a widget uses.
+
+    Args:
+        widget (QtWidgets.QWidget): The widget.
+        style (str): The style of the widget, like "button" or "slider".
+    """
+    widget.setProperty("theme", style)
+    # Qt only reads the property again when the widget is polished
+    if widget.isVisible():
+        widget.style().unpolish(widget)
+        widget.style().polish(widget)
@@ -1,66 +1,194 @@
 from PyQt5 import QtCore
 
+import collections
+import threading
 import time
 
-from mfrc522 import SimpleMFRC522
-from gpiozero import LED
+import dispenser
+import hal
+import metrics
 
 
-class Loading_thread(QtCore.QThread):
-    """Define a Thread that is capable of reading the RFID card.
+# Time between two reads of the RFID reader
+POLL_INTERVAL = 0.05
+# The same card is only sent again once it was away from the reader for that long
+DEBOUNCE_SECONDS = 2.0
+# Time to wait before reading again after an error of the reader
+ERROR_BACKOFF = 1.0
+
+
+class Reader_Service(QtCore.QThread):
+    """A thread that reads the RFID reader for the whole life of the app.
+
+    The reader is polled every poll_interval seconds. A card is only sent once
+    while it stays on the reader (or comes back in less than debounce seconds),
+    and nothing is sent while the service is paused.
+
+    Args:
+        reader (optional): Anything with a read_id_no_block() method. Defaults to hal.make_reader().
+        poll_interval (float, optional): Seconds between two reads. Defaults to POLL_INTERVAL.
+        debounce (float, optional): Seconds a card must be away before being sent again. Defaults to DEBOUNCE_SECONDS.
     """
     id_signal = QtCore.pyqtSignal(str)
 
-    def __init__(self):
-        super(Loading_thread, self).__init__()
+    def __init__(
+        self,
+        reader=None,
+        poll_interval: float = POLL_INTERVAL,
+        debounce: float = DEBOUNCE_SECONDS,
+    ):
+        super(Reader_Service, self).__init__()
+        self.reader = reader
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+        self.active = False
+        self.running = True
+        self.last_id = None
+        self.last_seen = 0.0
+
+    def set_active(self, active: bool):
+        """Start or pause sending the cards.
+
+        Args:
+            active (bool): False while somebody is logged in.
+        """
+        self.active = active
+
+    def check_card(self, id, now: float) -> bool:
+        """Remember the card on the reader and tell if it needs to be sent.
+
+        Args:
+            id: The id read, None if there's no card.
+            now (float): The current time of the monotonic clock.
+
+        Returns:
+            bool: True if the card is new on the reader.
+        """
+        if id is None:
+            return False
+
+        is_new = id != self.last_id or now - self.last_seen > self.debounce
+        # The card is remembered even while paused, so a card left on the
+        # reader doesn't log in again right after a logout.
+        self.last_id = id
+        self.last_seen = now
+        return is_new and self.active
 
     def run(self):
-        reader = SimpleMFRC522()
-        try:
-            while True:
-                print("Hold a tag near the reader ...")
-                id, _ = reader.read()
-                # We sleep a bit just to be sure
-                time.sleep(2)
+        if self.reader is None:
+            self.reader = hal.make_reader()
+
+        read_time = metrics.get_metrics().histogram("rfid_read_seconds", "Duration of a read that found a card")
+        cards = metrics.get_metrics().counter("rfid_cards_total", "Cards sent to the UI")
+        errors = metrics.get_metrics().counter("rfid_errors_total", "Errors of the RFID reader")
+
+        print("Hold a tag near the reader ...")
+        while self.running:
+            try:
+                start = time.perf_counter()
+                id = self.reader.read_id_no_block()
+            except Exception as e:
+                # There was an error, we send it and try again a bit later
+                errors.inc()
+                self.id_signal.emit("Error: {}".format(e))
+                time.sleep(ERROR_BACKOFF)
+                continue
+
+            # The empty polls aren't counted, an idle kiosk has nothing new to export
+            if id is not None:
+                read_time.observe(time.perf_counter() - start)
+
+            if self.check_card(id, time.monotonic()):
+                cards.inc()
                 self.id_signal.emit(str(id))
-                return
-
-        except Exception as e:
-            # There was an error, we clean the GPIO and send an error
-            GPIO.cleanup()
-            self.id_signal.emit("Error: {}".format(e))
 
+            time.sleep(self.poll_interval)
 
-class Progress_Thread(QtCore.QThread):
-    """A thread that implement the process of serving the drink.
+    def stop(self):
+        """Stop reading and wait for the thread.
+        """
+        self.running = False
+        self.wait()
 
-    Args:
-        time (int): The time taken by the drink to be served
-        leds (list[LED]): A list of leds that need to light up.
-    """
-    progress_signal = QtCore.pyqtSignal(int)
 
-    def __init__(self, time: int, leds: list):
-        super(Progress_Thread, self).__init__()
-        self.time = time
-        self.leds = leds
-
-    def run(self):
-        # We light up all the given led
-        for led in self.leds:
-            led.on()
+class Dispense_Worker(QtCore.QThread):
+    """A thread that serves the drinks for the whole life of the app, one job after the other.
 
-        # We divide the number of second by 100
-        # so we know how much time there's between each percent advancment.
-        timing = self.time / 100
+    Each job is a dict matching each led with the seconds it needs to stay on,
+    all the pumps start together and each one stops at his own deadline.
+    """
+    # The dispenser.Dispense_Job, the UI reads his progress from it
+    job_started_signal = QtCore.pyqtSignal(object)
+    # True if the job was cancelled
+    job_finished_signal = QtCore.pyqtSignal(bool)
 
-        # At the end, we wait for the "quantity" amout of time
-        for i in range(101):
-            time.sleep(timing)
+    def __init__(self):
+        super(Dispense_Worker, self).__init__()
+        self.condition = threading.Condition()
+        self.jobs = collections.deque()
+        self.job = None
+        # Set to wake up the current job, so a cancel doesn't wait for the next deadline
+        self.wake = threading.Event()
+        self.running = True
+
+    def submit(self, durations: dict):
+        """Add a job to the queue.
+
+        Args:
+            durations (dict): A dict matching each led with the seconds it needs to stay on.
+        """
+        with self.condition:
+            self.jobs.append(durations)
+            self.condition.notify()
+
+    def cancel(self):
+        """Stop the current job, his pumps are switched off right away.
+
+        A job that wasn't picked up yet is dropped, and reported as cancelled.
+        """
+        with self.condition:
+            if self.job is not None:
+                self.job.cancel()
+                self.wake.set()
+                return
+            dropped = len(self.jobs)
+            self.jobs.clear()
 
-            # setting value to progress bar
-            self.progress_signal.emit(i)
+        for _ in range(dropped):
+            self.job_finished_signal.emit(True)
 
-        # We can know turn of all the given led
-        for led in self.leds:
-            led.off()
+    def run(self):
+        dispense_time = metrics.get_metrics().histogram("dispense_seconds", "Duration of a dispense job")
+        cancelled = metrics.get_metrics().counter("dispense_cancelled_total", "Cancelled dispense jobs")
+
+        while True:
+            with self.condition:
+                while not self.jobs and self.running:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                self.job = dispenser.Dispense_Job(self.jobs.popleft())
+                self.wake.clear()
+                job = self.job
+
+            self.job_started_signal.emit(job)
+            with dispense_time.time():
+                job.run(sleep=self.wake.wait)
+            if job.cancelled:
+                cancelled.inc()
+
+            with self.condition:
+                self.job = None
+            self.job_finished_signal.emit(job.cancelled)
+
+    def stop(self):
+        """Cancel the current job, drop the others and wait for the thread.
+        """
+        with self.condition:
+            self.running = False
+            self.jobs.clear()
+            if self.job is not None:
+                self.job.cancel()
+                self.wake.set()
+            self.condition.notify()
+        self.wait()
@@ -1,4 +1,7 @@
+import functools
+
 from PyQt5 import QtWidgets, QtGui, QtCore
+import mixer
 import theme
 
 
@@ -12,14 +15,14 @@ class Button(QtWidgets.QPushButton):
     def __init__(self, text: str) -> None:
         super().__init__()
         self.setText(text)
-        self.setStyleSheet(theme.BUTTON)
+        theme.apply(self, "button")
         self.setFixedHeight(30)
       
         
 class Exit_Button(Button):
     def __init__(self, text: str) -> None:
         super().__init__(text)
-        self.setStyleSheet(theme.EXIT_BUTTON)
+        theme.apply(self, "exit_button")
         self.setFixedHeight(70)
 
 
@@ -33,23 +36,51 @@ class Slider(QtWidgets.QSlider):
 
     def __init__(self, minimum: int = 0, maximum: int = 25) -> None:
         super().__init__()
-        self.setStyleSheet(theme.SLIDER)
+        theme.apply(self, "slider")
         self.setMinimum(minimum)
         self.setMaximum(maximum)
 
 
-class Double_Slider(QtWidgets.QWidget):
-    """A class that implement a slider duo with his own logic.
+class Mixer_Widget(QtWidgets.QWidget):
+    """A slider (and his dropdown) for each ingredient of a custom drink, sharing one glass.
+
+    The sliders can move a lot of times in a single frame, so the
+    changed_signal is only emitted once per frame.
 
     Args:
-        parent (Tab): A Tab object.
+        ingredients (list[str]): The ingredients that can be chosen.
+        defaults (list[str]): The chosen ingredient of each slider at the start.
+        minimum (int, optional): The minimum number of ingredients. Defaults to 2.
+        maximum (int, optional): The maximum number of ingredients. Defaults to 6.
+        budget (int, optional): The volume (in cl) of the glass. Defaults to 25.
+        unit_prices (dict, optional): The price of 1 cl of each ingredient. Defaults to None (free).
     """
+    changed_signal = QtCore.pyqtSignal()
+    added_signal = QtCore.pyqtSignal()
+    # About 60 updates per second at most
+    FRAME_MS = 16
 
-    def __init__(self, parent) -> None:
+    def __init__(self, ingredients: list[str], defaults: list[str], minimum: int = 2,
+                 maximum: int = 6, budget: int = 25, unit_prices: dict = None) -> None:
         super().__init__()
-        self.par = parent
-        self.values = {"sl1": 0, "sl2": 0}
+        self.choices = ingredients
+        self.defaults = defaults
+        self.unit_prices = unit_prices or {}
+        self.minimum = minimum
+        self.maximum = maximum
+        self.mixer = mixer.Mixer(budget, 0)
+        self.dropdowns = []
+        self.sliders = []
+        self.columns = []
+
+        self.timer = QtCore.QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(self.FRAME_MS)
+        self.timer.timeout.connect(self.changed_signal.emit)
+
         self.init_ui()
+        for ingredient in defaults:
+            self.add_ingredient(ingredient)
 
     def init_ui(self):
         """Initialize the UI
@@ -59,59 +90,155 @@ class Double_Slider(QtWidgets.QWidget):
             QtWidgets.QSizePolicy.Policy.Expanding,
         )
 
-        layout = QtWidgets.QHBoxLayout()
+        layout = QtWidgets.QVBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
 
-        self.slider1 = Slider()
-        self.slider1.setObjectName("sl1")
-        self.slider1.valueChanged.connect(self.check_value)
+        self.columns_layout = QtWidgets.QHBoxLayout()
 
-        self.slider2 = Slider()
-        self.slider2.setObjectName("sl2")
-        self.slider2.valueChanged.connect(self.check_value)
+        buttons = QtWidgets.QHBoxLayout()
+        self.add_button = Button("+")
+        self.add_button.clicked.connect(lambda: self.add_ingredient())
+        self.remove_button = Button("-")
+        self.remove_button.clicked.connect(self.remove_ingredient)
+        buttons.addWidget(self.remove_button)
+        buttons.addWidget(self.add_button)
 
-        layout.addWidget(self.slider1)
-        layout.addWidget(self.slider2)
+        layout.addLayout(self.columns_layout)
+        layout.addLayout(buttons)
         self.setLayout(layout)
 
-    def get_other_value(self, current: str) -> int:
-        """Get the value of the other slider based on the name of the current.
+    def add_ingredient(self, ingredient: str = None):
+        """Add a slider for one more ingredient.
 
         Args:
-            current (str): The name of the current slider.
+            ingredient (str, optional): The chosen ingredient. Defaults to None (the first one not chosen yet).
+        """
+        if len(self.mixer) >= self.maximum:
+            return
+        if ingredient is None:
+            chosen = self.ingredients()
+            ingredient = next(
+                (choice for choice in self.choices if choice not in chosen), self.choices[0])
+
+        index = self.mixer.add(self.unit_prices.get(ingredient, 0))
+
+        column = QtWidgets.QWidget()
+        column_layout = QtWidgets.QVBoxLayout()
+        column_layout.setContentsMargins(0, 0, 0, 0)
+
+        dropdown = Dropdown()
+        dropdown.addItems(self.choices)
+        dropdown.setCurrentText(ingredient)
+        dropdown.currentTextChanged.connect(
+            functools.partial(self.change_ingredient, index))
+
+        slider = Slider(maximum=self.mixer.budget)
+        slider.valueChanged.connect(functools.partial(self.check_value, index))
+
+        column_layout.addWidget(dropdown)
+        column_layout.addWidget(slider, 0, QtCore.Qt.AlignmentFlag.AlignHCenter)
+        column.setLayout(column_layout)
+        self.columns_layout.addWidget(column)
+
+        self.dropdowns.append(dropdown)
+        self.sliders.append(slider)
+        self.columns.append(column)
+        self.update_buttons()
+        self.schedule_update()
+        self.added_signal.emit()
+
+    def remove_ingredient(self):
+        """Remove the last slider, his volume goes back to the glass.
+        """
+        if len(self.mixer) <= self.minimum:
+            return
+        self.mixer.remove()
+        self.dropdowns.pop()
+        self.sliders.pop()
+        column = self.columns.pop()
+        column.setParent(None)
+        column.deleteLater()
+        self.update_buttons()
+        self.schedule_update()
+
+    def reset(self):
+        """Go back to the default ingredients, with empty sliders.
+        """
+        while len(self.mixer) > max(len(self.defaults), self.minimum):
+            self.remove_ingredient()
+        for slider in self.sliders:
+            slider.setValue(0)
+        for dropdown, ingredient in zip(self.dropdowns, self.defaults):
+            dropdown.setCurrentText(ingredient)
+        self.schedule_update()
+
+    def update_buttons(self):
+        """Disable the buttons when the number of ingredients is at a limit.
+        """
+        self.add_button.setEnabled(len(self.mixer) < self.maximum)
+        self.remove_button.setEnabled(len(self.mixer) > self.minimum)
 
-        Returns:
-            int: The value of the other slider.
+    def check_value(self, index: int, value: int):
+        """Keep the total of the sliders in the glass.
+
+        Args:
+            index (int): The index of the slider that moved.
+            value (int): His new value.
+        """
+        allowed = self.mixer.set(index, value)
+        if allowed != value:
+            # This calls check_value again, with a value that fits
+            self.sliders[index].setValue(allowed)
+            return
+        self.schedule_update()
+
+    def change_ingredient(self, index: int, ingredient: str):
+        """Update the price when another ingredient is chosen.
+
+        Args:
+            index (int): The index of the dropdown.
+            ingredient (str): The chosen ingredient.
         """
-        possibilities = list(self.values.keys())
-        # This line is a bit useless but we want to be sure
-        possibilities.remove(current)
+        self.mixer.set_unit_price(index, self.unit_prices.get(ingredient, 0))
+        self.schedule_update()
 
-        other = possibilities[0]
+    def schedule_update(self):
+        """Emit the changed_signal at the next frame, whatever the number of changes until then.
+        """
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def ingredients(self) -> list[str]:
+        """Get the chosen ingredient of each slider.
+
+        Returns:
+            list[str]: The ingredients, in the order of the sliders.
+        """
+        return [dropdown.currentText() for dropdown in self.dropdowns]
 
-        return self.values[other]
+    def layers(self) -> list[tuple[str, int]]:
+        """Get the ingredients with their volume, in the order of the sliders.
 
-    def check_value(self):
-        """Check the value of both sliders and see if they don't conflict.
+        Returns:
+            list[tuple[str, int]]: The ingredient and his volume (in cl) of each slider.
         """
-        slider = self.sender()
-        slider_name = slider.objectName()
+        return list(zip(self.ingredients(), self.mixer.volumes))
+
+    def cost(self) -> float:
+        """Get the price of the drink, before any discount.
 
-        # Get the value of both slider
-        slider_value = slider.value()
-        other_slider_value = self.get_other_value(slider_name)
+        Returns:
+            float: The points.
+        """
+        return self.mixer.cost
 
-        maximum_quantity = slider.maximum()
+    def volumes(self) -> dict:
+        """Get the volumes to pour.
 
-        # If the "total" quantity is <= to the maximum quantity, the current slider can change is value up.
-        if (slider_value + other_slider_value) <= maximum_quantity:
-            self.values[slider_name] = slider_value
-        else:
-            # That's not the case, we calculate the maximum achievable value for the current slider based
-            # on the maximum quantity and the other slider value
-            slider_max = maximum_quantity - other_slider_value
-            slider.setValue(slider_max)
-        # Update the little glass on the screen
-        self.par.change_glass()
+        Returns:
+            dict: A dict matching each ingredient with his volume (in cl).
+        """
+        return self.mixer.volume_vector(self.ingredients())
 
 
 class Dropdown(QtWidgets.QComboBox):
@@ -120,7 +247,16 @@ class Dropdown(QtWidgets.QComboBox):
 
     def __init__(self) -> None:
         super().__init__()
-        self.setStyleSheet(theme.DROPDOWN)
+        theme.apply(self, "dropdown")
+
+    def set_item_enabled(self, index: int, enabled: bool):
+        """Enable or grey out an item of the dropdown.
+
+        Args:
+            index (int): The index of the item.
+            enabled (bool): False to grey out the item.
+        """
+        self.model().item(index).setEnabled(enabled)
 
 
 class ProgressBar(QtWidgets.QProgressBar):
@@ -129,7 +265,7 @@ class ProgressBar(QtWidgets.QProgressBar):
 
     def __init__(self) -> None:
         super().__init__()
-        self.setStyleSheet(theme.PROGRESSBAR)
+        theme.apply(self, "progress_bar")
 
 
 class Centered_label(QtWidgets.QLabel):
@@ -149,70 +285,127 @@ class Centered_label(QtWidgets.QLabel):
             self.setFont(font)
 
 
-class Drink_Glass(QtWidgets.QLabel):
+class Drink_Glass(QtWidgets.QWidget):
     """A class that implement the little drinking glass for the Tab2.
+
+    The glass is painted by the widget itself: the empty glass is drawn once in
+    a pixmap, and a change of the quantities only repaints the inside of the
+    glass, with one layer for each ingredient.
+
+    Args:
+        capacity (int, optional): The quantity (in cl) of a full glass. Defaults to 25.
     """
+    # The width of the glass border, in pixels
+    BORDER = 10
+    RADIUS = 20
 
-    def __init__(self) -> None:
+    def __init__(self, capacity: int = 25) -> None:
         super().__init__()
+        self.capacity = capacity
+        # [(text, quantity, QtGui.QColor), ...] from the bottom to the top
+        self.layers = []
+        # The empty glass, drawn again only when the size changes
+        self.background = None
         self.init_ui()
 
     def init_ui(self):
         """Initialize the UI
         """
-        self.lay = QtWidgets.QGridLayout()
-        self.lay.setContentsMargins(0, 0, 0, 0)
-        self.lay.setSpacing(0)
-
-        glass = Centered_label()
-        glass.setStyleSheet(theme.GLASS)
-
-        self.soft = Centered_label()
-        self.soft.setStyleSheet(theme.SOFT)
-
-        self.alcoholic = Centered_label()
-        self.alcoholic.setStyleSheet(theme.ALCOHOLIC)
-
-        self.lay.addWidget(glass, 0, 0, 110, 100)
-        self.lay.addWidget(self.soft)
-        self.lay.addWidget(self.alcoholic)
-
-        self.setLayout(self.lay)
+        self.setSizePolicy(
+            QtWidgets.QSizePolicy.Policy.Expanding,
+            QtWidgets.QSizePolicy.Policy.Expanding,
+        )
+        self.setMinimumSize(50, 55)
+        # We paint every pixel, so Qt doesn't need to paint the parent below
+        self.setAttribute(QtCore.Qt.WidgetAttribute.WA_OpaquePaintEvent)
 
-    def change_layout_from_value(self, values_dict: dict):
-        """Change the appearance of the drinking glass based on the quantity.
+    def set_layers(self, layers: list):
+        """Change the content of the glass.
 
         Args:
-            values_dict (dict): A dict containing info about the quantity.
+            layers (list): A list of (text, quantity, color) tuples, from the bottom to the top.
         """
-        sl1 = values_dict["sl1"]
-        sl2 = values_dict["sl2"]
-
-        self.soft.setParent(None)
-        self.alcoholic.setParent(None)
+        layers = [layer for layer in layers if layer[1] > 0]
+        if layers == self.layers:
+            return
+        self.layers = layers
+        self.update(self.inside().toAlignedRect())
 
-        alcohol_quantity = sl1 * 4
-        soft_quantity = sl2 * 4
+    def inside(self) -> QtCore.QRectF:
+        """Get the part of the widget where the drink is.
 
-        alcohol_start = 100 - alcohol_quantity + 7
-        soft_start = 100 - soft_quantity - alcohol_quantity + 7
+        Returns:
+            QtCore.QRectF: The inside of the glass.
+        """
+        # A full drink still leaves the top of the glass empty
+        return QtCore.QRectF(self.rect()).adjusted(
+            self.BORDER, self.height() / 11, -self.BORDER, -self.BORDER)
 
-        self.soft = Centered_label("{} cl".format(sl2))
-        # adapt the theme, so we don't see a border radius when it's on top of the alcoholic drink
-        if alcohol_quantity > 0:
-            self.soft.setStyleSheet(theme.SOFT)
-        else:
-            self.soft.setStyleSheet(theme.SOFT_ONLY)
+    def glass_path(self, rect: QtCore.QRectF, radius: float) -> QtGui.QPainterPath:
+        """Get the shape of a glass: open at the top with rounded bottom corners.
 
-        self.alcoholic = Centered_label("{} cl".format(sl1))
-        self.alcoholic.setStyleSheet(theme.ALCOHOLIC)
+        Args:
+            rect (QtCore.QRectF): The rect of the glass.
+            radius (float): The radius of the bottom corners.
 
-        # The 5 and 90 value are hardcoded to make the display nice.
-        if alcohol_quantity > 0:
-            self.lay.addWidget(self.alcoholic, alcohol_start,
-                               5, alcohol_quantity, 90)
-        if soft_quantity > 0:
-            self.lay.addWidget(self.soft, soft_start, 5, soft_quantity, 90)
+        Returns:
+            QtGui.QPainterPath: The shape.
+        """
+        path = QtGui.QPainterPath()
+        path.moveTo(rect.left(), rect.top())
+        path.lineTo(rect.left(), rect.bottom() - radius)
+        path.quadTo(rect.left(), rect.bottom(), rect.left() + radius, rect.bottom())
+        path.lineTo(rect.right() - radius, rect.bottom())
+        path.quadTo(rect.right(), rect.bottom(), rect.right(), rect.bottom() - radius)
+        path.lineTo(rect.right(), rect.top())
+        return path
+
+    def draw_background(self):
+        """Draw the empty glass in the pixmap.
+        """
+        self.background = QtGui.QPixmap(self.size())
+        self.background.fill(theme.color("background"))
+
+        painter = QtGui.QPainter(self.background)
+        painter.setRenderHint(QtGui.QPainter.RenderHint.Antialiasing)
+        pen = QtGui.QPen(theme.color("glass"), self.BORDER)
+        pen.setCapStyle(QtCore.Qt.PenCapStyle.FlatCap)
+        painter.setPen(pen)
+        half = self.BORDER / 2
+        rect = QtCore.QRectF(self.rect()).adjusted(half, 0, -half, -half)
+        painter.drawPath(self.glass_path(rect, self.RADIUS))
+        painter.end()
+
+    def resizeEvent(self, event: QtGui.QResizeEvent):
+        self.background = None
+        super().resizeEvent(event)
+
+    def paintEvent(self, event: QtGui.QPaintEvent):
+        if self.background is None:
+            self.draw_background()
+
+        painter = QtGui.QPainter(self)
+        painter.drawPixmap(event.rect(), self.background, event.rect())
+
+        inside = self.inside()
+        if not self.layers or inside.height() <= 0:
+            return
+
+        painter.setRenderHint(QtGui.QPainter.RenderHint.Antialiasing)
+        # The bottom layer takes the rounded corners of the glass
+        shape = self.glass_path(inside, self.RADIUS / 2)
+        shape.closeSubpath()
+        painter.setClipPath(shape)
+
+        bottom = inside.bottom()
+        for text, quantity, color in self.layers:
+            height = inside.height() * quantity / self.capacity
+            layer = QtCore.QRectF(inside.left(), bottom - height, inside.width(), height)
+            painter.fillRect(layer, color)
+            if height >= painter.fontMetrics().height():
+                painter.setPen(self.palette().color(QtGui.QPalette.ColorRole.WindowText))
+                painter.drawText(layer, QtCore.Qt.AlignmentFlag.AlignCenter, text)
+            bottom -= height
 
 
 class Pump(QtWidgets.QWidget):
@@ -294,12 +487,15 @@ class Multiple_Pump(QtWidgets.QWidget):
     Args:
         parent (Tab): A Tab object.
         pin_for_pump (dict[Pump]): A dict containing the number match with their Pump object.
+        pump_map (pump_map.Pump_Map): The ingredient on each pump, shared with the tabs.
     """
 
-    def __init__(self, parent, pin_for_pump: dict[Pump]) -> None:
+    def __init__(self, parent, pin_for_pump: dict[Pump], pump_map) -> None:
         super().__init__(parent=parent)
 
         self.pin_for_pump = pin_for_pump
+        self.pin_for_widget = {pump: pin for pin, pump in pin_for_pump.items()}
+        self.pump_map = pump_map
         self.init_ui()
 
     def init_ui(self):
@@ -307,25 +503,10 @@ class Multiple_Pump(QtWidgets.QWidget):
         """
         self.lay = QtWidgets.QGridLayout()
 
-        pump1 = self.pin_for_pump["17"]
-        pump1.setParent(self)
-        pump2 = self.pin_for_pump["18"]
-        pump2.setParent(self)
-        pump3 = self.pin_for_pump["19"]
-        pump3.setParent(self)
-        pump4 = self.pin_for_pump["20"]
-        pump4.setParent(self)
-        pump5 = self.pin_for_pump["21"]
-        pump5.setParent(self)
-        pump6 = self.pin_for_pump["22"]
-        pump6.setParent(self)
-
-        self.lay.addWidget(pump1, 0, 0)
-        self.lay.addWidget(pump2, 0, 1)
-        self.lay.addWidget(pump3, 1, 0)
-        self.lay.addWidget(pump4, 1, 1)
-        self.lay.addWidget(pump5, 2, 0)
-        self.lay.addWidget(pump6, 2, 1)
+        # The pumps are shown on 2 columns, in the order of the config
+        for index, pump in enumerate(self.pin_for_pump.values()):
+            pump.setParent(self)
+            self.lay.addWidget(pump, index // 2, index % 2)
 
         self.setLayout(self.lay)
 
@@ -339,21 +520,83 @@ class Multiple_Pump(QtWidgets.QWidget):
             current_selected_item (str): The currently selected item of the Pump.
             wanted_selected_item (str): The item we want this Pump to select.
         """
-
-        new_pump = None
-        for pump in self.pin_for_pump.values():
-            if pump.current_selected_item == wanted_selected_item:
-                new_pump = pump
-                break
+        # The map tells us directly which pump had the wanted item
+        other_pin = self.pump_map.swap(
+            self.pin_for_widget[sender_pump], wanted_selected_item)
 
         # The sender pump can now change to the item she wanted
         sender_pump.change_selected_item(wanted_selected_item)
         # The other pump will have the previously selected item from the sender pump
-        new_pump.change_selected_item(current_selected_item)
+        if other_pin is not None:
+            self.pin_for_pump[other_pin].change_selected_item(current_selected_item)
 
         self.parent().par.save_config()
 
 
+class Inventory_Panel(QtWidgets.QWidget):
+    """A widget showing the level of each pump, with a button to refill it.
+
+    Args:
+        parent (Tab): A Tab object.
+        inventory (inventory.Inventory): The levels of the pumps.
+        pump_map (pump_map.Pump_Map): The ingredient on each pump, shared with the tabs.
+    """
+
+    def __init__(self, parent, inventory, pump_map) -> None:
+        super().__init__(parent=parent)
+        self.inventory = inventory
+        self.pump_map = pump_map
+        # pin -> (name label, level bar, time label)
+        self.rows = {}
+        self.init_ui()
+
+    def init_ui(self):
+        """Initialize the UI
+        """
+        lay = QtWidgets.QGridLayout()
+
+        for row, pin in enumerate(self.pump_map.pins()):
+            name = QtWidgets.QLabel()
+            level = ProgressBar()
+            time_left = Centered_label()
+            refill = Button("Voll")
+            refill.clicked.connect(functools.partial(self.refill, pin))
+
+            lay.addWidget(name, row, 0)
+            lay.addWidget(level, row, 1)
+            lay.addWidget(time_left, row, 2)
+            lay.addWidget(refill, row, 3)
+            self.rows[pin] = (name, level, time_left)
+
+        self.setLayout(lay)
+        self.refresh()
+
+    def refresh(self):
+        """Show the current levels.
+        """
+        for pin, (name, level, time_left) in self.rows.items():
+            pump = self.inventory.get_pump(pin)
+            name.setText(self.pump_map.ingredient_for(pin))
+            level.setMaximum(int(pump["capacity_ml"]))
+            level.setValue(int(pump["level_ml"]))
+            if self.inventory.is_low(pin):
+                level.setFormat("Leer")
+            else:
+                level.setFormat("%v ml")
+
+            hours = self.inventory.time_to_empty(pin)
+            time_left.setText("-" if hours is None else "{:.1f} h".format(hours))
+
+    def refill(self, pin: str):
+        """Put a full bottle behind a pump.
+
+        Args:
+            pin (str): The pin number of the pump.
+        """
+        self.inventory.refill(pin)
+        self.parent().par.refresh_stock()
+
+
 class Password(QtWidgets.QWidget):
     """A widget that implements a password field
     """
@@ -374,7 +617,7 @@ class Password(QtWidgets.QWidget):
 
         self.input_field = QtWidgets.QLineEdit()
         self.input_field.setEchoMode(QtWidgets.QLineEdit.EchoMode.Password)
-        self.input_field.setStyleSheet(theme.PASSWORD)
+        theme.apply(self.input_field, "password")
 
         lay.addWidget(title)
         lay.addWidget(self.input_field)
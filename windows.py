@@ -1,50 +1,128 @@
-from PyQt5 import QtWidgets, QtGui
-from gpiozero import LED
+import boot
+from PyQt5 import QtWidgets, QtGui, QtCore
+import threading
+
+import account_server
+import accounts
+import hal
 import loading
-import tabs
+import metrics
+import persistence
+import pump_map
+import replication
 import theme
 import thread
+import workers
 
 
-def check_accepted_id(id: str) -> tuple[bool, str]:
+@metrics.timed("account_lookup_seconds", "Duration of the lookup of a card")
+def check_accepted_id(id: str) -> tuple[bool, str, float]:
     """Check if the given id is in the DB.
 
     Args:
         id (str): A string representation of the id.
 
     Returns:
-        tuple[bool, str]: A boolean representation of the succes and the name related to the id.
+        tuple[bool, str, float]: A boolean representation of the succes, the name and the points related to the id.
     """
-    with open("accepted_id.txt", "r") as file:
-        lines = file.readlines()
+    account = accounts.get_store().lookup(id)
+    if account is None:
+        return False, "", 0.0
 
-    valid_lines = []
-    # Clean up the DB in case there're blank lines in it
-    for line in lines:
-        line = line.replace("\n", "")
-        if "," in line:
-            line = line.split(",")
-            valid_lines.append(line)
+    name, points = account
+    return True, name, points
 
-    for line in valid_lines:
-        if id in line:
-            return True, line[1].strip(), float(line[2].strip())
 
-    return False, ""
+class Window(QtWidgets.QMainWindow):
+    """The main window, it only shows the loading screen at first.
 
+    Everything else (the threads, the accounts, the GPIOs and the tabs) is
+    set up by finish_boot() once the event loop runs, so the splash screen
+    stays on the screen in the meantime.
 
-class Window(QtWidgets.QMainWindow):
-    def __init__(self):
+    Args:
+        splash (QtWidgets.QSplashScreen, optional): The splash screen, closed once the app is ready. Defaults to None.
+    """
+
+    def __init__(self, splash: QtWidgets.QSplashScreen = None):
         super().__init__()
+        self.splash = splash
+        self.timer = boot.get_timer()
+        self.booted = False
+        self.leds = None
+
         self.init_ui()
+        self.timer.mark("window")
+
+        QtCore.QTimer.singleShot(0, self.finish_boot)
+
+    def finish_boot(self):
+        """Set up everything the loading screen doesn't need, then wait for the first card.
+        """
+        if self.booted:
+            return
+        self.booted = True
+
+        # The GPIOs are set up in the background while we load the rest
+        gpio = threading.Thread(target=self.setup_pumps)
+        gpio.start()
+
+        # All the writes are done by the persistence thread, we just show his errors
+        self.writer = persistence.get_writer()
+        self.writer.error_signal.connect(self.show_storage_error)
+        store = accounts.get_store()
+        store.writer = self.writer
+        self.timer.mark("accounts")
+        # The points changes are shared with the other kiosks from time to time
+        if store.replicator is not None:
+            self.sync_timer = QtCore.QTimer(self)
+            self.sync_timer.timeout.connect(
+                lambda: self.writer.submit(store.replicator.sync, key="replication"))
+            self.sync_timer.start(replication.SYNC_SECONDS * 1000)
+        # The changes the account server didn't confirm are sent again until he does
+        if isinstance(store, account_server.Remote_Store):
+            store.points_signal.connect(self.update_points)
+            self.retry_timer = QtCore.QTimer(self)
+            self.retry_timer.timeout.connect(
+                lambda: self.writer.submit(store.send_pending, key="account_server"))
+            self.retry_timer.start(int(account_server.RETRY_SECONDS * 1000))
+
+        # The metrics are written by the persistence thread too
+        self.metrics_timer = QtCore.QTimer(self)
+        self.metrics_timer.timeout.connect(
+            lambda: self.writer.submit(metrics.get_metrics().export, key="metrics"))
+        self.metrics_timer.start(metrics.EXPORT_SECONDS * 1000)
+
+        manager = workers.get_manager()
+        # The reader runs for the whole life of the app, we only pause it
+        self.reader = manager.add("rfid", thread.Reader_Service())
+        self.reader.id_signal.connect(self.check_id)
+        manager.start("rfid")
+        # Same for the thread driving the pumps, the order queue connects to it
+        manager.add("dispense", thread.Dispense_Worker())
+        manager.start("dispense")
+        self.timer.mark("services")
+
+        # The tabs are only built at the first login, but we import them now
+        import tabs  # noqa: F401
+        self.timer.mark("tabs import")
+
+        gpio.join()
+        self.timer.mark("gpio")
 
+        self.set_loading()
+        self.showFullScreen()
+        if self.splash is not None:
+            self.splash.finish(self)
+            self.splash = None
+        self.timer.mark_ready()
+        print(self.timer.report())
+
+    def setup_pumps(self):
+        """Set up one led (pump) for each pin of the config, simulated off the Pi.
+        """
         self.leds = {
-            "17": LED(17),
-            "18": LED(18),
-            "19": LED(19),
-            "20": LED(20),
-            "21": LED(21),
-            "22": LED(22),
+            pin: hal.make_pump(pin) for pin in pump_map.get_pump_map().pins()
         }
 
     def init_ui(self) -> None:
@@ -52,51 +130,92 @@ class Window(QtWidgets.QMainWindow):
         """
         self.setObjectName("main")
 
-        self.showFullScreen()
-        self.setStyleSheet(theme.BACKGROUND)
-        self.set_loading()
-
-        self.show()
+        # The loading screen and the tabs are built once and we switch between them
+        self.stack = QtWidgets.QStackedWidget()
+        self.loading_screen = loading.Loading()
+        self.stack.addWidget(self.loading_screen)
+        # Built on the first login
+        self.tabs = None
+        self.setCentralWidget(self.stack)
 
     def read_RFID(self):
-        """Launch the thread responsible to read the RFID card
+        """Let the RFID reader send us the next card
         """
-        self.thread = thread.Loading_thread()
-        self.thread.start()
-        self.thread.id_signal.connect(self.check_id)
+        self.reader.set_active(True)
 
+    @metrics.timed("check_id_seconds", "Reaction of the UI to a card")
     def check_id(self, id: str):
         """Check the given id and unlock the app if needed.
 
         Args:
             id (str): A string representation of the id.
         """
-        valid, name, base_points = check_accepted_id(id)
+        # A card that was read just before the login is ignored
+        if not self.reader.active:
+            return
+
         if "Error" in id:
-            # There was an error while reading the card
+            # There was an error while reading the card, the reader keeps going
             self.loading_screen.error_message.setText(id)
-            self.read_RFID()
-        elif not valid:
+            return
+
+        valid, name, base_points = check_accepted_id(id)
+        if not valid:
             # The ID is not in the DB
             self.loading_screen.error_message.setText(
                 "Error: {} not accepted".format(id))
-            self.read_RFID()
         else:
             self.login((id, name, base_points))
 
     def set_loading(self):
-        self.main = loading.Loading()
-        self.setCentralWidget(self.main)
+        """Show the loading screen and wait for the next card.
+        """
+        if self.tabs is not None:
+            self.tabs.unbind_user()
+        self.loading_screen.error_message.setText("")
+        self.stack.setCurrentWidget(self.loading_screen)
         self.read_RFID()
 
     def login(self, user_info: tuple[str]):
-        self.main = tabs.Vertical_Tabs(user_info, self.leds)
-        self.setCentralWidget(self.main)
+        """Show the tabs for the given user, they are only built on the first login.
+
+        Args:
+            user_info (tuple[str]): A tuple containing all the needed user info.
+        """
+        # No other card is sent while somebody is logged in
+        self.reader.set_active(False)
+
+        if self.tabs is None:
+            import tabs
+            self.tabs = tabs.Vertical_Tabs(user_info, self.leds)
+            self.stack.addWidget(self.tabs)
+        else:
+            self.tabs.bind_user(user_info)
+        self.stack.setCurrentWidget(self.tabs)
+
+    def update_points(self, id: str, points: float):
+        """Show the points read on the account server, if their user is logged in.
+
+        Args:
+            id (str): A string representation of the id.
+            points (float): The points of the user.
+        """
+        if self.tabs is not None and self.stack.currentWidget() is self.tabs and self.tabs.user_id == id:
+            self.tabs.show_points(points)
+
+    def show_storage_error(self, message: str):
+        """Warn the staff that something couldn't be saved.
+
+        Args:
+            message (str): The error message.
+        """
+        print(message)
+        QtWidgets.QMessageBox.warning(self, "Storage", message)
 
     def closeEvent(self, event: QtGui.QCloseEvent) -> None:
         """Redirect the button close event if we are inside the app.
         """
-        main_object = self.centralWidget()
+        main_object = self.stack.currentWidget()
         # This means we are inside the app, so we redirect the user to the exit tab.
         if main_object.objectName() == "Vertical_Tab":
             event.ignore()
@@ -109,6 +228,16 @@ class Window(QtWidgets.QMainWindow):
 if __name__ == "__main__":
     import sys
 
+    timer = boot.get_timer()
+    timer.mark("imports")
     app = QtWidgets.QApplication(sys.argv)
-    window = Window()
-    sys.exit(app.exec())
+    splash = boot.show_splash()
+    timer.mark_first_pixel()
+    # One stylesheet for the whole app, the widgets only tell which rules they use
+    theme.install(app)
+    timer.mark("theme")
+    window = Window(splash)
+    exit_code = app.exec()
+    # The persistence thread stops last, so everything is written before leaving
+    workers.get_manager().stop_all()
+    sys.exit(exit_code)
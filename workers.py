@@ -0,0 +1,85 @@
+class Thread_Manager:
+    """Keep track of the long-lived threads of the app.
+
+    Every thread is built once, registered here with a name, has his signals
+    connected and is then started. At the end they are stopped in the
+    reverse order, so the persistence thread (registered first) writes
+    everything the others asked for before leaving.
+    """
+
+    def __init__(self) -> None:
+        # name -> QThread, in registration order
+        self.threads = {}
+
+    def add(self, name: str, thread):
+        """Register a thread, it isn't started yet.
+
+        Args:
+            name (str): The name of the thread, like "rfid".
+            thread (QtCore.QThread): The thread, it needs a stop() method.
+
+        Returns:
+            QtCore.QThread: The given thread.
+        """
+        if name in self.threads:
+            raise ValueError("A thread named {} is already registered".format(name))
+        self.threads[name] = thread
+        return thread
+
+    def get(self, name: str):
+        """Get a registered thread.
+
+        Args:
+            name (str): The name of the thread.
+
+        Returns:
+            QtCore.QThread | None: The thread, None if there's no thread with this name.
+        """
+        return self.threads.get(name)
+
+    def start(self, name: str):
+        """Start a registered thread, once his signals are connected.
+
+        Args:
+            name (str): The name of the thread.
+        """
+        thread = self.threads[name]
+        if not thread.isRunning():
+            thread.start()
+
+    def counts(self) -> dict:
+        """Get the state of each registered thread.
+
+        Returns:
+            dict: A dict matching each name with True if the thread is running.
+        """
+        return {name: thread.isRunning() for name, thread in self.threads.items()}
+
+    def live_count(self) -> int:
+        """Get the number of running threads.
+
+        Returns:
+            int: The number of registered threads that are running.
+        """
+        return sum(self.counts().values())
+
+    def stop_all(self):
+        """Stop every thread, the last registered first.
+        """
+        for thread in reversed(list(self.threads.values())):
+            thread.stop()
+
+
+_manager = None
+
+
+def get_manager() -> Thread_Manager:
+    """Get the Thread_Manager shared by the whole app.
+
+    Returns:
+        Thread_Manager: The shared Thread_Manager.
+    """
+    global _manager
+    if _manager is None:
+        _manager = Thread_Manager()
+    return _manager